@@ -0,0 +1,154 @@
+"""
+Content-addressed cache of analyzer output.
+
+Results are keyed by a SHA-256 of the CSV's digest, track condition, advanced
+flag and analyzer version, and kept in the analysis_cache table so they
+survive restarts and are shared by every gunicorn worker. The table is held
+to a fixed number of entries, evicting the least recently used.
+"""
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+
+from models import db, AnalysisCache
+from csv_stream import csv_sha256
+
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+_ENGINE_SOURCES = {
+    'node': 'analyzer.js',
+    'python': 'scoring.py',
+}
+_versions = {}
+
+# Per-process counters, reported on the admin panel
+_stats_lock = threading.Lock()
+stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'errors': 0}
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        stats[name] += amount
+
+
+def analyzer_version(engine):
+    """
+    Version string for an engine: its name plus a hash of its source file,
+    so editing the scoring code invalidates old entries automatically
+    """
+    if engine not in _versions:
+        with open(os.path.join(_ROOT, _ENGINE_SOURCES[engine]), 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:16]
+        _versions[engine] = f"{engine}-{digest}"
+    return _versions[engine]
+
+
+def cache_key(csv_data, track_condition, is_advanced, version):
+    """
+    SHA-256 over everything that can change the analyzer's output
+    The CSV enters by its own digest, which uploads compute while streaming
+    """
+    digest = hashlib.sha256()
+    for part in (version, track_condition, '1' if is_advanced else '0', csv_sha256(csv_data)):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def get(key):
+    """Return the cached result for key (marking it recently used), or None"""
+    entry = AnalysisCache.query.filter_by(cache_key=key).first()
+    if entry is None:
+        _count('misses')
+        return None
+
+    entry.hits = (entry.hits or 0) + 1
+    entry.last_used_at = datetime.utcnow()
+    db.session.commit()
+    _count('hits')
+    return entry.result
+
+
+def put(key, version, result, max_entries):
+    """Store a result, then evict least recently used entries over max_entries"""
+    entry = AnalysisCache(
+        cache_key=key,
+        analyzer_version=version,
+        result=result,
+        size_bytes=len(json.dumps(result))
+    )
+    db.session.add(entry)
+    db.session.commit()
+    _count('stores')
+
+    stale_ids = db.session.execute(
+        db.select(AnalysisCache.id)
+        .order_by(AnalysisCache.last_used_at.desc(), AnalysisCache.id.desc())
+        .offset(max_entries)
+    ).scalars().all()
+    if stale_ids:
+        AnalysisCache.query.filter(AnalysisCache.id.in_(stale_ids)).delete(synchronize_session=False)
+        db.session.commit()
+        _count('evictions', len(stale_ids))
+
+
+def lookup(csv_data, track_condition, is_advanced, engine):
+    """
+    Return (key, version, result) for these inputs, result being None on a
+    miss. A cache that can't be read counts as a miss.
+    """
+    version = analyzer_version(engine)
+    key = cache_key(csv_data, track_condition, is_advanced, version)
+    try:
+        result = get(key)
+    except Exception:
+        db.session.rollback()
+        _count('errors')
+        result = None
+    return key, version, result
+
+
+def store(key, version, result, max_entries):
+    """put(), swallowing failures so they never fail the analysis itself"""
+    try:
+        put(key, version, result, max_entries)
+    except Exception:
+        # Most likely another worker stored the same key first
+        db.session.rollback()
+        _count('errors')
+
+
+def cached_analysis(analyze, csv_data, track_condition, is_advanced, engine, max_entries):
+    """
+    Return analyze(csv_data, track_condition, is_advanced), served from the
+    cache when the same inputs were analyzed before. Cache failures never
+    fail the analysis itself.
+    """
+    if max_entries <= 0:
+        return analyze(csv_data, track_condition, is_advanced)
+
+    key, version, result = lookup(csv_data, track_condition, is_advanced, engine)
+    if result is not None:
+        return result
+
+    result = analyze(csv_data, track_condition, is_advanced)
+    store(key, version, result, max_entries)
+    return result
+
+
+def summary():
+    """Counters plus table totals for monitoring"""
+    entries, total_bytes, total_hits = db.session.execute(
+        db.select(
+            db.func.count(AnalysisCache.id),
+            db.func.coalesce(db.func.sum(AnalysisCache.size_bytes), 0),
+            db.func.coalesce(db.func.sum(AnalysisCache.hits), 0)
+        )
+    ).one()
+    with _stats_lock:
+        counters = dict(stats)
+    lookups = counters['hits'] + counters['misses']
+    counters['hit_rate'] = counters['hits'] / lookups if lookups else 0.0
+    counters.update(entries=entries, total_bytes=total_bytes, total_hits=total_hits)
+    return counters
@@ -50,58 +50,109 @@ function convertCSV(data) {
     return data;
 }
 
+// Tags a score component can earn, matched against that component's own
+// note (null = earned whenever it adds points). scoring.py keeps the same
+// table as COMPONENT_TAGS.
+const WIN_RATE_TAGS = [
+    ['exceptional_win_rate', ['Exceptional win rate']],
+    ['strong_win_rate', ['Strong win rate']],
+    ['good_win_rate', ['Good win rate']]
+];
+const COMPONENT_TAGS = {
+    last10: [['ran_places', ['Ran places:']]],
+    jockey: [['elite_jockey', ['Love the Jockey']], ['top_jockey', ['Like the Jockey']]],
+    trainer: [['top_trainer', ['Like the Trainer']]],
+    track: [['undefeated_track', ['UNDEFEATED']], ...WIN_RATE_TAGS],
+    track_distance: [['undefeated_track_distance', ['UNDEFEATED']], ...WIN_RATE_TAGS],
+    distance: [['undefeated_distance', ['UNDEFEATED']], ...WIN_RATE_TAGS],
+    track_condition: [['undefeated_condition', ['UNDEFEATED']], ...WIN_RATE_TAGS],
+    class: [['class_drop', ['Stepping DOWN']], ['class_rise', ['Stepping UP']]],
+    days_since_run: [['quick_backup', ['Quick backup']], ['too_fresh', ['Too fresh']]],
+    margin: [['won_last_start', [' last start win ']], ['narrow_loss', ['Narrow loss']], ['close_loss', ['Close loss']]],
+    form_price: [['positive_form_price', null]],
+    first_up_second_up: [['first_up_specialist', ['First up specialist']], ['second_up_specialist', ['Second up specialist']]],
+    sectional: [
+        ['fastest_avg_sectional', [': fastest avg sectional']],
+        ['second_fastest_avg_sectional', ['2nd fastest avg sectional']],
+        ['third_fastest_avg_sectional', ['3rd fastest avg sectional']],
+        ['fastest_last_start_sectional', [': fastest last start sectional']],
+        ['second_fastest_last_start_sectional', ['2nd fastest last start sectional']],
+        ['third_fastest_last_start_sectional', ['3rd fastest last start sectional']]
+    ],
+    combo_bonus: [['combo_bonus', null]]
+};
+
+// Record one scoring check as [id, points, tags], unless it neither scored nor earned a tag
+function addComponent(components, componentId, points, note) {
+    const tags = (COMPONENT_TAGS[componentId] || [])
+        .filter(([tag, phrases]) => phrases === null ? points > 0 : phrases.some(phrase => note.includes(phrase)))
+        .map(([tag]) => tag);
+    if (points === 0 && tags.length === 0) return;
+    components.push([componentId, points, tags]);
+}
+
 function calculateScore(horseRow, trackCondition, troubleshooting = false, averageFormPrice) {
     if (troubleshooting) console.log(`Calculating score for horse: ${horseRow['horse name']}`);
 
     var score = 0;
     var notes = '';
+    var components = [];
 
     // Check horse weight  and score
     var [a, b] = checkWeight(horseRow['horse weight'], horseRow['horse claim']);
     score += a;
     notes += b;
+    addComponent(components, 'weight', a, b);
 
     // Check horse places in last 10 runs
     if (troubleshooting) console.log(`Calculating last 10: ${horseRow['horse last10']}`);
     [a, b] = checkLast10runs(horseRow['horse last10']);
     score += a;
     notes += b;
+    addComponent(components, 'last10', a, b);
 
     // Check if horse jockey is someone we like or not
     [a, b] = checkJockeys(horseRow['horse jockey']);
     score += a;
     notes += b;
+    addComponent(components, 'jockey', a, b);
 
     // Check if horse trainer  is someone we like or not
     [a, b] = checkTrainers(horseRow['horse trainer']);
     score += a;
     notes += b;
+    addComponent(components, 'trainer', a, b);
 
    // Check if horse has won at this track (ENHANCED WEIGHTED SYSTEM)
     [a, b] = checkTrackForm(horseRow['horse record track']);
     score += a;
     notes += b;
+    addComponent(components, 'track', a, b);
 
    // Check if horse has won at this track+distance combo (ENHANCED WEIGHTED SYSTEM)
     [a, b] = checkTrackDistanceForm(horseRow['horse record track distance']);
     score += a;
     notes += b;
+    addComponent(components, 'track_distance', a, b);
 
     // Check if horse has won at this distance (ENHANCED WEIGHTED SYSTEM)
     [a, b] = checkDistanceForm(horseRow['horse record distance']);
     score += a;
     notes += b;
+    addComponent(components, 'distance', a, b);
 
     // Check if the last race the horse ran was longer, same or shorter distance
     [a, b] = checkLastDistance(horseRow);
     score += a;
     notes += b;
+    addComponent(components, 'last_distance', a, b);
     
    // Check horse form on actual track condition (ENHANCED WEIGHTED SYSTEM)
     const formTrackCondition = 'horse record ' + trackCondition;
     [a, b] = checkTrackConditionForm(horseRow[formTrackCondition], trackCondition);
     score += a;
     notes += b;
+    addComponent(components, 'track_condition', a, b);
     
 
    // Check horse current and former classes
@@ -113,28 +164,33 @@ function calculateScore(horseRow, trackCondition, troubleshooting = false, avera
     );
     score += cscore;
     notes += cnote;
+    addComponent(components, 'class', cscore, cnote);
 
     // Check days since last run
     [a, b] = checkDaysSinceLastRun(horseRow['meeting date'], horseRow['form meeting date']);
     score += a;
     notes += b;
+    addComponent(components, 'days_since_run', a, b);
 
     // Check last run margin
     [a, b] = checkMargin(horseRow['form position'], horseRow['form margin']);
     score += a;
     notes += b;
+    addComponent(components, 'margin', a, b);
 
     // Check form price
     [a, b] = checkFormPrice(averageFormPrice);
     score += a;
     notes += b;
+    addComponent(components, 'form_price', a, b);
 
     // Check first up / second up specialist
     [a, b] = checkFirstUpSecondUp(horseRow);
     score += a;
     notes += b;
+    addComponent(components, 'first_up_second_up', a, b);
 
-    return [score, notes]; // Return the score and notes
+    return [score, notes, components]; // Return the score, notes and components
 }
 
 
@@ -1503,15 +1559,16 @@ function getLowestSectionalsByRace(data) {
     let targetDistance = null;
     if (distances.size > 1) {
       // Count horses per distance
+      const horsesAtDistance = new Map();
+      distances.forEach(dist => horsesAtDistance.set(dist, new Set()));
+      parsedData.forEach(entry => {
+        if (entry.time > 0 && horsesAtDistance.has(entry.distance)) {
+          horsesAtDistance.get(entry.distance).add(entry['horse name']);
+        }
+      });
       const distanceHorseCounts = {};
       distances.forEach(dist => {
-        const horsesAtDistance = new Set();
-        parsedData.forEach(entry => {
-          if (entry.time > 0 && entry.distance === dist) {
-            horsesAtDistance.add(entry['horse name']);
-          }
-        });
-        distanceHorseCounts[dist] = horsesAtDistance.size;
+        distanceHorseCounts[dist] = horsesAtDistance.get(dist).size;
       });
       
       // Find distance with most horses
@@ -1539,16 +1596,16 @@ function getLowestSectionalsByRace(data) {
       if (entry.time > 0 && (targetDistance === null || entry.distance === targetDistance)) {
         horseData[horseName].push({
           time: entry.time,
-          date: entry['form meeting date']
+          // parseDate, not new Date(string): form dates are DD/MM/YYYY and
+          // the Python engine reads them the same way
+          date: parseDate(entry['form meeting date']).getTime()
         });
       }
     });
 
     // Sort by date (most recent first) for each horse
     Object.keys(horseData).forEach(horseName => {
-      horseData[horseName].sort((a, b) => {
-        return new Date(b.date) - new Date(a.date);
-      });
+      horseData[horseName].sort((a, b) => b.date - a.date);
     });
 
     // SYSTEM 1: Average of Last 3 Runs
@@ -1893,8 +1950,8 @@ function parseCSV(csvString) {
     const lines = csvString.trim().split('\n');
     if (lines.length === 0) return [];
     
-    // Parse header row
-    const headers = parseCSVLine(lines[0]);
+    // Parse header row (names normalised once, not per row)
+    const headers = parseCSVLine(lines[0]).map(header => header.trim().toLowerCase());
     
     // Parse data rows
     const data = [];
@@ -1903,7 +1960,7 @@ function parseCSV(csvString) {
         if (values.length === headers.length) {
             const row = {};
             headers.forEach((header, index) => {
-                row[header.trim().toLowerCase()] = values[index].trim();
+                row[header] = values[index].trim();
             });
             data.push(row);
         }
@@ -1947,19 +2004,38 @@ function parseDate(dateStr) {
 }
 // Get unique horses (latest entry for each horse-race combo)
 function getUniqueHorsesOnly(data) {
+    // compositeKey -> { entry, time }: each row's date is parsed once, not on every comparison
     const latestByComposite = new Map();
     
     data.forEach(entry => {
         const compositeKey = `${entry['horse name']}-${entry['race number']}`;
-        const currentDate = entry['form meeting date'];
+        const time = parseDate(entry['form meeting date']).getTime();
+        const latest = latestByComposite.get(compositeKey);
         
-        if (!latestByComposite.has(compositeKey) || 
-            parseDate(currentDate) > parseDate(latestByComposite.get(compositeKey)['form meeting date'])) {
-            latestByComposite.set(compositeKey, entry);
+        if (!latest || time > latest.time) {
+            latestByComposite.set(compositeKey, { entry, time });
         }
     });
     
-    return Array.from(latestByComposite.values());
+    return Array.from(latestByComposite.values(), latest => latest.entry);
+}
+
+// Look-up key matching parseInt(race) and the lower-cased, trimmed name
+// (undefined for a race that isn't a number, which never matches)
+function raceAndNameKey(race, name) {
+    const raceNum = parseInt(race);
+    return isNaN(raceNum) ? undefined : `${raceNum}|${name.toLowerCase().trim()}`;
+}
+
+function indexByRaceAndName(entries) {
+    const index = new Map();
+    entries.forEach(entry => {
+        const key = raceAndNameKey(entry.race, entry.name);
+        if (key !== undefined && !index.has(key)) {
+            index.set(key, entry);
+        }
+    });
+    return index;
 }
 
 // Main analysis function
@@ -1999,6 +2075,10 @@ function analyzeCSV(csvData, trackCondition, isAdvanced) {
     const averageFormPrices = calculateAverageFormPrices(data);
     const weightScores = calculateWeightScores(data);
     
+    // Keyed by race and normalised name, each keeping the first match as find() would
+    const sectionalsByHorse = indexByRaceAndName(filteredDataSectional);
+    const weightScoresByHorse = indexByRaceAndName(weightScores);
+    
     // Get unique horses only
     const uniqueHorses = getUniqueHorsesOnly(data);
     
@@ -2010,20 +2090,18 @@ function analyzeCSV(csvData, trackCondition, isAdvanced) {
         const avgFormPrice = averageFormPrices[compositeKey];
         
         // Calculate base score
-        let [score, notes] = calculateScore(horse, trackCondition, false, avgFormPrice);
+        let [score, notes, components] = calculateScore(horse, trackCondition, false, avgFormPrice);
         
         const raceNumber = horse['race number'];
         const horseName = horse['horse name'];
         
         // Add sectional scores
-        const matchingHorse = filteredDataSectional.find(h => 
-            parseInt(h.race) === parseInt(raceNumber) && 
-            h.name.toLowerCase().trim() === horseName.toLowerCase().trim()
-        );
+        const matchingHorse = sectionalsByHorse.get(raceAndNameKey(raceNumber, horseName));
         
         if (matchingHorse) {
             score += matchingHorse.sectionalScore;
             notes += matchingHorse.sectionalNote;
+            addComponent(components, 'sectional', matchingHorse.sectionalScore, matchingHorse.sectionalNote);
             
             // Check for combo bonus
             if (matchingHorse.hasAverage1st && matchingHorse.hasLastStart1st) {
@@ -2036,22 +2114,21 @@ function analyzeCSV(csvData, trackCondition, isAdvanced) {
                 if (classScore > 0) {
                     score += 15;
                     notes += '+15.0 : COMBO BONUS - Fastest sectional + dropping in class\n';
+                    addComponent(components, 'combo_bonus', 15, '');
                 }
             }
         }
 
         // Add weight scores (outside matchingHorse block so ALL horses get weight scoring)
-        const matchingWeight = weightScores.find(w => 
-            parseInt(w.race) === parseInt(raceNumber) && 
-            w.name.toLowerCase().trim() === horseName.toLowerCase().trim()
-        );
+        const matchingWeight = weightScoresByHorse.get(raceAndNameKey(raceNumber, horseName));
 
         if (matchingWeight) {
             score += matchingWeight.weightScore;
             notes += matchingWeight.weightNote;
+            addComponent(components, 'weight_vs_field', matchingWeight.weightScore, matchingWeight.weightNote);
         }
 
-        analysisResults.push({ horse, score, notes });
+        analysisResults.push({ horse, score, notes, components });
     });
 
     // Remove duplicates and calculate odds
@@ -2075,36 +2152,109 @@ function analyzeCSV(csvData, trackCondition, isAdvanced) {
 // STDIN/STDOUT HANDLER - This is what Python calls
 // ============================================================
 
-let inputData = '';
-process.stdin.setEncoding('utf8');
-
-process.stdin.on('data', chunk => {
-  inputData += chunk;
-});
-
-process.stdin.on('end', () => {
-  if (!inputData.trim()) {
-    console.error('Error: No input data received.');
-    process.exit(1);
-  }
-
-  let input;
-  try {
-    input = JSON.parse(inputData);
-  } catch (err) {
-    console.error('Error: Invalid JSON input.', err.message);
-    process.exit(1);
-  }
-
-  const csvData = input.csv_data || '';
-  const trackCondition = input.track_condition || 'good';
-  const isAdvanced = input.is_advanced || false;
-
-  try {
-    const results = analyzeCSV(csvData, trackCondition, isAdvanced);
-    console.log(JSON.stringify(results));
-  } catch (error) {
-    console.error('Error processing input:', error.message);
-    process.exit(1);
-  }
-});
+function runOnce() {
+  let inputData = '';
+  process.stdin.setEncoding('utf8');
+
+  process.stdin.on('data', chunk => {
+    inputData += chunk;
+  });
+
+  process.stdin.on('end', () => {
+    if (!inputData.trim()) {
+      console.error('Error: No input data received.');
+      process.exit(1);
+    }
+
+    let input;
+    try {
+      input = JSON.parse(inputData);
+    } catch (err) {
+      console.error('Error: Invalid JSON input.', err.message);
+      process.exit(1);
+    }
+
+    const csvData = input.csv_data || '';
+    const trackCondition = input.track_condition || 'good';
+    const isAdvanced = input.is_advanced || false;
+
+    try {
+      const results = analyzeCSV(csvData, trackCondition, isAdvanced);
+      console.log(JSON.stringify(results));
+    } catch (error) {
+      console.error('Error processing input:', error.message);
+      process.exit(1);
+    }
+  });
+}
+
+// ============================================================
+// WORKER MODE - long-lived process used by analyzer_pool.py
+// ============================================================
+// One JSON request per line on stdin, one JSON response per line on stdout:
+//   {"id": 1, "csv_data": "...", "track_condition": "good", "is_advanced": false}
+//   -> {"id": 1, "ok": true, "result": [...]}
+//   {"id": 2, "ping": true}
+//   -> {"id": 2, "ok": true, "pong": true}
+// Large CSVs can instead be streamed as several lines, so neither side has
+// to build one huge JSON document:
+//   {"id": 3, "chunk": "meeting date,race number,..."}   (repeated)
+//   {"id": 3, "end": true, "track_condition": "good", "is_advanced": false}
+//   -> {"id": 3, "ok": true, "result": [...]}
+
+function runWorker() {
+  // stdout carries the protocol, so anything logged goes to stderr instead
+  console.log = console.error;
+
+  const send = message => process.stdout.write(JSON.stringify(message) + '\n');
+  const rl = require('readline').createInterface({ input: process.stdin, terminal: false });
+  const pendingChunks = new Map();
+
+  rl.on('line', line => {
+    if (!line.trim()) return;
+
+    let request;
+    try {
+      request = JSON.parse(line);
+    } catch (err) {
+      send({ id: null, ok: false, error: 'Invalid JSON input: ' + err.message });
+      return;
+    }
+
+    if (request.ping) {
+      send({ id: request.id, ok: true, pong: true });
+      return;
+    }
+
+    if (request.chunk !== undefined) {
+      if (!pendingChunks.has(request.id)) pendingChunks.set(request.id, []);
+      pendingChunks.get(request.id).push(request.chunk);
+      return;
+    }
+
+    let csvData = request.csv_data || '';
+    if (request.end) {
+      csvData = (pendingChunks.get(request.id) || []).join('');
+      pendingChunks.delete(request.id);
+    }
+
+    try {
+      const results = analyzeCSV(
+        csvData,
+        request.track_condition || 'good',
+        request.is_advanced || false
+      );
+      send({ id: request.id, ok: true, result: results });
+    } catch (error) {
+      send({ id: request.id, ok: false, error: error.message });
+    }
+  });
+
+  rl.on('close', () => process.exit(0));
+}
+
+if (process.argv.includes('--worker')) {
+  runWorker();
+} else {
+  runOnce();
+}
@@ -0,0 +1,258 @@
+"""
+Pool of long-lived analyzer.js worker processes.
+
+Each worker is started once with `node analyzer.js --worker` and then serves
+requests as newline-delimited JSON over stdin/stdout, so an upload no longer
+pays Node startup and the parse of analyzer.js before any scoring happens.
+"""
+import os
+import json
+import queue
+import atexit
+import itertools
+import threading
+import subprocess
+from collections import deque
+
+from csv_stream import iter_chunks
+from metrics import span
+
+ANALYZER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analyzer.js')
+
+
+class AnalyzerWorker:
+    """A single `node analyzer.js --worker` process"""
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self._responses = queue.Queue()
+        self._stderr = deque(maxlen=50)
+        self.requests_served = 0
+        self.process = subprocess.Popen(
+            ['node', ANALYZER_PATH, '--worker'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding='utf-8',
+            bufsize=1
+        )
+        # Reader threads so a request can wait on its response with a timeout
+        threading.Thread(target=self._read_stdout, daemon=True).start()
+        threading.Thread(target=self._read_stderr, daemon=True).start()
+
+    def _read_stdout(self):
+        for line in self.process.stdout:
+            self._responses.put(line)
+        self._responses.put(None)  # EOF - the process has exited
+
+    def _read_stderr(self):
+        for line in self.process.stderr:
+            self._stderr.append(line.rstrip())
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def stderr_tail(self):
+        return '\n'.join(self._stderr)
+
+    def request(self, payload, timeout, chunks=None):
+        """
+        Send one request and wait for its response
+        With chunks, the CSV is streamed ahead of the payload one chunk per
+        line, so it is never JSON-encoded as a whole
+        Raises Exception on timeout, crash or analyzer error
+        """
+        request_id = next(self._ids)
+        payload = dict(payload, id=request_id)
+
+        try:
+            with span('analyzer_send'):
+                if chunks is not None:
+                    for chunk in chunks:
+                        self.process.stdin.write(json.dumps({'id': request_id, 'chunk': chunk}) + '\n')
+                    payload['end'] = True
+                self.process.stdin.write(json.dumps(payload) + '\n')
+                self.process.stdin.flush()
+        except (BrokenPipeError, OSError):
+            raise Exception(f"Analyzer worker exited: {self.stderr_tail()}")
+
+        while True:
+            try:
+                # Includes Node startup for a worker's first request
+                with span('analyzer_wait'):
+                    line = self._responses.get(timeout=timeout)
+            except queue.Empty:
+                raise TimeoutError(f"Analysis timed out (>{timeout} seconds)")
+
+            if line is None:
+                raise Exception(f"Analyzer worker exited: {self.stderr_tail()}")
+
+            try:
+                with span('analyzer_decode'):
+                    response = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise Exception(f"Invalid analyzer output: {e}")
+
+            # Responses for abandoned requests cannot arrive (the worker is
+            # killed on timeout), but never hand back someone else's result
+            if response.get('id') not in (request_id, None):
+                continue
+
+            self.requests_served += 1
+            if not response.get('ok'):
+                raise Exception(f"Analyzer error: {response.get('error', 'unknown error')}")
+            return response
+
+    def stop(self):
+        if self.is_alive():
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=2)
+            except Exception:
+                self.process.kill()
+                self.process.wait()
+
+
+class AnalyzerPool:
+    """
+    Fixed-size pool of analyzer workers
+    Workers that crash or time out are killed and replaced
+    """
+
+    def __init__(self, size=2, timeout=60, health_interval=30):
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.health_interval = health_interval
+        self.pid = os.getpid()
+        self._idle = queue.Queue()
+        self._closed = threading.Event()
+        self._waiting_lock = threading.Lock()
+        self.waiting = 0  # callers queued for a free worker
+        self.restarts = 0
+
+        for _ in range(self.size):
+            self._idle.put(self._start_worker())
+
+        if health_interval:
+            threading.Thread(target=self._health_loop, daemon=True).start()
+
+    def _start_worker(self):
+        try:
+            with span('analyzer_spawn'):
+                return AnalyzerWorker()
+        except FileNotFoundError:
+            raise Exception("Node.js not found. Please ensure Node.js is installed.")
+
+    def _replace(self, worker):
+        worker.stop()
+        self.restarts += 1
+        return self._start_worker()
+
+    def _checkout(self):
+        with self._waiting_lock:
+            self.waiting += 1
+        try:
+            with span('analyzer_checkout'):
+                worker = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No analyzer worker available after {self.timeout} seconds")
+        finally:
+            with self._waiting_lock:
+                self.waiting -= 1
+        if not worker.is_alive():
+            worker = self._replace(worker)
+        return worker
+
+    def _call(self, payload, timeout=None, chunks=None):
+        worker = self._checkout()
+        try:
+            return worker.request(payload, timeout or self.timeout, chunks=chunks)
+        except Exception as e:
+            # A worker that timed out is still busy and one that exited is
+            # gone; either way it can't be trusted with the next request
+            if isinstance(e, TimeoutError) or not worker.is_alive():
+                worker = self._replace(worker)
+            raise
+        finally:
+            self._idle.put(worker)
+
+    def analyze(self, csv_data, track_condition, is_advanced=False):
+        """
+        Run analyzeCSV on a pooled worker and return its results
+        csv_data is a string or a CSVUpload; either is streamed in chunks
+        """
+        response = self._call({
+            'track_condition': track_condition,
+            'is_advanced': is_advanced
+        }, chunks=iter_chunks(csv_data))
+        return response['result']
+
+    def stats(self):
+        """Worker counts and queue depth, for /metrics"""
+        idle = self._idle.qsize()
+        return {
+            'size': self.size,
+            'idle': idle,
+            'busy': max(0, self.size - idle),
+            'waiting': self.waiting,
+            'restarts': self.restarts,
+        }
+
+    def health_check(self):
+        """
+        Ping every idle worker, replacing any that fail to answer
+        Returns the number of workers that had to be restarted
+        """
+        restarted = 0
+        for _ in range(self._idle.qsize()):
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                worker.request({'ping': True}, timeout=5)
+            except Exception:
+                worker = self._replace(worker)
+                restarted += 1
+            self._idle.put(worker)
+        return restarted
+
+    def _health_loop(self):
+        while not self._closed.wait(self.health_interval):
+            try:
+                self.health_check()
+            except Exception:
+                pass
+
+    def close(self):
+        self._closed.set()
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                break
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def current_pool():
+    """This process's analyzer pool, or None if it hasn't been started"""
+    if _pool is not None and _pool.pid == os.getpid():
+        return _pool
+    return None
+
+
+def get_pool(size=2, timeout=60, health_interval=30):
+    """
+    Return this process's analyzer pool, starting it on first use
+    Pools are per-process so gunicorn workers each get their own after fork
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = AnalyzerPool(size=size, timeout=timeout, health_interval=health_interval)
+            atexit.register(_pool.close)
+        return _pool
@@ -1,12 +1,32 @@
 import os
+import hmac
 import json
-import subprocess
-from flask import Flask, render_template, redirect, url_for, request, flash
+import time
+import click
+from flask import Flask, Response, render_template, redirect, url_for, request, flash, jsonify, abort
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash
-from datetime import datetime
+from datetime import datetime, timedelta
+from functools import wraps
+from sqlalchemy import insert, update, delete
 
-from models import db, User, Meeting, Race, Horse, Prediction
+from models import db, User, Meeting, Race, Horse, Prediction, PredictionTag, RunnerResult, AnalysisJob, Entity
+from analyzer_pool import get_pool, current_pool
+from scoring import (
+    parse_meeting, score_runner_rows, parse_formatted_number, calculate_true_odds, rescore_track_condition, sweep_track_conditions,
+    component_tags, TRACK_CONDITIONS
+)
+import analysis_cache
+from csv_stream import read_upload
+from csv_blobs import store_csv, prune_orphan_blobs, migrate_legacy_storage, runner_rows
+import batch as batch_analysis
+import migrations
+import metrics
+import results_api
+import search_index
+import backtest
+import meeting_diff
+import race_shards
 
 app = Flask(__name__)
 
@@ -33,6 +53,7 @@ def load_user(user_id):
 # Create tables and default admin user
 with app.app_context():
     db.create_all()
+    migrations.upgrade()
     # Create default admin if doesn't exist
     admin = User.query.filter_by(username='admin').first()
     if not admin:
@@ -47,39 +68,93 @@ with app.app_context():
 
 
 # ----- Analyzer Integration -----
-def run_analyzer(csv_data, track_condition, is_advanced=False):
+# Long-lived analyzer.js workers per gunicorn worker (see analyzer_pool.py)
+app.config['ANALYZER_POOL_SIZE'] = int(os.environ.get('ANALYZER_POOL_SIZE', 2))
+app.config['ANALYZER_TIMEOUT'] = int(os.environ.get('ANALYZER_TIMEOUT', 60))
+app.config['ANALYZER_HEALTH_INTERVAL'] = int(os.environ.get('ANALYZER_HEALTH_INTERVAL', 30))
+# 'node' runs analyzer.js, 'python' scores in-process with scoring.py
+app.config['ANALYZER_ENGINE'] = os.environ.get('ANALYZER_ENGINE', 'node').lower()
+# Analyzer results kept for repeat uploads (least recently used evicted, 0 = off)
+app.config['ANALYSIS_CACHE_SIZE'] = int(os.environ.get('ANALYSIS_CACHE_SIZE', 200))
+# Hand uploads to worker.py instead of analyzing inside the request
+app.config['ANALYSIS_QUEUE'] = os.environ.get('ANALYSIS_QUEUE', 'false').lower() in ('1', 'true', 'yes')
+# Analyses run at once for a multi-file upload (0 = one per CPU), and its size limit
+app.config['ANALYSIS_BATCH_WORKERS'] = int(os.environ.get('ANALYSIS_BATCH_WORKERS', 0)) or os.cpu_count() or 1
+app.config['ANALYSIS_BATCH_MAX_FILES'] = int(os.environ.get('ANALYSIS_BATCH_MAX_FILES', 50))
+# CSVs at least this big are scored a few races per process (python engine:
+# ANALYSIS_BATCH_WORKERS processes, node: all but one analyzer worker); 0 = never
+app.config['ANALYSIS_SHARD_MIN_BYTES'] = int(os.environ.get('ANALYSIS_SHARD_MIN_BYTES', 0))
+# One JSON log line per request with its stage timings and SQL count
+app.config['METRICS_JSON_LOG'] = os.environ.get('METRICS_JSON_LOG', 'false').lower() in ('1', 'true', 'yes')
+# Bearer token that lets a Prometheus scraper read /metrics without an admin login
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN', '')
+# Meetings whose /api/v1 documents are kept in memory per process (0 = off)
+app.config['API_CACHE_SIZE'] = int(os.environ.get('API_CACHE_SIZE', 32))
+# Comma-separated bearer tokens that let partners read /api/v1 without a login
+app.config['API_TOKENS'] = [token.strip() for token in os.environ.get('API_TOKENS', '').split(',') if token.strip()]
+
+metrics.init_app(app)
+results_api.configure(app.config['API_CACHE_SIZE'])
+
+
+def _shards(csv_data, workers):
+    """
+    The CSV cut into race shards if it's big enough to be worth it, else []
+    On a single CPU the shards would only take turns, so it never is
+    """
+    min_bytes = app.config['ANALYSIS_SHARD_MIN_BYTES']
+    size = len(csv_data) if isinstance(csv_data, str) else csv_data.size_bytes
+    if workers < 2 or min_bytes <= 0 or size < min_bytes or (os.cpu_count() or 1) < 2:
+        return []
+    with metrics.span('shard_split'):
+        return race_shards.split(csv_data.split('\n') if isinstance(csv_data, str) else csv_data.iter_lines(), workers)
+
+
+def _run_engine(engine, csv_data, track_condition, is_advanced):
+    """
+    Run one analysis on the given engine
+    Large CSVs are scored race shards at a time in parallel (see race_shards.py)
+    """
+    if engine == 'python':
+        workers = app.config['ANALYSIS_BATCH_WORKERS']
+        shards = _shards(csv_data, workers)
+        if shards:
+            return race_shards.analyze_python(shards, track_condition, is_advanced, workers)
+        lines = csv_data if isinstance(csv_data, str) else csv_data.iter_lines()
+        with metrics.span('python_parse'):
+            frame = parse_meeting(lines)
+        with metrics.span('python_score'):
+            return score_runner_rows(frame, track_condition, is_advanced)
+
+    pool = get_pool(
+        size=app.config['ANALYZER_POOL_SIZE'],
+        timeout=app.config['ANALYZER_TIMEOUT'],
+        health_interval=app.config['ANALYZER_HEALTH_INTERVAL']
+    )
+    # One worker stays free, so a sharded upload doesn't queue everyone else's
+    shards = _shards(csv_data, pool.size - 1)
+    if shards:
+        return race_shards.analyze_node(shards, track_condition, is_advanced, pool)
+    return pool.analyze(csv_data, track_condition, is_advanced)
+
+
+@metrics.span('run_analyzer')
+def run_analyzer(csv_data, track_condition, is_advanced=False, engine=None, use_cache=True):
     """
-    Run the JavaScript analyzer with the CSV data
+    Run the analyzer with the CSV data using the configured engine
+    Identical inputs are answered from the analysis cache
     Returns list of analysis results
     """
-    input_data = {
-        'csv_data': csv_data,
-        'track_condition': track_condition,
-        'is_advanced': is_advanced
-    }
-    
-    analyzer_path = os.path.join(os.path.dirname(__file__), 'analyzer.js')
-    
+    engine = engine or app.config['ANALYZER_ENGINE']
+    max_entries = app.config['ANALYSIS_CACHE_SIZE'] if use_cache else 0
+
     try:
-        result = subprocess.run(
-            ['node', analyzer_path],
-            input=json.dumps(input_data),
-            capture_output=True,
-            text=True,
-            timeout=60  # Increased timeout for large files
+        return analysis_cache.cached_analysis(
+            lambda *args: _run_engine(engine, *args),
+            csv_data, track_condition, is_advanced,
+            engine=engine,
+            max_entries=max_entries
         )
-        
-        if result.returncode != 0:
-            raise Exception(f"Analyzer error: {result.stderr}")
-        
-        return json.loads(result.stdout)
-        
-    except subprocess.TimeoutExpired:
-        raise Exception("Analysis timed out (>60 seconds)")
-    except json.JSONDecodeError as e:
-        raise Exception(f"Invalid analyzer output: {e}")
-    except FileNotFoundError:
-        raise Exception("Node.js not found. Please ensure Node.js is installed.")
     except Exception as e:
         raise Exception(f"Analysis failed: {str(e)}")
 
@@ -87,6 +162,7 @@ def run_analyzer(csv_data, track_condition, is_advanced=False):
 def process_and_store_results(csv_data, filename, track_condition, user_id, is_advanced=False):
     """
     Process CSV through analyzer and store results in database
+    csv_data is the CSV text or a CSVUpload straight from the request
     """
     # Run the analyzer
     analysis_results = run_analyzer(csv_data, track_condition, is_advanced)
@@ -94,124 +170,652 @@ def process_and_store_results(csv_data, filename, track_condition, user_id, is_a
     if not analysis_results:
         raise Exception("No results returned from analyzer")
     
-    # Create meeting record
+    return store_analysis_results(analysis_results, csv_data, filename, track_condition, user_id)
+
+
+def process_and_store_batch(batch, track_condition, user_id, is_advanced=False):
+    """
+    Analyze the valid files of a batch in parallel, storing each as its own
+    meeting as soon as its analysis finishes
+    Failures are recorded on the file (batch_file.error) without affecting the rest
+    """
+    engine = app.config['ANALYZER_ENGINE']
+    max_entries = app.config['ANALYSIS_CACHE_SIZE']
+
+    cached = {}
+    cache_keys = {}
+    jobs = []
+    for index, batch_file in enumerate(batch):
+        if batch_file.error:
+            continue
+        if max_entries > 0:
+            key, version, result = analysis_cache.lookup(batch_file.upload, track_condition, is_advanced, engine)
+            if result is not None:
+                cached[index] = result
+                continue
+            cache_keys[index] = (key, version)
+        jobs.append((index, batch_file.upload))
+
+    finished = batch_analysis.analyze_all(
+        jobs, track_condition, is_advanced,
+        engine=engine,
+        workers=app.config['ANALYSIS_BATCH_WORKERS'],
+        timeout=app.config['ANALYZER_TIMEOUT'],
+        health_interval=app.config['ANALYZER_HEALTH_INTERVAL']
+    )
+
+    def store(index, analysis_results):
+        batch_file = batch[index]
+        try:
+            if not analysis_results:
+                raise Exception("No results returned from analyzer")
+            batch_file.meeting = store_analysis_results(
+                analysis_results, batch_file.upload, batch_file.filename, track_condition, user_id
+            )
+        except Exception as e:
+            db.session.rollback()
+            batch_file.error = str(e)
+
+    # Cache hits are stored while the misses are still being analyzed
+    for index, analysis_results in cached.items():
+        store(index, analysis_results)
+
+    for index, analysis_results, error in finished:
+        if error is not None:
+            batch[index].error = f"Analysis failed: {error}"
+            continue
+        if index in cache_keys:
+            analysis_cache.store(*cache_keys[index], analysis_results, max_entries)
+        store(index, analysis_results)
+    return batch
+
+
+def _results_by_race(analysis_results):
+    """Analyzer results grouped by race number, skipping header rows that slipped through"""
+    races_data = {}
+    for result in analysis_results:
+        race_num = result['horse'].get('race number', '0')
+        if not race_num or not str(race_num).isdigit():
+            continue
+        races_data.setdefault(int(race_num), []).append(result)
+    return races_data
+
+
+def _race_fields(horses_results, track_condition):
+    """A race's columns (race info comes from the first horse)"""
+    first_horse = horses_results[0]['horse']
+    return {
+        'distance': first_horse.get('distance', ''),
+        'race_class': first_horse.get('class restrictions', ''),
+        'track_condition': track_condition
+    }
+
+
+def _horse_row(race_id, horse_data):
+    return {
+        'race_id': race_id,
+        'horse_name': horse_data.get('horse name', 'Unknown'),
+        'barrier': int(horse_data.get('barrier', 0)) if horse_data.get('barrier') else None,
+        'weight': float(horse_data.get('horse weight', 0)) if horse_data.get('horse weight') else None,
+        'jockey': horse_data.get('horse jockey', ''),
+        'trainer': horse_data.get('horse trainer', ''),
+        'form': horse_data.get('horse last10', ''),
+        'track_records': _track_records(horse_data)
+    }
+
+
+def _prediction_row(horse_id, result, sweep):
+    return {
+        'horse_id': horse_id,
+        'score': result.get('score', 0),
+        'true_odds': parse_formatted_number(result.get('trueOdds')),
+        'win_percent': parse_formatted_number(result.get('winProbability')),
+        'performance_percent': parse_formatted_number(result.get('performanceComponent')),
+        'base_percent': parse_formatted_number(result.get('baseProbability')),
+        'components': result.get('components', []),
+        'condition_scores': _condition_scores(sweep)
+    }
+
+
+def _scored_runners(race_ids, races_data, track_condition):
+    """
+    (race id, result, sweep) for every runner of races_data, with the scores
+    under every other track condition worked out from the same analysis
+    """
+    runners = []
+    for race_num, horses_results in races_data.items():
+        sweeps = sweep_track_conditions(horses_results, track_condition)
+        runners.extend((race_ids[race_num], result, sweep) for result, sweep in zip(horses_results, sweeps))
+    return runners
+
+
+def _insert_runners(runners):
+    """
+    Insert (race id, result, sweep) runners as horses, predictions and tags
+    Returns how many horses were inserted
+    """
+    horse_rows = [_horse_row(race_id, result['horse']) for race_id, result, _ in runners]
+    if not horse_rows:
+        return 0
+
+    search_index.link_runners(horse_rows)
+    horse_ids = {}
+    inserted = db.session.execute(
+        insert(Horse).returning(Horse.id, Horse.race_id, Horse.horse_name),
+        horse_rows
+    )
+    for horse_id, race_id, horse_name in inserted:
+        horse_ids.setdefault((race_id, horse_name), []).append(horse_id)
+    # Runners sharing a name in one race take their ids in insert order
+    for ids in horse_ids.values():
+        ids.sort()
+
+    # Notes aren't kept: the components carry what filters need and notes
+    # are generated on demand
+    prediction_rows = [
+        _prediction_row(horse_ids[(race_id, row['horse_name'])].pop(0), result, sweep)
+        for (race_id, result, sweep), row in zip(runners, horse_rows)
+    ]
+    inserted = db.session.execute(
+        insert(Prediction).returning(Prediction.id, Prediction.horse_id),
+        prediction_rows
+    )
+    components = {row['horse_id']: row['components'] for row in prediction_rows}
+    _store_prediction_tags({
+        prediction_id: components[horse_id] for prediction_id, horse_id in inserted
+    })
+    return len(horse_rows)
+
+
+@metrics.span('store_meeting')
+def store_analysis_results(analysis_results, csv_data, filename, track_condition, user_id):
+    """
+    Store analyzer results as a meeting with its races, horses and predictions
+    Uses one set-based INSERT per table instead of a flush per row
+    """
+    # Create meeting record, sharing the compressed CSV with identical uploads
     meeting = Meeting(
         user_id=user_id,
         meeting_name=filename.replace('.csv', ''),
-        csv_data=csv_data
+        csv_blob_id=store_csv(csv_data).id
     )
     db.session.add(meeting)
     db.session.flush()  # Get meeting ID
     
-    # Group results by race
-    races_data = {}
-    for result in analysis_results:
-        race_num = result['horse'].get('race number', '0')
-        
-        # Skip invalid rows (header rows that slipped through)
-        if not race_num or not str(race_num).isdigit():
-            continue
-            
-        if race_num not in races_data:
-            races_data[race_num] = []
-        races_data[race_num].append(result)
+    races_data = _results_by_race(analysis_results)
+    race_rows = [
+        dict(_race_fields(horses_results, track_condition), meeting_id=meeting.id, race_number=race_num)
+        for race_num, horses_results in races_data.items()
+    ]
     
-    # Create race and horse records
-    for race_num, horses_results in races_data.items():
-        # Get race info from first horse
-        first_horse = horses_results[0]['horse'] if horses_results else {}
-        
-        race = Race(
-            meeting_id=meeting.id,
-            race_number=int(race_num) if race_num else 0,
-            distance=first_horse.get('distance', ''),
-            race_class=first_horse.get('class restrictions', ''),
-            track_condition=track_condition
-        )
-        db.session.add(race)
-        db.session.flush()
-        
-        # Create horse and prediction records
-        for result in horses_results:
-            horse_data = result['horse']
-            
-            horse = Horse(
-                race_id=race.id,
-                horse_name=horse_data.get('horse name', 'Unknown'),
-                barrier=int(horse_data.get('barrier', 0)) if horse_data.get('barrier') else None,
-                weight=float(horse_data.get('horse weight', 0)) if horse_data.get('horse weight') else None,
-                jockey=horse_data.get('horse jockey', ''),
-                trainer=horse_data.get('horse trainer', ''),
-                form=horse_data.get('horse last10', ''),
-                csv_data=horse_data
-            )
-            db.session.add(horse)
-            db.session.flush()
-            
-            prediction = Prediction(
-                horse_id=horse.id,
-                score=result.get('score', 0),
-                predicted_odds=result.get('trueOdds', ''),
-                win_probability=result.get('winProbability', ''),
-                performance_component=result.get('performanceComponent', ''),
-                base_probability=result.get('baseProbability', ''),
-                notes=result.get('notes', '')
-            )
-            db.session.add(prediction)
+    # Multi-row INSERT ... RETURNING doesn't promise row order on every
+    # backend, so new ids are matched back on natural keys instead
+    race_ids = {}
+    if race_rows:
+        inserted = db.session.execute(insert(Race).returning(Race.id, Race.race_number), race_rows)
+        race_ids = {race_number: race_id for race_id, race_number in inserted}
+    
+    runner_count = _insert_runners(_scored_runners(race_ids, races_data, track_condition))
     
+    meeting.race_count = len(race_rows)
+    meeting.runner_count = runner_count
+    meeting.track_condition = track_condition
+    if races_data:
+        meeting.date = backtest.calendar_date(next(iter(races_data.values()))[0]['horse'].get('meeting date'))
     db.session.commit()
     return meeting
 
 
+def _delete_runners(horse_ids):
+    """Delete horses with their predictions, tags and imported results"""
+    horse_ids = list(horse_ids)
+    if not horse_ids:
+        return
+    prediction_ids = db.select(Prediction.id).where(Prediction.horse_id.in_(horse_ids))
+    db.session.execute(delete(PredictionTag).where(PredictionTag.prediction_id.in_(prediction_ids)))
+    db.session.execute(delete(Prediction).where(Prediction.horse_id.in_(horse_ids)))
+    db.session.execute(delete(RunnerResult).where(RunnerResult.horse_id.in_(horse_ids)))
+    db.session.execute(delete(Horse).where(Horse.id.in_(horse_ids)))
+
+
+@metrics.span('update_meeting')
+def update_meeting(meeting, csv_data):
+    """
+    Bring a stored meeting up to date with a revised CSV (scratchings,
+    jockey changes): only the races whose rows changed are re-scored, and
+    their races, horses and predictions are updated in place, inserted or
+    deleted in one transaction. Runners left in a race keep their ids
+    Returns the meeting_diff.MeetingDiff (falsy when no race changed)
+    """
+    csv_text = csv_data if isinstance(csv_data, str) else csv_data.text()
+    track_condition = meeting.track_condition or 'good'
+    changes = meeting_diff.diff(meeting.csv_text, csv_text)
+    if changes.meeting_date is None:
+        raise Exception("No runners found in the revised CSV")
+    if not changes:
+        return changes
+
+    races_data = {}
+    if changes.changed:
+        races_data = _results_by_race(run_analyzer(meeting_diff.races_csv(csv_text, changes.changed), track_condition))
+
+    stored_races = dict(db.session.execute(
+        db.select(Race.race_number, Race.id).where(Race.meeting_id == meeting.id)
+    ).all())
+    touched = [stored_races[race_num] for race_num in changes.changed | changes.removed if race_num in stored_races]
+    stored = {}
+    entity_ids = set()
+    for runner in db.session.execute(
+        db.select(Horse.id, Horse.race_id, Horse.horse_name, Prediction.id.label('prediction_id'),
+                  Horse.horse_entity_id, Horse.jockey_entity_id, Horse.trainer_entity_id)
+        .outerjoin(Prediction, Prediction.horse_id == Horse.id)
+        .where(Horse.race_id.in_(touched))
+        .order_by(Horse.id)
+    ):
+        stored.setdefault((runner.race_id, runner.horse_name), []).append(runner)
+        entity_ids.update(entity_id for entity_id in runner[4:] if entity_id is not None)
+
+    # Races that are gone, or that no longer score any runner, are deleted
+    gone = [stored_races[race_num] for race_num in stored_races
+            if race_num in changes.removed or (race_num in changes.changed and race_num not in races_data)]
+    if gone:
+        _delete_runners(runner.id for key, runners in stored.items() if key[0] in gone for runner in runners)
+        db.session.execute(delete(Race).where(Race.id.in_(gone)))
+
+    new_races = [
+        dict(_race_fields(races_data[race_num], track_condition), meeting_id=meeting.id, race_number=race_num)
+        for race_num in races_data if race_num not in stored_races
+    ]
+    race_ids = {race_num: stored_races[race_num] for race_num in races_data if race_num in stored_races}
+    if new_races:
+        inserted = db.session.execute(insert(Race).returning(Race.id, Race.race_number), new_races)
+        race_ids.update({race_number: race_id for race_id, race_number in inserted})
+    kept_races = [dict(_race_fields(races_data[race_num], track_condition), id=stored_races[race_num])
+                  for race_num in races_data if race_num in stored_races]
+    if kept_races:
+        db.session.execute(update(Race), kept_races)
+
+    # Runners still in a race are matched on name and rewritten in place
+    horse_updates = []
+    prediction_updates = []
+    added = []
+    for race_id, result, sweep in _scored_runners(race_ids, races_data, track_condition):
+        matches = [runner for runner in stored.get((race_id, result['horse'].get('horse name', 'Unknown')), [])
+                   if runner.prediction_id is not None]
+        if not matches:
+            added.append((race_id, result, sweep))
+            continue
+        runner = matches[0]
+        stored[(race_id, runner.horse_name)].remove(runner)
+        horse_updates.append(dict(_horse_row(race_id, result['horse']), id=runner.id, csv_data=None))
+        prediction_updates.append(dict(_prediction_row(runner.id, result, sweep), id=runner.prediction_id, notes=None))
+
+    if horse_updates:
+        search_index.link_runners(horse_updates)
+        db.session.execute(update(Horse), horse_updates)
+        db.session.execute(update(Prediction), prediction_updates)
+        _store_prediction_tags({row['id']: row['components'] for row in prediction_updates}, replace=True)
+    _delete_runners(runner.id for key, runners in stored.items() if key[0] not in gone for runner in runners)
+    _insert_runners(added)
+
+    meeting.csv_blob_id = store_csv(csv_text).id
+    db.session.flush()
+    prune_orphan_blobs()
+    search_index.prune_entities(entity_ids)
+    meeting.race_count = db.session.scalar(
+        db.select(db.func.count()).select_from(Race).where(Race.meeting_id == meeting.id)
+    )
+    meeting.runner_count = db.session.scalar(
+        db.select(db.func.count()).select_from(Horse).join(Race, Race.id == Horse.race_id)
+        .where(Race.meeting_id == meeting.id)
+    )
+    meeting.date = backtest.calendar_date(changes.meeting_date)
+    meeting.results_version += 1
+    db.session.commit()
+    return changes
+
+
+def _store_prediction_tags(components_by_prediction, replace=False):
+    """
+    Write the prediction_tags rows for {prediction_id: components}
+    With replace, the predictions' existing tags are deleted first
+    """
+    if replace and components_by_prediction:
+        db.session.execute(
+            delete(PredictionTag).where(PredictionTag.prediction_id.in_(list(components_by_prediction)))
+        )
+    tag_rows = [
+        {'prediction_id': prediction_id, 'tag': tag}
+        for prediction_id, components in components_by_prediction.items()
+        for tag in component_tags(components)
+    ]
+    if tag_rows:
+        db.session.execute(insert(PredictionTag), tag_rows)
+
+
+def _track_records(row):
+    return {condition: row.get('horse record ' + condition) for condition in TRACK_CONDITIONS}
+
+
+def _condition_scores(sweep):
+    """A sweep_track_conditions() entry as stored on the prediction"""
+    return {
+        condition: {
+            'score': scored['score'],
+            'true_odds': parse_formatted_number(scored['trueOdds']),
+            'win_percent': parse_formatted_number(scored['winProbability'])
+        }
+        for condition, scored in sweep.items()
+    }
+
+
+def _stored_results(meeting):
+    """
+    A meeting's predictions shaped like analyzer results, each runner's row
+    holding just its race number, name and track condition records (notes
+    and components are None where they weren't stored)
+    Records missing on horses stored before they were kept are read from
+    the meeting's CSV and saved (flushed, not committed)
+    """
+    runners = db.session.execute(
+        db.select(
+            Race.race_number,
+            Horse.id.label('horse_id'),
+            Horse.horse_name,
+            Horse.track_records,
+            Horse.csv_data,
+            Prediction.id.label('prediction_id'),
+            Prediction.score,
+            Prediction.notes,
+            Prediction.components
+        )
+        .join(Horse, Horse.race_id == Race.id)
+        .join(Prediction, Prediction.horse_id == Horse.id)
+        .where(Race.meeting_id == meeting.id)
+        .order_by(Race.race_number, Horse.id)
+    ).all()
+
+    rows = None
+    backfill = []
+    results = []
+    for runner in runners:
+        track_records = runner.track_records
+        if track_records is None:
+            if rows is None:
+                csv_text = meeting.csv_text
+                rows = runner_rows(csv_text) if csv_text else {}
+            row = rows.get((runner.race_number, runner.horse_name)) or runner.csv_data
+            if row is None:
+                raise Exception(f"No stored CSV row for {runner.horse_name} (race {runner.race_number})")
+            track_records = _track_records(row)
+            backfill.append({'id': runner.horse_id, 'track_records': track_records})
+
+        horse = {'race number': str(runner.race_number), 'horse name': runner.horse_name}
+        for condition, record in track_records.items():
+            horse['horse record ' + condition] = record
+        results.append({
+            'horse': horse,
+            'score': runner.score or 0,
+            'notes': runner.notes,
+            'components': runner.components,
+            'prediction_id': runner.prediction_id
+        })
+
+    if backfill:
+        db.session.execute(update(Horse), backfill)
+    return results
+
+
+def rescore_meeting(meeting, track_condition):
+    """
+    Re-score a stored meeting for a new track condition, updating its
+    predictions in place
+    Only the track condition component and the true odds are recomputed,
+    from the condition records kept on each horse; meetings stored before
+    those existed read them from the CSV once and keep them
+    """
+    old_condition = meeting.track_condition or 'good'
+    if track_condition == old_condition:
+        return 0
+
+    results = _stored_results(meeting)
+    rescore_track_condition(results, old_condition, track_condition)
+    sweeps = sweep_track_conditions(results, track_condition)
+
+    if results:
+        db.session.execute(update(Prediction), [{
+            'id': result['prediction_id'],
+            'score': result['score'],
+            'notes': result['notes'],
+            'true_odds': parse_formatted_number(result['trueOdds']),
+            'win_percent': parse_formatted_number(result['winProbability']),
+            'performance_percent': parse_formatted_number(result['performanceComponent']),
+            'base_percent': parse_formatted_number(result['baseProbability']),
+            'components': result['components'],
+            'condition_scores': _condition_scores(sweep)
+        } for result, sweep in zip(results, sweeps)])
+        _store_prediction_tags({
+            result['prediction_id']: result['components']
+            for result in results if result['components'] is not None
+        }, replace=True)
+    Race.query\
+        .filter(Race.meeting_id == meeting.id)\
+        .update({'track_condition': track_condition}, synchronize_session=False)
+    meeting.track_condition = track_condition
+    meeting.results_version += 1
+    db.session.commit()
+    return len(results)
+
+
+def sweep_meeting(meeting):
+    """Store every track condition's scores for a meeting analyzed before sweeps"""
+    results = calculate_true_odds(_stored_results(meeting), 1)
+    sweeps = sweep_track_conditions(results, meeting.track_condition or 'good')
+    if results:
+        db.session.execute(update(Prediction), [{
+            'id': result['prediction_id'],
+            'condition_scores': _condition_scores(sweep)
+        } for result, sweep in zip(results, sweeps)])
+    meeting.results_version += 1
+    db.session.commit()
+    return len(results)
+
+
+# Component tags shown as badges under a runner's name on the meeting page
+TAG_BADGES = {
+    'elite_jockey': 'Elite jockey',
+    'undefeated_track_distance': 'Unbeaten track+dist',
+    'class_drop': 'Class drop',
+    'won_last_start': 'Won last start',
+    'fastest_avg_sectional': 'Fastest avg sectional',
+    'fastest_last_start_sectional': 'Fastest last sectional',
+    'combo_bonus': 'Combo',
+}
+
+
+def meeting_tag_counts(meeting_id):
+    """How many of a meeting's runners earned each component tag"""
+    return dict(db.session.execute(
+        db.select(PredictionTag.tag, db.func.count())
+        .join(Prediction, Prediction.id == PredictionTag.prediction_id)
+        .join(Horse, Horse.id == Prediction.horse_id)
+        .join(Race, Race.id == Horse.race_id)
+        .where(Race.meeting_id == meeting_id)
+        .group_by(PredictionTag.tag)
+    ).all())
+
+
+def _reanalyze(meeting, track_condition):
+    """
+    Analyzer results for a stored meeting's CSV (usually from the analysis
+    cache), keyed by (race number, horse name) as stored
+    """
+    csv_text = meeting.csv_text
+    if not csv_text:
+        raise Exception("The meeting's CSV is no longer stored")
+    analysis = {}
+    for result in run_analyzer(csv_text, track_condition):
+        race_num = result['horse'].get('race number', '0')
+        if race_num and str(race_num).isdigit():
+            analysis[(int(race_num), result['horse'].get('horse name', 'Unknown'))] = result
+    return analysis
+
+
+def _meeting_runners(meeting_id, *columns):
+    return db.session.execute(
+        db.select(Race.race_number, Horse.horse_name, *columns)
+        .join(Horse, Horse.race_id == Race.id)
+        .join(Prediction, Prediction.horse_id == Horse.id)
+        .where(Race.meeting_id == meeting_id)
+    ).all()
+
+
+def meeting_notes(meeting, track_condition):
+    """
+    {horse_id: notes} for a meeting scored under track_condition
+    Notes are no longer stored, so they're regenerated from the CSV; older
+    meetings' stored notes are used for the condition they were analyzed for
+    """
+    runners = _meeting_runners(meeting.id, Horse.id.label('horse_id'), Prediction.notes)
+    if track_condition == (meeting.track_condition or 'good') and all(r.notes is not None for r in runners):
+        return {runner.horse_id: runner.notes for runner in runners}
+
+    analysis = _reanalyze(meeting, track_condition)
+    return {
+        runner.horse_id: analysis.get((runner.race_number, runner.horse_name), {}).get('notes', '')
+        for runner in runners
+    }
+
+
+def backfill_components(meeting):
+    """Store score components and tags for a meeting analyzed before they were kept"""
+    runners = _meeting_runners(meeting.id, Prediction.id.label('prediction_id'))
+    analysis = _reanalyze(meeting, meeting.track_condition or 'good')
+    components = {
+        runner.prediction_id: analysis.get((runner.race_number, runner.horse_name), {}).get('components', [])
+        for runner in runners
+    }
+    if components:
+        db.session.execute(update(Prediction), [
+            {'id': prediction_id, 'components': runner_components}
+            for prediction_id, runner_components in components.items()
+        ])
+        _store_prediction_tags(components, replace=True)
+    meeting.results_version += 1
+    db.session.commit()
+    return len(components)
+
+
+@metrics.span('meeting_results')
 def get_meeting_results(meeting_id):
     """
-    Retrieve meeting results formatted for display
+    Retrieve meeting results shaped for display (numbers are formatted by
+    the odds/percent template filters)
+    Races, horses and predictions come from one joined query, already
+    ordered by race number and then score (highest first)
     """
     meeting = Meeting.query.get_or_404(meeting_id)
-    races = Race.query.filter_by(meeting_id=meeting_id).order_by(Race.race_number).all()
     
     results = {
         'meeting_name': meeting.meeting_name,
         'uploaded_at': meeting.uploaded_at,
-        'races': []
+        'races': [],
+        # Track conditions the page can switch between (every runner has a sweep)
+        'conditions': TRACK_CONDITIONS,
+        # Whether every runner's notes were stored (older meetings); otherwise
+        # the page fetches them from meeting_notes_view
+        'notes_stored': True,
+        # {tag: runners} from the prediction_tags index, for the filter bar
+        'tag_counts': meeting_tag_counts(meeting_id)
     }
     
-    for race in races:
-        horses = Horse.query.filter_by(race_id=race.id).all()
-        
-        race_data = {
-            'race_number': race.race_number,
-            'distance': race.distance,
-            'race_class': race.race_class,
-            'track_condition': race.track_condition,
-            'horses': []
-        }
-        
-        for horse in horses:
-            pred = horse.prediction
-            horse_data = {
-                'horse_name': horse.horse_name,
-                'barrier': horse.barrier,
-                'weight': horse.weight,
-                'jockey': horse.jockey,
-                'trainer': horse.trainer,
-                'form': horse.form,
-                'score': pred.score if pred else 0,
-                'odds': pred.predicted_odds if pred else '',
-                'win_probability': pred.win_probability if pred else '',
-                'performance_component': pred.performance_component if pred else '',
-                'base_probability': pred.base_probability if pred else '',
-                'notes': pred.notes if pred else ''
+    score = db.func.coalesce(Prediction.score, 0)
+    rows = db.session.execute(
+        db.select(
+            Race.id.label('race_id'),
+            Race.race_number,
+            Race.distance,
+            Race.race_class,
+            Race.track_condition,
+            Horse.id.label('horse_id'),
+            Horse.horse_name,
+            Horse.barrier,
+            Horse.weight,
+            Horse.jockey,
+            Horse.trainer,
+            Horse.form,
+            score.label('score'),
+            Prediction.true_odds,
+            Prediction.win_percent,
+            Prediction.performance_percent,
+            Prediction.base_percent,
+            Prediction.notes,
+            Prediction.components,
+            Prediction.condition_scores
+        )
+        .select_from(Race)
+        .outerjoin(Horse, Horse.race_id == Race.id)
+        .outerjoin(Prediction, Prediction.horse_id == Horse.id)
+        .where(Race.meeting_id == meeting_id)
+        .order_by(Race.race_number, Race.id, score.desc(), Horse.id)
+    )
+    
+    race_data = None
+    current_race_id = None
+    for row in rows:
+        if row.race_id != current_race_id:
+            current_race_id = row.race_id
+            race_data = {
+                'race_number': row.race_number,
+                'distance': row.distance,
+                'race_class': row.race_class,
+                'track_condition': row.track_condition,
+                'horses': []
             }
-            race_data['horses'].append(horse_data)
+            results['races'].append(race_data)
+        
+        # Races without horses still come back once from the outer join
+        if row.horse_id is None:
+            continue
         
-        # Sort horses by score descending
-        race_data['horses'].sort(key=lambda x: x['score'], reverse=True)
-        results['races'].append(race_data)
+        race_data['horses'].append({
+            'horse_name': row.horse_name,
+            'barrier': row.barrier,
+            'weight': row.weight,
+            'jockey': row.jockey,
+            'trainer': row.trainer,
+            'form': row.form,
+            'score': row.score,
+            'true_odds': row.true_odds,
+            'win_percent': row.win_percent,
+            'performance_percent': row.performance_percent,
+            'base_percent': row.base_percent,
+            'notes': row.notes or '',
+            'tags': component_tags(row.components),
+            'horse_id': row.horse_id,
+            'condition_scores': row.condition_scores
+        })
+        if row.condition_scores is None:
+            results['conditions'] = ()
+        if row.notes is None:
+            results['notes_stored'] = False
     
     return results
 
 
+# ----- Template Filters -----
+@app.template_filter('odds')
+def format_odds(value):
+    """4.5 -> '$4.50'"""
+    return '' if value is None else f"${value:.2f}"
+
+
+@app.template_filter('percent')
+def format_percent(value):
+    """23.1 -> '23.1%'"""
+    return '' if value is None else f"{value:.1f}%"
+
+
 # ----- Routes -----
 @app.route("/")
 def home():
@@ -264,36 +868,62 @@ def logout():
 def dashboard():
     # Get all recent meetings (shared across all users)
     recent_meetings = Meeting.query\
-        .order_by(Meeting.uploaded_at.desc())\
+        .order_by(Meeting.uploaded_at.desc(), Meeting.id.desc())\
         .limit(5)\
         .all()
-    return render_template("dashboard.html", recent_meetings=recent_meetings)
+    # This user's uploads still waiting on the analysis worker, plus recent failures
+    pending_jobs = AnalysisJob.query\
+        .filter(AnalysisJob.user_id == current_user.id)\
+        .filter(db.or_(
+            AnalysisJob.status.in_(['queued', 'running']),
+            db.and_(AnalysisJob.status == 'failed', AnalysisJob.finished_at > datetime.utcnow() - timedelta(hours=1))
+        ))\
+        .order_by(AnalysisJob.queued_at)\
+        .all()
+    return render_template("dashboard.html", recent_meetings=recent_meetings, pending_jobs=pending_jobs)
 
 
 @app.route("/analyze", methods=["POST"])
 @login_required
 def analyze():
-    """Handle CSV upload and run analysis"""
-    csv_file = request.files.get("csv_file")
+    """Handle CSV upload and run analysis; several files (or a zip) run as a batch"""
+    csv_files = [f for f in request.files.getlist("csv_file") if f and f.filename]
     
-    if not csv_file or csv_file.filename == '':
+    if not csv_files:
         flash("Please select a CSV file", "danger")
         return redirect(url_for("dashboard"))
     
-    if not csv_file.filename.endswith('.csv'):
-        flash("Please upload a CSV file", "danger")
-        return redirect(url_for("dashboard"))
-    
     track_condition = request.form.get("track_condition", "good")
     is_advanced = bool(request.form.get("advanced_mode"))
     
+    if len(csv_files) > 1 or csv_files[0].filename.lower().endswith('.zip'):
+        return analyze_batch(csv_files, track_condition, is_advanced)
+    
+    csv_file = csv_files[0]
+    if not csv_file.filename.endswith('.csv'):
+        flash("Please upload a CSV or zip file", "danger")
+        return redirect(url_for("dashboard"))
+    
     try:
-        # Read CSV data
-        csv_data = csv_file.read().decode('utf-8')
+        # Read the upload once, in chunks, validating as it streams in
+        upload = read_upload(csv_file.stream)
+        
+        if app.config['ANALYSIS_QUEUE']:
+            job = AnalysisJob(
+                user_id=current_user.id,
+                filename=csv_file.filename,
+                csv_data=upload.text(),
+                track_condition=track_condition,
+                is_advanced=is_advanced
+            )
+            db.session.add(job)
+            db.session.commit()
+            flash(f"{csv_file.filename} queued for analysis", "info")
+            return redirect(url_for("job_status", job_id=job.id))
         
         # Process and store results
         meeting = process_and_store_results(
-            csv_data=csv_data,
+            csv_data=upload,
             filename=csv_file.filename,
             track_condition=track_condition,
             user_id=current_user.id,
@@ -308,14 +938,138 @@ def analyze():
         return redirect(url_for("dashboard"))
 
 
+def analyze_batch(csv_files, track_condition, is_advanced):
+    """Analyze (or queue) every CSV of a multi-file upload and report on each"""
+    started = time.perf_counter()
+    try:
+        batch = batch_analysis.collect_files(csv_files, app.config['ANALYSIS_BATCH_MAX_FILES'])
+    except Exception as e:
+        flash(f"Analysis failed: {str(e)}", "danger")
+        return redirect(url_for("dashboard"))
+    
+    if app.config['ANALYSIS_QUEUE']:
+        for batch_file in batch:
+            if batch_file.error:
+                continue
+            batch_file.job = AnalysisJob(
+                user_id=current_user.id,
+                filename=batch_file.filename,
+                csv_data=batch_file.upload.text(),
+                track_condition=track_condition,
+                is_advanced=is_advanced
+            )
+            db.session.add(batch_file.job)
+        db.session.commit()
+    else:
+        process_and_store_batch(batch, track_condition, current_user.id, is_advanced)
+    
+    failed = sum(1 for batch_file in batch if batch_file.error)
+    flash(
+        f"{len(batch) - failed} of {len(batch)} file(s) {'queued' if app.config['ANALYSIS_QUEUE'] else 'analyzed'}",
+        "success" if not failed else ("warning" if failed < len(batch) else "danger")
+    )
+    return render_template(
+        "batch_results.html",
+        batch=batch,
+        track_condition=track_condition,
+        seconds=time.perf_counter() - started
+    )
+
+
+def _get_job_or_404(job_id):
+    job = AnalysisJob.query.get_or_404(job_id)
+    if job.user_id != current_user.id and not current_user.is_admin:
+        abort(404)
+    return job
+
+
+def job_to_dict(job):
+    """Job status as returned by the polling endpoint"""
+    ahead = None
+    if job.status == 'queued':
+        ahead = AnalysisJob.query.filter(AnalysisJob.status == 'queued', AnalysisJob.id < job.id).count()
+    return {
+        'id': job.id,
+        'filename': job.filename,
+        'status': job.status,
+        'error': job.error,
+        'jobs_ahead': ahead,
+        'meeting_url': url_for('view_meeting', meeting_id=job.meeting_id) if job.meeting_id else None,
+        'queued_at': job.queued_at.isoformat() if job.queued_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'queue_seconds': job.queue_seconds,
+        'run_seconds': job.run_seconds
+    }
+
+
+@app.route("/jobs/<int:job_id>")
+@login_required
+def job_status(job_id):
+    """Progress page for a queued upload; polls job_status_json"""
+    job = _get_job_or_404(job_id)
+    if job.status == 'finished' and job.meeting_id:
+        return redirect(url_for("view_meeting", meeting_id=job.meeting_id))
+    return render_template("job_status.html", job=job)
+
+
+@app.route("/jobs/<int:job_id>/status")
+@login_required
+def job_status_json(job_id):
+    return jsonify(job_to_dict(_get_job_or_404(job_id)))
+
+
+HISTORY_PAGE_SIZE = 50
+
+
+def _history_cursor(meeting):
+    return f"{meeting.uploaded_at.isoformat()}_{meeting.id}"
+
+
+def _parse_history_cursor(value):
+    """(uploaded_at, id) from a cursor, or None if it's malformed"""
+    uploaded_at, _, meeting_id = value.rpartition('_')
+    try:
+        return datetime.fromisoformat(uploaded_at), int(meeting_id)
+    except ValueError:
+        return None
+
+
 @app.route("/history")
 @login_required
 def history():
-    # Get all meetings (shared across all users)
-    meetings = Meeting.query\
-        .order_by(Meeting.uploaded_at.desc())\
-        .all()
-    return render_template("history.html", meetings=meetings)
+    """
+    Meetings newest first, a page at a time
+    Keyset pagination on (uploaded_at, id): ?before=<cursor> pages back in
+    time, ?after=<cursor> forward, so every page costs the same however deep
+    """
+    before = _parse_history_cursor(request.args.get('before', ''))
+    after = _parse_history_cursor(request.args.get('after', ''))
+    position = db.tuple_(Meeting.uploaded_at, Meeting.id)
+    
+    # Get meetings (shared across all users)
+    query = Meeting.query.options(db.joinedload(Meeting.user))
+    if after:
+        query = query.filter(position > after)\
+            .order_by(Meeting.uploaded_at.asc(), Meeting.id.asc())
+    else:
+        if before:
+            query = query.filter(position < before)
+        query = query.order_by(Meeting.uploaded_at.desc(), Meeting.id.desc())
+    
+    meetings = query.limit(HISTORY_PAGE_SIZE + 1).all()
+    more = len(meetings) > HISTORY_PAGE_SIZE
+    meetings = meetings[:HISTORY_PAGE_SIZE]
+    if after:
+        meetings.reverse()
+    
+    has_newer = more if after else bool(before)
+    has_older = True if after else more
+    newer_cursor = _history_cursor(meetings[0]) if meetings and has_newer else None
+    older_cursor = _history_cursor(meetings[-1]) if meetings and has_older else None
+    
+    return render_template("history.html", meetings=meetings,
+                           newer_cursor=newer_cursor, older_cursor=older_cursor)
 
 
 @app.route("/meeting/<int:meeting_id>")
@@ -326,7 +1080,87 @@ def view_meeting(meeting_id):
     
     # All logged-in users can view all meetings
     results = get_meeting_results(meeting_id)
-    return render_template("view_meeting.html", meeting=meeting, results=results)
+    return render_template("view_meeting.html", meeting=meeting, results=results,
+                           track_conditions=TRACK_CONDITIONS, tag_badges=TAG_BADGES)
+
+
+@app.route("/meeting/<int:meeting_id>/rescore", methods=["POST"])
+@login_required
+def rescore_meeting_view(meeting_id):
+    """Re-score a meeting for a changed track condition without re-uploading"""
+    meeting = Meeting.query.get_or_404(meeting_id)
+    
+    if meeting.user_id != current_user.id and not current_user.is_admin:
+        flash("You don't have permission to re-score this meeting", "danger")
+        return redirect(url_for("view_meeting", meeting_id=meeting_id))
+    
+    track_condition = request.form.get("track_condition", "")
+    if track_condition not in TRACK_CONDITIONS:
+        flash("Please choose a track condition", "danger")
+        return redirect(url_for("view_meeting", meeting_id=meeting_id))
+    
+    try:
+        started = time.perf_counter()
+        rescored = rescore_meeting(meeting, track_condition)
+        flash(
+            f"Re-scored {rescored} runners for a {track_condition.capitalize()} track "
+            f"in {(time.perf_counter() - started) * 1000:.0f} ms",
+            "success"
+        )
+    except Exception as e:
+        db.session.rollback()
+        flash(f"Re-score failed: {str(e)}", "danger")
+    return redirect(url_for("view_meeting", meeting_id=meeting_id))
+
+
+@app.route("/meeting/<int:meeting_id>/update", methods=["POST"])
+@login_required
+def update_meeting_view(meeting_id):
+    """Apply a revised CSV (scratchings, jockey changes) to a meeting, re-scoring only the races that changed"""
+    meeting = Meeting.query.get_or_404(meeting_id)
+    
+    if meeting.user_id != current_user.id and not current_user.is_admin:
+        flash("You don't have permission to update this meeting", "danger")
+        return redirect(url_for("view_meeting", meeting_id=meeting_id))
+    
+    csv_file = request.files.get("csv_file")
+    if not csv_file or not csv_file.filename.endswith('.csv'):
+        flash("Please select the revised CSV file", "danger")
+        return redirect(url_for("view_meeting", meeting_id=meeting_id))
+    
+    try:
+        started = time.perf_counter()
+        changes = update_meeting(meeting, read_upload(csv_file.stream))
+        if not changes:
+            flash("No race changed in the revised CSV", "info")
+        else:
+            flash(
+                f"Updated {len(changes.changed | changes.removed)} of {meeting.race_count} races "
+                f"in {(time.perf_counter() - started) * 1000:.0f} ms. " + ' '.join(
+                    line + '.' for line in changes.summary()
+                ),
+                "success"
+            )
+    except Exception as e:
+        db.session.rollback()
+        flash(f"Update failed: {str(e)}", "danger")
+    return redirect(url_for("view_meeting", meeting_id=meeting_id))
+
+
+@app.route("/meeting/<int:meeting_id>/notes")
+@login_required
+def meeting_notes_view(meeting_id):
+    """Every runner's notes for one track condition, as {horse_id: notes}"""
+    meeting = Meeting.query.get_or_404(meeting_id)
+    
+    track_condition = request.args.get("condition") or meeting.track_condition or 'good'
+    if track_condition not in TRACK_CONDITIONS:
+        return jsonify({'error': 'Unknown track condition'}), 400
+    
+    try:
+        return jsonify(meeting_notes(meeting, track_condition))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 
 @app.route("/meeting/<int:meeting_id>/delete", methods=["POST"])
@@ -339,13 +1173,42 @@ def delete_meeting(meeting_id):
         flash("You don't have permission to delete this meeting", "danger")
         return redirect(url_for("history"))
     
+    entity_ids = search_index.meeting_entity_ids(meeting.id)
     db.session.delete(meeting)
+    db.session.flush()
+    prune_orphan_blobs()
+    search_index.prune_entities(entity_ids)
     db.session.commit()
     
     flash(f"Meeting '{meeting.meeting_name}' deleted", "success")
     return redirect(url_for("history"))
 
 
+@app.route("/search")
+@login_required
+def search():
+    """Horses, jockeys and trainers across every stored meeting"""
+    query = request.args.get("q", "").strip()
+    kind = request.args.get("kind") or None
+    if kind not in search_index.KINDS:
+        kind = None
+    started = time.perf_counter()
+    results = search_index.search(query, kind) if query else []
+    return render_template("search.html", query=query, kind=kind, results=results,
+                           kinds=search_index.KINDS, elapsed_ms=(time.perf_counter() - started) * 1000)
+
+
+@app.route("/entities/<int:entity_id>")
+@login_required
+def view_entity(entity_id):
+    """Every stored run of one horse, jockey or trainer, newest first"""
+    entity = Entity.query.get_or_404(entity_id)
+    runs, next_before = search_index.entity_runs(entity, 50, request.args.get("before", type=int))
+    aliases = sorted(alias.alias for alias in entity.aliases if alias.alias != entity.name)
+    return render_template("entity.html", entity=entity, runs=runs, aliases=aliases,
+                           total=search_index.run_counts([entity]).get(entity.id, 0), next_before=next_before)
+
+
 @app.route("/admin", methods=["GET", "POST"])
 @login_required
 def admin_panel():
@@ -387,7 +1250,13 @@ def admin_panel():
                 flash("You cannot delete your own account", "danger")
             else:
                 username = user.username
+                entity_ids = set()
+                for meeting in user.meetings:
+                    entity_ids |= search_index.meeting_entity_ids(meeting.id)
                 db.session.delete(user)
+                db.session.flush()
+                prune_orphan_blobs()
+                search_index.prune_entities(entity_ids)
                 db.session.commit()
                 flash(f"User '{username}' deleted", "success")
         
@@ -451,13 +1320,33 @@ def admin_panel():
         
         return redirect(url_for("admin_panel"))
     
-    # Get stats
-    users = User.query.all()
-    total_meetings = Meeting.query.count()
+    # Get stats - meeting and runner totals for every user in one grouped query
+    meeting_stats = db.select(
+        Meeting.user_id,
+        db.func.count(Meeting.id).label('meeting_count'),
+        db.func.max(Meeting.uploaded_at).label('last_upload')
+    ).group_by(Meeting.user_id).subquery()
+    runner_stats = db.select(
+        Meeting.user_id,
+        db.func.count(Horse.id).label('runner_count')
+    ).join(Race, Race.meeting_id == Meeting.id)\
+        .join(Horse, Horse.race_id == Race.id)\
+        .group_by(Meeting.user_id).subquery()
+    
+    rows = db.session.execute(
+        db.select(
+            User,
+            db.func.coalesce(meeting_stats.c.meeting_count, 0),
+            meeting_stats.c.last_upload,
+            db.func.coalesce(runner_stats.c.runner_count, 0)
+        )
+        .outerjoin(meeting_stats, meeting_stats.c.user_id == User.id)
+        .outerjoin(runner_stats, runner_stats.c.user_id == User.id)
+        .order_by(User.id)
+    ).all()
     
     users_data = []
-    for user in users:
-        meeting_count = Meeting.query.filter_by(user_id=user.id).count()
+    for user, meeting_count, last_upload, runner_count in rows:
         users_data.append({
             'id': user.id,
             'username': user.username,
@@ -465,19 +1354,138 @@ def admin_panel():
             'is_admin': user.is_admin,
             'is_active': user.is_active,
             'meeting_count': meeting_count,
+            'last_upload': last_upload,
+            'runner_count': runner_count,
             'last_login': user.last_login,
             'created_at': user.created_at
         })
     
     stats = {
-        'total_users': len(users),
-        'total_meetings': total_meetings,
-        'users': users_data
+        'total_users': len(users_data),
+        'total_meetings': sum(user['meeting_count'] for user in users_data),
+        'users': users_data,
+        'analysis_cache': analysis_cache.summary()
     }
     
     return render_template("admin.html", stats=stats)
 
 
+def api_auth_required(view):
+    """A logged-in user or an API_TOKENS bearer; anything else gets a JSON 401"""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        authorization = request.headers.get('Authorization', '')
+        if not any(hmac.compare_digest(authorization, f"Bearer {token}") for token in app.config['API_TOKENS']):
+            if not current_user.is_authenticated:
+                return jsonify({'error': 'Authentication required'}), 401
+        return view(*args, **kwargs)
+    return wrapped
+
+
+@app.route("/api/v1/meetings")
+@api_auth_required
+def api_meetings():
+    """Meetings newest first; ?limit= (max 200), ?before=<id> for the next page, ?fields="""
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    return results_api.meeting_list_response(limit, request.args.get('before', type=int))
+
+
+@app.route("/api/v1/meetings/<int:meeting_id>")
+@api_auth_required
+def api_meeting(meeting_id):
+    """A meeting with every race and runner; ?fields= picks runner fields"""
+    return results_api.meeting_resource_response(meeting_id, 'meeting')
+
+
+@app.route("/api/v1/meetings/<int:meeting_id>/races/<int:race_number>")
+@api_auth_required
+def api_race(meeting_id, race_number):
+    """One race of a meeting with its runners ranked; ?fields= picks runner fields"""
+    return results_api.meeting_resource_response(meeting_id, f'race:{race_number}')
+
+
+@app.route("/api/v1/meetings/<int:meeting_id>/runners/<int:horse_id>")
+@api_auth_required
+def api_runner(meeting_id, horse_id):
+    """One runner of a meeting; ?fields= picks its fields"""
+    return results_api.meeting_resource_response(meeting_id, f'runner:{horse_id}')
+
+
+@app.route("/api/v1/search")
+@api_auth_required
+def api_search():
+    """Entities matching ?q=, optionally of one ?kind= (horse, jockey, trainer); ?limit= max 100"""
+    kind = request.args.get("kind") or None
+    if kind is not None and kind not in search_index.KINDS:
+        return jsonify({'error': f"kind must be one of {', '.join(search_index.KINDS)}"}), 400
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    return jsonify({'results': search_index.search(request.args.get("q", ""), kind, limit)})
+
+
+@app.route("/api/v1/entities/<int:entity_id>/runs")
+@api_auth_required
+def api_entity_runs(entity_id):
+    """An entity's stored runs newest first; ?limit= (max 200), ?before=<next> for the next page"""
+    entity = db.session.get(Entity, entity_id)
+    if entity is None:
+        return jsonify({'error': 'Entity not found'}), 404
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    runs, next_before = search_index.entity_runs(entity, limit, request.args.get('before', type=int))
+    for run in runs:
+        for field in ('meeting_date', 'uploaded_at'):
+            run[field] = run[field].isoformat() if run[field] else None
+    return jsonify({
+        'entity': {'id': entity.id, 'kind': entity.kind, 'name': entity.name},
+        'runs': runs,
+        'next': next_before
+    })
+
+
+def _metric_gauges():
+    """Analyzer queue depth and analysis job counts, read when /metrics is scraped"""
+    gauges = []
+    for name, pool in (('requests', current_pool()), ('batch', batch_analysis.current_node_pool())):
+        if pool is None:
+            continue
+        stats = pool.stats()
+        for state in ('idle', 'busy'):
+            gauges.append(('formanalyst_analyzer_workers', 'analyzer.js workers by state',
+                           {'pool': name, 'state': state}, stats[state]))
+        gauges.append(('formanalyst_analyzer_waiting', 'Analyses waiting for a free analyzer.js worker',
+                       {'pool': name}, stats['waiting']))
+    
+    job_counts = dict(db.session.execute(
+        db.select(AnalysisJob.status, db.func.count())
+        .where(AnalysisJob.status.in_(['queued', 'running']))
+        .group_by(AnalysisJob.status)
+    ).all())
+    for status in ('queued', 'running'):
+        gauges.append(('formanalyst_analysis_jobs', 'Queued uploads (ANALYSIS_QUEUE) by status',
+                       {'status': status}, job_counts.get(status, 0)))
+    return gauges
+
+
+def _metric_counters():
+    """Totals the analyzer pools keep themselves, read when /metrics is scraped"""
+    counters = []
+    for name, pool in (('requests', current_pool()), ('batch', batch_analysis.current_node_pool())):
+        if pool is not None:
+            counters.append(('formanalyst_analyzer_restarts_total', 'analyzer.js workers replaced since the pool started',
+                             {'pool': name}, pool.stats()['restarts']))
+    return counters
+
+
+@app.route("/metrics")
+def metrics_view():
+    """Prometheus metrics for this process (admins, or the METRICS_TOKEN bearer)"""
+    token = app.config['METRICS_TOKEN']
+    authorization = request.headers.get('Authorization', '')
+    if not (token and hmac.compare_digest(authorization, f"Bearer {token}")):
+        if not current_user.is_authenticated or not current_user.is_admin:
+            abort(403)
+    return Response(metrics.render(_metric_gauges(), _metric_counters()), mimetype='text/plain; version=0.0.4')
+
+
 # Error handlers
 @app.errorhandler(404)
 def not_found_error(error):
@@ -490,6 +1498,223 @@ def internal_error(error):
     return render_template('500.html'), 500
 
 
+# ----- CLI Commands -----
+PARITY_FIELDS = ['score', 'notes', 'components', 'winProbability', 'baseProbability', 'trueOdds',
+                 'rawWinProbability', 'performanceComponent', 'adjustedScore']
+
+
+@app.cli.command("check-analyzer-parity")
+@click.argument("csv_files", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("--condition", "conditions", multiple=True,
+              default=['firm', 'good', 'soft', 'heavy', 'synthetic'],
+              help="Track condition(s) to compare (default: all)")
+def check_analyzer_parity(csv_files, conditions):
+    """
+    Run analyzer.js and scoring.py over the same CSVs and report any result
+    that differs. Exits non-zero on a mismatch.
+    """
+    mismatches = 0
+    for path in csv_files:
+        with open(path, encoding='utf-8') as f:
+            csv_data = f.read()
+
+        for condition in conditions:
+            node_results = run_analyzer(csv_data, condition, engine='node', use_cache=False)
+            python_results = run_analyzer(csv_data, condition, engine='python', use_cache=False)
+
+            if len(node_results) != len(python_results):
+                click.echo(f"{path} [{condition}]: {len(node_results)} results from node, {len(python_results)} from python")
+                mismatches += 1
+                continue
+
+            for node_result, python_result in zip(node_results, python_results):
+                name = node_result['horse'].get('horse name')
+                if node_result['horse'] != python_result['horse']:
+                    click.echo(f"{path} [{condition}]: runner order differs at {name}")
+                    mismatches += 1
+                    break
+                for field in PARITY_FIELDS:
+                    if node_result[field] != python_result[field]:
+                        click.echo(f"{path} [{condition}] {name} {field}: {node_result[field]!r} != {python_result[field]!r}")
+                        mismatches += 1
+
+            click.echo(f"{path} [{condition}]: {len(node_results)} runners compared")
+
+    if mismatches:
+        raise SystemExit(f"{mismatches} mismatch(es) between analyzer engines")
+    click.echo("Engines match")
+
+
+@app.cli.command("db-upgrade")
+def db_upgrade():
+    """Apply pending schema migrations (also done at startup)"""
+    if not migrations.upgrade(echo=click.echo):
+        click.echo("Schema is up to date")
+
+
+@app.cli.command("migrate-csv-storage")
+@click.option("--batch-size", default=50, show_default=True, help="Meetings converted per transaction")
+@click.option("--no-vacuum", is_flag=True, help="Skip VACUUM (FULL on Postgres, which locks meetings and horses)")
+def migrate_csv_storage(batch_size, no_vacuum):
+    """
+    One-off: move stored CSVs into compressed, deduplicated csv_blobs and
+    drop the per-horse row copies. Safe to re-run.
+    """
+    migrate_legacy_storage(batch_size=batch_size, vacuum=not no_vacuum, echo=click.echo)
+
+
+@app.cli.command("sweep-conditions")
+def sweep_conditions():
+    """
+    One-off: score every track condition for meetings analyzed before
+    sweeps were stored, so their pages can switch condition. Safe to re-run.
+    """
+    pending = db.session.execute(
+        db.select(Race.meeting_id)
+        .join(Horse, Horse.race_id == Race.id)
+        .join(Prediction, Prediction.horse_id == Horse.id)
+        .where(Prediction.condition_scores.is_(None))
+        .distinct()
+        .order_by(Race.meeting_id)
+    ).scalars().all()
+    
+    swept = failed = 0
+    for meeting_id in pending:
+        meeting = db.session.get(Meeting, meeting_id)
+        try:
+            runners = sweep_meeting(meeting)
+            swept += 1
+            click.echo(f"{meeting.meeting_name}: {runners} runners")
+        except Exception as e:
+            db.session.rollback()
+            failed += 1
+            click.echo(f"{meeting.meeting_name}: FAILED - {e}")
+        db.session.expunge_all()
+    click.echo(f"Swept {swept} meeting(s), {failed} failed")
+
+
+@app.cli.command("backfill-components")
+def backfill_components_command():
+    """
+    One-off: store score components and filter tags for meetings analyzed
+    before they were kept, by re-analyzing their CSVs. Safe to re-run.
+    """
+    pending = db.session.execute(
+        db.select(Race.meeting_id)
+        .join(Horse, Horse.race_id == Race.id)
+        .join(Prediction, Prediction.horse_id == Horse.id)
+        .where(Prediction.components.is_(None))
+        .distinct()
+        .order_by(Race.meeting_id)
+    ).scalars().all()
+    
+    filled = failed = 0
+    for meeting_id in pending:
+        meeting = db.session.get(Meeting, meeting_id)
+        try:
+            runners = backfill_components(meeting)
+            filled += 1
+            click.echo(f"{meeting.meeting_name}: {runners} runners")
+        except Exception as e:
+            db.session.rollback()
+            failed += 1
+            click.echo(f"{meeting.meeting_name}: FAILED - {e}")
+        db.session.expunge_all()
+    click.echo(f"Backfilled {filled} meeting(s), {failed} failed")
+
+
+@app.cli.command("update-meeting")
+@click.argument("meeting_id", type=int)
+@click.argument("csv_file", type=click.File("r", encoding="utf-8-sig"))
+def update_meeting_command(meeting_id, csv_file):
+    """Apply a revised CSV to a stored meeting, re-scoring only the races that changed"""
+    meeting = db.session.get(Meeting, meeting_id)
+    if meeting is None:
+        raise click.ClickException(f"No meeting {meeting_id}")
+    changes = update_meeting(meeting, csv_file.read())
+    if not changes:
+        click.echo("No race changed")
+        return
+    for line in changes.summary():
+        click.echo(line)
+    click.echo(f"Re-scored {len(changes.changed)} of {meeting.race_count} races")
+
+
+@app.cli.command("index-runners")
+@click.option("--batch-size", default=5000, show_default=True, help="Runners linked per transaction")
+def index_runners_command(batch_size):
+    """
+    One-off: add runners stored before the search index to it (their horse,
+    jockey and trainer entities). Safe to re-run.
+    """
+    linked = search_index.index_runners(batch_size, echo=click.echo)
+    click.echo(f"Indexed {linked} runner(s) as {Entity.query.count()} horses, jockeys and trainers")
+
+
+@app.cli.command("import-results")
+@click.argument("results_csv", type=click.File("r", encoding="utf-8-sig"))
+def import_results_command(results_csv):
+    """
+    Import official results (meeting date, horse name, position and
+    optionally starting price per row) for backtesting. Re-importing a
+    runner replaces its result.
+    """
+    results = backtest.read_results(results_csv.read())
+    matched, unmatched = backtest.import_results(results)
+    click.echo(f"Matched {matched} of {len(results)} result(s) to stored runners")
+    for result in unmatched[:20]:
+        click.echo(f"  no stored runner: {result['date']} {result['horse']}")
+    if len(unmatched) > 20:
+        click.echo(f"  ... and {len(unmatched) - 20} more")
+
+
+def _echo_backtest(report):
+    models = report['models']
+    click.echo(f"{report['meetings']} meeting(s), {models['stored'].get('races', 0)} race(s) with a winner\n")
+    if not models['stored'].get('races'):
+        return
+
+    def number(value, fmt):
+        return format(value, fmt) if value is not None else '-'
+
+    click.echo(f"{'':<22}" + ''.join(f"{name:>12}" for name in models))
+    for label, key, fmt in (('Strike rate', 'strike_rate', '.1%'), ('ROI at true odds', 'roi_true_odds', '+.1%'),
+                            ('ROI at SP', 'roi_starting_price', '+.1%'), ('Log loss', 'log_loss', '.4f'),
+                            ('Brier score', 'brier', '.4f')):
+        click.echo(f"{label:<22}" + ''.join(f"{number(model[key], fmt):>12}" for model in models.values()))
+
+    for name, model in models.items():
+        click.echo(f"\nCalibration ({name}): band, runners, predicted, actual")
+        for band in model['calibration']:
+            if band['runners']:
+                click.echo(f"  {band['band']:<10} {band['runners']:>8} {band['predicted']:>9.1%} {band['actual']:>7.1%}")
+        click.echo(f"\nComponents ({name}): weight, runners scoring, win-rate lift, "
+                   f"strike rate change and log loss change from having it")
+        for component in model['components']:
+            click.echo(f"  {component['component']:<20} {component['weight']:>5.2f} {component['runners_scoring']:>8} "
+                       f"{number(component['win_rate_lift'], '.2f'):>6} {component['strike_rate_change']:>+8.2%} "
+                       f"{component['log_loss_change']:>+8.4f}")
+
+
+@app.cli.command("backtest")
+@click.option("--config", "config_file", type=click.File("r"), help="Candidate configuration (JSON) to compare")
+@click.option("--rescore", is_flag=True, help="Score every meeting's CSV again instead of reading stored components")
+@click.option("--since", type=click.DateTime(["%Y-%m-%d"]), help="First meeting date")
+@click.option("--until", type=click.DateTime(["%Y-%m-%d"]), help="Last meeting date")
+@click.option("--workers", type=int, default=0, help="Processes for re-scoring (0 = one per CPU)")
+@click.option("--output", type=click.File("w"), help="Also write the report as JSON")
+def backtest_command(config_file, rescore, since, until, workers, output):
+    """Measure the stored model (and a candidate configuration) against imported results"""
+    started = time.perf_counter()
+    config = backtest.load_config(config_file.read()) if config_file else None
+    report = backtest.run(since.date() if since else None, until.date() if until else None,
+                          config, rescore, workers or os.cpu_count() or 1)
+    _echo_backtest(report)
+    click.echo(f"\nBacktested in {time.perf_counter() - started:.1f}s")
+    if output:
+        json.dump(report, output, indent=2)
+
+
 # ----- Run -----
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 8080)), debug=True)
@@ -0,0 +1,394 @@
+"""
+Backtesting the scoring model against official results.
+
+Results are imported from a CSV (`flask import-results`) into runner_results.
+Each row is matched to stored runners by meeting date and horse name, since
+a horse runs at most once a day. `flask backtest` then measures the model
+over every race with a recorded winner:
+
+- strike rate: races won by the top-rated runner
+- ROI of a level stake on the top-rated runner at its true odds, and at the
+  starting price when the results have one
+- calibration: predicted win probability against the actual win rate by
+  band, with the Brier score and log loss
+- per-component contribution: each component's win-rate lift, and what
+  dropping it does to strike rate and log loss
+
+Ratings come from the stored score components. With rescore (and for
+meetings stored before components were kept) every meeting's CSV is scored
+again instead, in parallel processes. A candidate configuration re-weights
+components and the odds prior and is measured alongside the stored model.
+"""
+import io
+import csv
+import json
+import math
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sqlalchemy import insert, delete
+
+from models import db, Meeting, Race, Horse, Prediction, RunnerResult
+from scoring import COMPONENT_IDS, TRACK_CONDITIONS, parse_runner_rows, parse_meeting, score_runner_rows, parse_formatted_number
+from search_index import name_key
+
+# Header spellings accepted in a results CSV (compared lowercased)
+RESULT_COLUMNS = {
+    'date': ('meeting date', 'date', 'race date'),
+    'horse': ('horse name', 'horse', 'runner'),
+    'position': ('position', 'finish position', 'finish', 'place', 'result'),
+    'starting_price': ('starting price', 'sp', 'price', 'odds'),
+}
+DATE_FORMATS = ('%d/%m/%Y', '%d/%m/%y', '%Y-%m-%d', '%d-%m-%Y')
+CALIBRATION_BANDS = (0, 0.05, 0.1, 0.15, 0.2, 0.25, 0.3, 0.4, 0.5, 0.7, 1.0)
+DEFAULT_CONFIG = {'weights': {}, 'prior_strength': 1.0, 'track_condition': None}
+
+
+def calendar_date(value):
+    """A form or results date ('01/11/2025', '2025-11-01', time ignored) as a date, or None"""
+    value = (value or '').strip().split(' ')[0]
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _position(value):
+    """'1', '1st', '=2' -> the place; scratchings and non-finishers ('SCR', 'FF') -> None"""
+    digits = ''
+    for char in (value or '').strip().lstrip('='):
+        if not char.isdigit():
+            break
+        digits += char
+    return int(digits) if digits and int(digits) > 0 else None
+
+
+# ----- Importing results -----
+
+def read_results(text):
+    """Rows of a results CSV as {'date', 'horse', 'position', 'starting_price'}"""
+    reader = csv.DictReader(io.StringIO(text))
+    headers = {(header or '').strip().lower(): header for header in reader.fieldnames or []}
+    columns = {}
+    for field, spellings in RESULT_COLUMNS.items():
+        columns[field] = next((headers[spelling] for spelling in spellings if spelling in headers), None)
+    missing = [field for field in ('date', 'horse', 'position') if columns[field] is None]
+    if missing:
+        raise Exception(f"Results CSV has no {', '.join(missing)} column (headers: {', '.join(headers)})")
+
+    results = []
+    for line, row in enumerate(reader, start=2):
+        date = calendar_date(row.get(columns['date']))
+        horse = (row.get(columns['horse']) or '').strip()
+        if date is None or not horse:
+            raise Exception(f"Line {line}: needs a date and a horse name")
+        results.append({
+            'date': date,
+            'horse': horse,
+            'position': _position(row.get(columns['position'])),
+            'starting_price': parse_formatted_number(row.get(columns['starting_price'])) if columns['starting_price'] else None,
+        })
+    return results
+
+
+def fill_meeting_dates():
+    """Set meetings.date from the CSV of meetings stored before it was recorded"""
+    filled = 0
+    for meeting in Meeting.query.filter(Meeting.date.is_(None)).all():
+        csv_text = meeting.csv_text
+        rows = parse_runner_rows(csv_text) if csv_text else []
+        meeting.date = calendar_date(rows[0].get('meeting date')) if rows else None
+        filled += meeting.date is not None
+    db.session.commit()
+    return filled
+
+
+def import_results(results):
+    """
+    Store results against every stored runner they match, replacing earlier
+    imports for those runners. Returns (rows matched, unmatched rows)
+    """
+    fill_meeting_dates()
+    dates = {result['date'] for result in results}
+    runners = {}
+    for horse_id, horse_name, date in db.session.execute(
+        db.select(Horse.id, Horse.horse_name, Meeting.date)
+        .join(Race, Race.id == Horse.race_id)
+        .join(Meeting, Meeting.id == Race.meeting_id)
+        .where(Meeting.date.in_(dates))
+    ):
+        # The same meeting uploaded twice has two runners for each result
+        runners.setdefault((date, name_key(horse_name)), []).append(horse_id)
+
+    rows = {}
+    unmatched = []
+    for result in results:
+        horse_ids = runners.get((result['date'], name_key(result['horse'])))
+        if not horse_ids:
+            unmatched.append(result)
+            continue
+        for horse_id in horse_ids:
+            rows[horse_id] = {
+                'horse_id': horse_id,
+                'position': result['position'],
+                'starting_price': result['starting_price'],
+                'imported_at': datetime.utcnow(),
+            }
+
+    horse_ids = list(rows)
+    for start in range(0, len(horse_ids), 5000):
+        chunk = horse_ids[start:start + 5000]
+        db.session.execute(delete(RunnerResult).where(RunnerResult.horse_id.in_(chunk)))
+        db.session.execute(insert(RunnerResult), [rows[horse_id] for horse_id in chunk])
+    db.session.commit()
+    return len(results) - len(unmatched), unmatched
+
+
+# ----- Candidate configurations -----
+
+def load_config(text):
+    """
+    A candidate configuration from JSON:
+    {"weights": {component id: multiplier}, "prior_strength": 1.0,
+     "track_condition": null}
+    Components not listed keep a weight of 1; a track condition re-scores
+    every meeting for that condition
+    """
+    config = dict(DEFAULT_CONFIG, **json.loads(text))
+    unknown = set(config) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise Exception(f"Unknown configuration keys: {', '.join(sorted(unknown))}")
+    bad = set(config['weights']) - set(COMPONENT_IDS)
+    if bad:
+        raise Exception(f"Unknown components: {', '.join(sorted(bad))}. Components: {', '.join(COMPONENT_IDS)}")
+    if config['track_condition'] not in (None, *TRACK_CONDITIONS):
+        raise Exception(f"track_condition must be one of {', '.join(TRACK_CONDITIONS)}")
+    if not config['prior_strength'] > 0:
+        raise Exception("prior_strength must be positive")
+    return config
+
+
+def weight_vector(config):
+    return np.array([float(config['weights'].get(component_id, 1)) for component_id in COMPONENT_IDS])
+
+
+# ----- Loading races -----
+
+def _points(components):
+    """A runner's component points in COMPONENT_IDS order"""
+    points = [0.0] * len(COMPONENT_IDS)
+    for component_id, component_points, _ in components or ():
+        points[COMPONENT_IDS.index(component_id)] += component_points
+    return points
+
+
+def _rescore(csv_text, track_condition):
+    # Runs in a pool process: {(race number, horse name): component points}
+    return {
+        (int(result['horse']['race number']), result['horse']['horse name']): _points(result['components'])
+        for result in score_runner_rows(parse_meeting(csv_text), track_condition)
+        if str(result['horse'].get('race number', '')).isdigit()
+    }
+
+
+def load_races(since=None, until=None, rescore=False, track_condition=None, workers=1):
+    """
+    Every race with a recorded winner, as {'meeting_id', 'race_number',
+    'points': runners x components array, 'won', 'starting_price'}; only
+    runners with a finishing position are kept (scratchings drop out)
+    Meetings are re-scored from their CSVs with rescore or track_condition,
+    and when their components weren't stored
+    """
+    statement = db.select(
+        Race.meeting_id, Race.id.label('race_id'), Race.race_number, Horse.horse_name,
+        Prediction.components, RunnerResult.position, RunnerResult.starting_price
+    )\
+        .select_from(RunnerResult)\
+        .join(Horse, Horse.id == RunnerResult.horse_id)\
+        .join(Race, Race.id == Horse.race_id)\
+        .join(Meeting, Meeting.id == Race.meeting_id)\
+        .join(Prediction, Prediction.horse_id == Horse.id)\
+        .where(RunnerResult.position.isnot(None))\
+        .order_by(Race.meeting_id, Race.id, Horse.id)
+    if since:
+        statement = statement.where(Meeting.date >= since)
+    if until:
+        statement = statement.where(Meeting.date <= until)
+
+    races = {}
+    needs_rescore = set()
+    for row in db.session.execute(statement).yield_per(5000):
+        race = races.setdefault(row.race_id, {
+            'meeting_id': row.meeting_id, 'race_number': row.race_number, 'runners': []
+        })
+        race['runners'].append(row)
+        if rescore or track_condition or row.components is None:
+            needs_rescore.add(row.meeting_id)
+
+    rescored = _rescore_meetings(needs_rescore, track_condition, workers)
+
+    loaded = []
+    for race in races.values():
+        runners = race['runners']
+        won = np.array([runner.position == 1 for runner in runners])
+        if not won.any():
+            continue
+        if race['meeting_id'] in needs_rescore:
+            scored = rescored.get(race['meeting_id'], {})
+            points = [scored.get((race['race_number'], runner.horse_name)) for runner in runners]
+            if any(runner_points is None for runner_points in points):
+                continue  # CSV no longer stored, or the runner isn't in it
+        else:
+            points = [_points(runner.components) for runner in runners]
+        loaded.append({
+            'meeting_id': race['meeting_id'],
+            'race_number': race['race_number'],
+            'points': np.array(points, dtype=float),
+            'won': won,
+            'starting_price': np.array([runner.starting_price or np.nan for runner in runners], dtype=float),
+        })
+    return loaded
+
+
+def _rescore_meetings(meeting_ids, track_condition, workers):
+    """{meeting id: {(race number, horse name): points}} scored from each meeting's CSV"""
+    if not meeting_ids:
+        return {}
+    meetings = Meeting.query.filter(Meeting.id.in_(meeting_ids)).all()
+    jobs = [(meeting.id, meeting.csv_text, track_condition or meeting.track_condition or 'good')
+            for meeting in meetings]
+    jobs = [job for job in jobs if job[1]]
+    if workers <= 1 or len(jobs) <= 1:
+        return {meeting_id: _rescore(csv_text, condition) for meeting_id, csv_text, condition in jobs}
+
+    # Spawned rather than forked: the parent has threads and open connections
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        scored = executor.map(_rescore, [job[1] for job in jobs], [job[2] for job in jobs],
+                              chunksize=max(1, len(jobs) // (workers * 4)))
+        return {job[0]: result for job, result in zip(jobs, scored)}
+
+
+# ----- Measuring -----
+
+def win_probabilities(scores, prior_strength=1.0, max_ratio=300.0):
+    """
+    Each runner's win probability (summing to 1) from its score, as
+    scoring.calculate_true_odds works it out; true odds are 1 / (p * 1.10)
+    scores may be 2-D, one race per row
+    """
+    min_score = scores.min(axis=-1, keepdims=True)
+    score_range = scores.max(axis=-1, keepdims=True) - min_score
+    min_shift_for_ratio = np.where(score_range > 0, score_range / (max_ratio - 1), 1.0)
+    basic_shift = np.where(min_score < 0, np.abs(min_score) + 0.01, 0)
+    posterior = scores + np.maximum(basic_shift, min_shift_for_ratio * 0.5) + prior_strength
+    return posterior / posterior.sum(axis=-1, keepdims=True)
+
+
+def evaluate(races, config=DEFAULT_CONFIG):
+    """Strike rate, ROI, calibration and component contribution of a configuration"""
+    weights = weight_vector(config)
+    prior_strength = config['prior_strength']
+
+    strikes = 0
+    returns_true_odds = 0.0
+    sp_bets = 0
+    returns_sp = 0.0
+    log_loss = 0.0
+    brier = 0.0
+    band_edges = np.array(CALIBRATION_BANDS)
+    band_predicted = np.zeros(len(CALIBRATION_BANDS) - 1)
+    band_wins = np.zeros(len(CALIBRATION_BANDS) - 1)
+    band_runners = np.zeros(len(CALIBRATION_BANDS) - 1)
+    ablated_strikes = np.zeros(len(COMPONENT_IDS))
+    ablated_log_loss = np.zeros(len(COMPONENT_IDS))
+    scoring_runners = np.zeros(len(COMPONENT_IDS))
+    scoring_winners = np.zeros(len(COMPONENT_IDS))
+    runners = winners = 0
+
+    for race in races:
+        weighted = race['points'] * weights
+        scores = weighted.sum(axis=1)
+        won = race['won']
+        top = int(np.argmax(scores))
+        probabilities = win_probabilities(scores, prior_strength)
+
+        strike = bool(won[top])
+        strikes += strike
+        if strike:
+            returns_true_odds += 1 / (probabilities[top] * 1.10)
+        starting_price = race['starting_price'][top]
+        if not np.isnan(starting_price):
+            sp_bets += 1
+            returns_sp += starting_price if strike else 0
+
+        log_loss -= math.log(max(probabilities[won].sum(), 1e-12))
+        brier += float(((probabilities - won) ** 2).sum())
+        bands = np.clip(np.searchsorted(band_edges, probabilities, side='right') - 1, 0, len(band_runners) - 1)
+        np.add.at(band_predicted, bands, probabilities)
+        np.add.at(band_wins, bands, won)
+        np.add.at(band_runners, bands, 1)
+
+        runners += len(won)
+        winners += int(won.sum())
+        positive = race['points'] > 0
+        scoring_runners += positive.sum(axis=0)
+        scoring_winners += positive[won].sum(axis=0)
+
+        # The same race with each component dropped in turn (one row each)
+        ablated = scores - weighted.T
+        ablated_probabilities = win_probabilities(ablated, prior_strength)
+        ablated_strikes += won[np.argmax(ablated, axis=1)]
+        ablated_log_loss -= np.log(np.maximum(ablated_probabilities[:, won].sum(axis=1), 1e-12))
+
+    count = len(races)
+    if not count:
+        return {'races': 0}
+    base_win_rate = winners / runners
+    return {
+        'races': count,
+        'runners': runners,
+        'strike_rate': strikes / count,
+        'roi_true_odds': float(returns_true_odds - count) / count,
+        'roi_starting_price': float(returns_sp - sp_bets) / sp_bets if sp_bets else None,
+        'starting_price_bets': sp_bets,
+        'log_loss': log_loss / count,
+        'brier': brier / count,
+        'calibration': [{
+            'band': f"{low:.0%}-{high:.0%}",
+            'runners': int(band_runners[index]),
+            'predicted': float(band_predicted[index] / band_runners[index]) if band_runners[index] else None,
+            'actual': float(band_wins[index] / band_runners[index]) if band_runners[index] else None,
+        } for index, (low, high) in enumerate(zip(CALIBRATION_BANDS, CALIBRATION_BANDS[1:]))],
+        'components': [{
+            'component': component_id,
+            'weight': float(weights[index]),
+            'runners_scoring': int(scoring_runners[index]),
+            'win_rate_lift': float(scoring_winners[index] / scoring_runners[index]) / base_win_rate
+            if scoring_runners[index] else None,
+            'strike_rate_without': float(ablated_strikes[index]) / count,
+            'strike_rate_change': float(strikes - ablated_strikes[index]) / count,
+            'log_loss_change': float(ablated_log_loss[index] - log_loss) / count,
+        } for index, component_id in enumerate(COMPONENT_IDS)],
+    }
+
+
+def run(since=None, until=None, config=None, rescore=False, workers=1):
+    """
+    Load the races once and evaluate the stored model and, if given, the
+    candidate configuration on them
+    """
+    races = load_races(since, until, rescore, None, workers)
+    report = {
+        'meetings': len({race['meeting_id'] for race in races}),
+        'models': {'stored': evaluate(races)},
+    }
+    if config:
+        if config['track_condition']:
+            # Scored again for the candidate's track condition
+            races = load_races(since, until, True, config['track_condition'], workers)
+        report['models']['candidate'] = evaluate(races, config)
+    return report
@@ -0,0 +1,183 @@
+"""
+Batch analysis of several meeting CSVs uploaded together.
+
+/analyze accepts any number of CSVs, or zips of them, in one request. Every
+file is validated up front, then the analyses run in parallel - in a pool of
+Python processes for the python engine, or on a dedicated pool of analyzer.js
+workers for node - with at most one per CPU by default. Each CSV becomes its
+own meeting, and a file that fails is reported without affecting the rest.
+"""
+import os
+import shutil
+import zipfile
+import threading
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from analyzer_pool import AnalyzerPool
+from csv_stream import read_upload
+from scoring import analyze_csv
+
+_lock = threading.Lock()
+_executor = None
+_executor_key = None  # (pid, workers) the executor was started for
+_node_pool = None
+
+
+class BatchFile:
+    """One CSV of a batch: the validated upload, or why it was rejected"""
+
+    def __init__(self, filename, upload=None, error=None):
+        self.filename = filename
+        self.upload = upload
+        self.error = error
+        self.meeting = None
+        self.job = None
+
+
+def _zip_members(archive):
+    """The .csv members of a zip, skipping folders and macOS metadata"""
+    for info in archive.infolist():
+        name = info.filename
+        basename = name.rsplit('/', 1)[-1]
+        if info.is_dir() or name.startswith('__MACOSX/') or basename.startswith('.'):
+            continue
+        if basename.lower().endswith('.csv'):
+            yield info, basename
+
+
+def _read_member(archive, info):
+    """Spool a zip member to a temporary file and validate it like an upload"""
+    spool = tempfile.TemporaryFile()
+    with archive.open(info) as member:
+        shutil.copyfileobj(member, spool)
+    spool.seek(0)
+    return read_upload(spool)
+
+
+def collect_files(files, max_files):
+    """
+    Expand the uploaded files (CSVs and zips of CSVs) into BatchFiles
+    Each CSV is validated here; failures are recorded on its BatchFile
+    """
+    batch = []
+
+    def add(batch_file):
+        if len(batch) >= max_files:
+            raise Exception(f"A batch can hold at most {max_files} CSV files")
+        batch.append(batch_file)
+
+    for file in files:
+        filename = file.filename
+        if filename.lower().endswith('.zip'):
+            try:
+                archive = zipfile.ZipFile(file.stream)
+            except zipfile.BadZipFile:
+                add(BatchFile(filename, error="Not a valid zip file"))
+                continue
+            with archive:
+                members = list(_zip_members(archive))
+                if not members:
+                    add(BatchFile(filename, error="Zip contains no CSV files"))
+                for info, name in members:
+                    try:
+                        add(BatchFile(name, upload=_read_member(archive, info)))
+                    except Exception as e:
+                        add(BatchFile(name, error=str(e)))
+        elif filename.lower().endswith('.csv'):
+            try:
+                add(BatchFile(filename, upload=read_upload(file.stream)))
+            except Exception as e:
+                add(BatchFile(filename, error=str(e)))
+        else:
+            add(BatchFile(filename, error="Not a CSV or zip file"))
+    return batch
+
+
+def _analyze_text(csv_text, track_condition, is_advanced):
+    # Runs in a pool process
+    return analyze_csv(csv_text, track_condition, is_advanced)
+
+
+def process_executor(workers):
+    """
+    This process's pool of scoring processes, started on first use
+    Spawned rather than forked: the parent has threads and open connections
+    """
+    global _executor, _executor_key
+    key = (os.getpid(), workers)
+    with _lock:
+        if _executor is None or _executor_key != key:
+            if _executor is not None and _executor_key[0] == key[0]:
+                _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _executor_key = key
+        return _executor
+
+
+def discard_executor(executor):
+    global _executor
+    with _lock:
+        if _executor is executor:
+            _executor = None
+
+
+def _analyzer_pool(workers, timeout, health_interval):
+    """
+    analyzer.js workers reserved for batches, so a large batch doesn't
+    starve single uploads of the request pool
+    """
+    global _node_pool
+    with _lock:
+        if _node_pool is None or _node_pool.size != workers or _node_pool.pid != os.getpid():
+            if _node_pool is not None and _node_pool.pid == os.getpid():
+                _node_pool.close()
+            _node_pool = AnalyzerPool(size=workers, timeout=timeout, health_interval=health_interval)
+        return _node_pool
+
+
+def current_node_pool():
+    """The analyzer.js pool reserved for batches, or None if it hasn't been started"""
+    if _node_pool is not None and _node_pool.pid == os.getpid():
+        return _node_pool
+    return None
+
+
+def analyze_all(jobs, track_condition, is_advanced, engine, workers, timeout=60, health_interval=30):
+    """
+    Start analyzing each (key, csv_data) of jobs in parallel and return an
+    iterator of (key, result, error) in the order the analyses finish
+    """
+    if not jobs:
+        return iter(())
+
+    if engine == 'python':
+        executor = process_executor(workers)
+        futures = {
+            executor.submit(_analyze_text, csv_data if isinstance(csv_data, str) else csv_data.text(),
+                            track_condition, is_advanced): key
+            for key, csv_data in jobs
+        }
+    else:
+        pool = _analyzer_pool(workers, timeout, health_interval)
+        executor = ThreadPoolExecutor(max_workers=pool.size)
+        futures = {
+            executor.submit(pool.analyze, csv_data, track_condition, is_advanced): key
+            for key, csv_data in jobs
+        }
+        executor.shutdown(wait=False)  # threads exit once their futures are done
+    return _finished(futures, executor)
+
+
+def _finished(futures, executor):
+    for future in as_completed(futures):
+        try:
+            yield futures[future], future.result(), None
+        except BrokenProcessPool as e:
+            # A scoring process died; start a fresh pool next time
+            discard_executor(executor)
+            yield futures[future], None, Exception(f"analysis process crashed ({e})")
+        except Exception as e:
+            yield futures[future], None, e
@@ -0,0 +1,108 @@
+"""
+Backtest benchmark over a synthetic season.
+
+Stores --meetings synthetic meetings (one a day, see synthetic_meeting.py),
+draws a winner for every race in proportion to the stored win
+probabilities, with a noisy starting price, and times:
+
+  import    backtest.import_results() on the results CSV
+  stored    a backtest from the stored score components
+  rescore   a backtest re-scoring every meeting's CSV, with 1 and --workers
+            processes
+  candidate a backtest also measuring a re-weighted candidate configuration
+
+    python benchmarks/backtest_benchmark.py --meetings 200 --workers 4
+"""
+import os
+import sys
+import csv
+import time
+import random
+import argparse
+import tempfile
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_meeting import generate  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--meetings', type=int, default=200)
+    parser.add_argument('--races', type=int, default=8)
+    parser.add_argument('--runners', type=int, default=12, help='Runners per race')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Processes for re-scoring')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(directory, 'backtest.db')
+    os.environ['ANALYZER_ENGINE'] = 'python'
+    os.environ['ANALYSIS_CACHE_SIZE'] = '0'
+    os.environ['ANALYSIS_QUEUE'] = 'false'
+
+    import app as app_module
+    import backtest
+    from models import db, Meeting, Race, Horse, Prediction
+
+    rng = random.Random(args.seed)
+    first_day = date(2025, 1, 1)
+    with app_module.app.app_context():
+        admin = app_module.User.query.filter_by(username='admin').one()
+        started = time.perf_counter()
+        for index in range(args.meetings):
+            csv_data = generate(args.races, args.runners, seed=args.seed + index,
+                                meeting_date=first_day + timedelta(days=index))
+            app_module.process_and_store_results(csv_data, f'meeting-{index}.csv', 'good', admin.id)
+        print(f"Stored {args.meetings} meetings ({args.meetings * args.races * args.runners} runners) "
+              f"in {time.perf_counter() - started:.1f}s")
+
+        races = {}
+        for race_id, meeting_date, horse_name, win_percent, true_odds in db.session.execute(
+            db.select(Race.id, Meeting.date, Horse.horse_name, Prediction.win_percent, Prediction.true_odds)
+            .join(Meeting, Meeting.id == Race.meeting_id)
+            .join(Horse, Horse.race_id == Race.id)
+            .join(Prediction, Prediction.horse_id == Horse.id)
+        ):
+            races.setdefault(race_id, []).append((meeting_date, horse_name, win_percent, true_odds))
+        results_path = os.path.join(directory, 'results.csv')
+        with open(results_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['meeting date', 'horse name', 'position', 'starting price'])
+            for runners in races.values():
+                order = sorted(runners, key=lambda runner: rng.random() ** (100 / runner[2]), reverse=True)
+                for position, (meeting_date, horse_name, _, true_odds) in enumerate(order, start=1):
+                    writer.writerow([meeting_date.strftime('%d/%m/%Y'), horse_name, position,
+                                     f"{true_odds * rng.uniform(0.7, 1.4):.2f}"])
+
+        with open(results_path, encoding='utf-8') as f:
+            results = backtest.read_results(f.read())
+        timings = {}
+        started = time.perf_counter()
+        matched, unmatched = backtest.import_results(results)
+        timings['import'] = time.perf_counter() - started
+        print(f"Imported {matched} results ({len(unmatched)} unmatched)")
+
+        config = backtest.load_config('{"weights": {"jockey": 0.5, "sectional": 1.5}}')
+        runs = [
+            ('stored', dict()),
+            ('rescore (1 process)', dict(rescore=True, workers=1)),
+            (f'rescore ({args.workers} processes)', dict(rescore=True, workers=args.workers)),
+            ('candidate', dict(config=config)),
+        ]
+        for name, options in runs:
+            started = time.perf_counter()
+            report = backtest.run(**options)
+            timings[name] = time.perf_counter() - started
+        stored = report['models']['stored']
+        candidate = report['models']['candidate']
+        print(f"{stored['races']} races: strike rate {stored['strike_rate']:.1%} stored, "
+              f"{candidate['strike_rate']:.1%} candidate\n")
+
+        for name, seconds in timings.items():
+            print(f"{name:<24} {seconds:>8.2f}s  {args.meetings / seconds:>8.1f} meetings/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark batch analysis throughput against the number of workers.
+
+Generates a batch of synthetic meeting CSVs and analyzes and stores the
+whole batch with process_and_store_batch() at each worker count, reporting
+meetings per second and the speedup over a single worker. The analysis cache
+is off so every run does the full work; each worker count gets one untimed
+warm-up run to start its pool.
+
+    python benchmarks/batch_benchmark.py
+    python benchmarks/batch_benchmark.py --meetings 32 --workers 1 2 4 8 --engine node
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from upload_memory import write_csv  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--meetings', type=int, default=16, help='CSVs in the batch')
+    parser.add_argument('--size-mb', type=float, default=0.5, help='Size of each CSV')
+    parser.add_argument('--workers', type=int, nargs='+', default=None,
+                        help='Worker counts to try (default: 1, 2, 4, ... up to the CPU count)')
+    parser.add_argument('--engine', choices=['python', 'node'], default='python')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'batch_benchmark.db')
+    os.environ['ANALYZER_ENGINE'] = args.engine
+    os.environ['ANALYSIS_CACHE_SIZE'] = '0'
+
+    import app as app_module
+    from batch import BatchFile
+    from csv_stream import read_upload
+
+    cpus = os.cpu_count() or 1
+    worker_counts = args.workers
+    if not worker_counts:
+        worker_counts = [1]
+        while worker_counts[-1] * 2 <= cpus:
+            worker_counts.append(worker_counts[-1] * 2)
+        if worker_counts[-1] != cpus:
+            worker_counts.append(cpus)
+
+    paths = []
+    for seed in range(args.meetings):
+        path = os.path.join(workdir, f'meeting{seed}.csv')
+        write_csv(path, args.size_mb, seed=seed)
+        paths.append(path)
+
+    def run_batch():
+        files = []
+        batch = []
+        for path in paths:
+            files.append(open(path, 'rb'))
+            batch.append(BatchFile(os.path.basename(path), upload=read_upload(files[-1])))
+        try:
+            start = time.perf_counter()
+            app_module.process_and_store_batch(batch, 'good', admin_id)
+            elapsed = time.perf_counter() - start
+        finally:
+            for f in files:
+                f.close()
+        failed = [batch_file for batch_file in batch if batch_file.error]
+        if failed:
+            raise SystemExit(f"{failed[0].filename}: {failed[0].error}")
+        return elapsed
+
+    with app_module.app.app_context():
+        admin_id = app_module.User.query.filter_by(username='admin').one().id
+
+        print(f"{args.meetings} meetings of {args.size_mb} MB, {args.engine} engine, {cpus} CPU(s)\n")
+        print(f"{'workers':>7} {'seconds':>8} {'meetings/s':>11} {'speedup':>8}")
+        baseline = None
+        for workers in worker_counts:
+            app_module.app.config['ANALYSIS_BATCH_WORKERS'] = workers
+            run_batch()  # warm-up: starts this worker count's pool
+            elapsed = run_batch()
+            baseline = baseline or elapsed
+            print(f"{workers:>7} {elapsed:>8.2f} {args.meetings / elapsed:>11.1f} {baseline / elapsed:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
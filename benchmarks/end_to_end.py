@@ -0,0 +1,246 @@
+"""
+End-to-end benchmark of an upload, stage by stage.
+
+Generates a synthetic meeting (see synthetic_meeting.py) and times each stage
+of its life separately, repeating each one and reporting p50/p95 latency and
+throughput:
+
+  spawn    start an analyzer.js worker and get its first answer
+  parse    parse_meeting() on the CSV
+  score    score_runner_rows() on the parsed meeting
+  analyze  run_analyzer() on the configured engine (cache off)
+  ingest   process_and_store_results(): analysis plus storing the meeting
+  results  get_meeting_results() for the stored meeting
+  render   view_meeting.html rendered from those results
+  page     a full GET /meeting/<id> through the test client
+  rows     csv_blobs.runner_rows(): a stored meeting's runner rows, re-read
+           to re-score meetings stored before track records (either engine)
+  diff     meeting_diff.diff() against a revised CSV, as update_meeting
+           does (either engine)
+
+Results can be written as JSON and compared with an earlier run, e.g. one
+from the previous commit:
+
+    python benchmarks/end_to_end.py --output before.json
+    python benchmarks/end_to_end.py --races 10 --runners 16 --compare before.json
+"""
+import os
+import csv
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_meeting import generate, COLUMNS, SECTIONAL_FORMATS, PRIZEMONEY_FORMATS  # noqa: E402
+
+STAGES = ('spawn', 'parse', 'score', 'analyze', 'ingest', 'results', 'render', 'page', 'rows', 'diff')
+# Stages whose work grows with the number of runners
+RUNNER_STAGES = ('parse', 'score', 'analyze', 'ingest', 'rows', 'diff')
+
+
+def percentile(values, q):
+    """q-th percentile (0-100) of values, interpolating between ranks"""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def time_stage(function, repeat, warmup):
+    """Milliseconds for each of repeat calls, after warmup untimed calls"""
+    for _ in range(warmup):
+        function()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def summarize(timings, runners):
+    mean = sum(timings) / len(timings)
+    summary = {
+        'runs': len(timings),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'mean_ms': round(mean, 3),
+        'min_ms': round(min(timings), 3),
+        'per_second': round(1000 / mean, 2) if mean else None,
+    }
+    if runners is not None:
+        summary['runners_per_second'] = round(runners * 1000 / mean, 1) if mean else None
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def node_version():
+    try:
+        return subprocess.run(['node', '--version'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_comparison(report, baseline_path):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline_path} (commit {baseline.get('commit') or '?'}):")
+    print(f"{'stage':<8} {'p50 before':>11} {'p50 now':>9} {'change':>8}")
+    for stage, now in report['stages'].items():
+        before = baseline.get('stages', {}).get(stage)
+        if not before or not before['p50_ms']:
+            continue
+        change = (now['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100
+        print(f"{stage:<8} {before['p50_ms']:>9.1f}ms {now['p50_ms']:>7.1f}ms {change:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--races', type=int, default=8)
+    parser.add_argument('--runners', type=int, default=12, help='Runners per race')
+    parser.add_argument('--form-rows', type=int, default=5, help='Past starts per runner')
+    parser.add_argument('--sectional-format', choices=SECTIONAL_FORMATS, default='mixed')
+    parser.add_argument('--prizemoney-format', choices=PRIZEMONEY_FORMATS, default='full')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--engine', choices=['node', 'python'], default='python',
+                        help='Engine for the analyze and ingest stages')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--repeat', type=int, default=20, help='Timed runs per stage')
+    parser.add_argument('--warmup', type=int, default=2, help='Untimed runs before each stage')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON file from an earlier run to compare p50s with')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'end_to_end.db')
+    os.environ['ANALYZER_ENGINE'] = args.engine
+    os.environ['ANALYSIS_CACHE_SIZE'] = '0'
+    os.environ['ANALYSIS_QUEUE'] = 'false'
+
+    import app as app_module
+    from flask import render_template
+    from flask_login import login_user
+    from analyzer_pool import AnalyzerWorker
+    from scoring import parse_meeting, score_runner_rows
+    from csv_blobs import runner_rows
+    from meeting_diff import diff
+
+    csv_data = generate(args.races, args.runners, args.form_rows, args.sectional_format,
+                        args.prizemoney_format, args.seed)
+    frame = parse_meeting(csv_data)
+    runners = len(score_runner_rows(frame.copy(), 'good'))
+    app = app_module.app
+    db = app_module.db
+
+    with app.app_context():
+        admin = app_module.User.query.filter_by(username='admin').one()
+        meeting = app_module.process_and_store_results(csv_data, 'benchmark.csv', 'good', admin.id)
+        meeting_id = meeting.id
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(admin.id)
+            session['_fresh'] = True
+
+        def spawn():
+            worker = AnalyzerWorker()
+            try:
+                worker.request({'ping': True}, timeout=30)
+            finally:
+                worker.stop()
+
+        def ingest():
+            stored = app_module.process_and_store_results(csv_data, 'benchmark.csv', 'good', admin.id)
+            # Keep the tables the same size between runs
+            db.session.delete(stored)
+            db.session.commit()
+
+        def render():
+            with app.test_request_context(f'/meeting/{meeting_id}'):
+                login_user(admin)
+                render_template('view_meeting.html', meeting=db.session.get(app_module.Meeting, meeting_id),
+                                results=results, track_conditions=app_module.TRACK_CONDITIONS,
+                                tag_badges=app_module.TAG_BADGES)
+
+        def page():
+            response = client.get(f'/meeting/{meeting_id}')
+            if response.status_code != 200:
+                raise SystemExit(f"GET /meeting/{meeting_id} returned {response.status_code}")
+
+        results = app_module.get_meeting_results(meeting_id)
+        # The first runner scratched
+        lines = csv_data.split('\n')
+        scratched = next(csv.reader([lines[1]]))[COLUMNS.index('horse name')]
+        revised_csv = '\n'.join(line for line in lines if f',{scratched},' not in line)
+        stage_functions = {
+            'spawn': spawn,
+            'parse': lambda: parse_meeting(csv_data),
+            # A fresh copy each time: the frame keeps the columns scoring parses
+            'score': lambda: score_runner_rows(frame.copy(), 'good'),
+            'analyze': lambda: app_module.run_analyzer(csv_data, 'good', use_cache=False),
+            'ingest': ingest,
+            'results': lambda: app_module.get_meeting_results(meeting_id),
+            'render': render,
+            'page': page,
+            'rows': lambda: runner_rows(csv_data),
+            'diff': lambda: diff(csv_data, revised_csv),
+        }
+
+        report = {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'node': node_version(),
+            'cpus': os.cpu_count(),
+            'engine': args.engine,
+            'meeting': {
+                'races': args.races,
+                'runners_per_race': args.runners,
+                'form_rows': args.form_rows,
+                'sectional_format': args.sectional_format,
+                'prizemoney_format': args.prizemoney_format,
+                'seed': args.seed,
+                'runners': runners,
+                'csv_bytes': len(csv_data.encode('utf-8')),
+            },
+            'repeat': args.repeat,
+            'stages': {},
+        }
+
+        m = report['meeting']
+        print(f"{runners} runners ({args.races} races x {args.runners}, {args.form_rows} form rows each, "
+              f"{m['csv_bytes'] / 1024:.0f} KB), {args.engine} engine, {report['cpus']} CPU(s)\n")
+        print(f"{'stage':<8} {'p50 ms':>9} {'p95 ms':>9} {'per s':>9} {'runners/s':>11}")
+        for stage in args.stages:
+            if stage == 'spawn' and not report['node']:
+                print(f"{'spawn':<8} {'skipped (Node.js not found)':>40}")
+                continue
+            timings = time_stage(stage_functions[stage], args.repeat, args.warmup)
+            summary = summarize(timings, runners if stage in RUNNER_STAGES else None)
+            report['stages'][stage] = summary
+            per_runner = summary.get('runners_per_second')
+            print(f"{stage:<8} {summary['p50_ms']:>9.2f} {summary['p95_ms']:>9.2f} {summary['per_second']:>9.1f} "
+                  f"{per_runner if per_runner is not None else '':>11}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
+    if args.compare:
+        print_comparison(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
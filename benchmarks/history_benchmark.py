@@ -0,0 +1,81 @@
+"""
+Benchmark /history latency as the meetings table grows.
+
+Seeds a throwaway SQLite database with meetings (summary columns only, no
+races) and times the first page, a page deep in the keyset, and the old
+load-everything query, at each size.
+
+    python benchmarks/history_benchmark.py
+    python benchmarks/history_benchmark.py --sizes 1000 100000 --repeat 10
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def best_ms(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='Meetings in the table')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement (best time is reported)')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'history_benchmark.db')
+
+    import app as app_module
+    from sqlalchemy import insert
+    from models import db, User, Meeting
+
+    client = app_module.app.test_client()
+    with app_module.app.app_context():
+        admin = User.query.filter_by(username='admin').one()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(admin.id)
+            session['_fresh'] = True
+
+        print(f"{'meetings':>9} {'first page':>11} {'deep page':>10} {'load all':>10}")
+        start = datetime(2020, 1, 1)
+        seeded = 0
+        for size in sorted(args.sizes):
+            rows = [{
+                'user_id': admin.id,
+                'meeting_name': f'Meeting {number}',
+                'uploaded_at': start + timedelta(minutes=number // 2),  # pairs share a timestamp
+                'race_count': 9,
+                'runner_count': 110,
+                'track_condition': 'good',
+            } for number in range(seeded, size)]
+            for offset in range(0, len(rows), 10000):
+                db.session.execute(insert(Meeting), rows[offset:offset + 10000])
+            db.session.commit()
+            seeded = size
+
+            deep = Meeting.query.order_by(Meeting.uploaded_at, Meeting.id).offset(100).first()
+            cursor = app_module._history_cursor(deep)
+
+            first_page = best_ms(lambda: client.get('/history'), args.repeat)
+            deep_page = best_ms(lambda: client.get(f'/history?before={cursor}'), args.repeat)
+            load_all = best_ms(
+                lambda: Meeting.query.order_by(Meeting.uploaded_at.desc()).all(),
+                min(args.repeat, 2)
+            )
+            db.session.expunge_all()
+            print(f"{size:>9} {first_page:>8.1f} ms {deep_page:>7.1f} ms {load_all:>7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
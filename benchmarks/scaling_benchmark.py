@@ -0,0 +1,80 @@
+"""
+Benchmark how analysis time scales with the number of form rows.
+
+Generates synthetic CSVs from --sizes form rows (whole races of --runners
+runners with --form-rows rows each, so more rows means more races and more
+runners) and times one analysis of each on analyzer.js and on scoring.py.
+For each size it reports seconds and microseconds per row, and at the end
+the fitted exponent of time against rows: about 1.0 is linear, 2.0 quadratic.
+
+    python benchmarks/scaling_benchmark.py
+    python benchmarks/scaling_benchmark.py --sizes 1000 10000 100000 --engine node
+"""
+import os
+import sys
+import math
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_meeting import generate  # noqa: E402
+
+
+def fitted_exponent(points):
+    """Least-squares slope of log(seconds) against log(rows)"""
+    xs = [math.log(rows) for rows, _ in points]
+    ys = [math.log(seconds) for _, seconds in points]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / sum((x - mean_x) ** 2 for x in xs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 20000, 50000, 100000, 200000],
+                        help='Form rows per CSV')
+    parser.add_argument('--runners', type=int, default=12, help='Runners per race')
+    parser.add_argument('--form-rows', type=int, default=8, help='Form rows per runner')
+    parser.add_argument('--engine', choices=['both', 'node', 'python'], default='both')
+    args = parser.parse_args()
+
+    from analyzer_pool import AnalyzerPool
+    from scoring import analyze_csv
+
+    engines = {}
+    pool = None
+    if args.engine in ('both', 'node'):
+        pool = AnalyzerPool(size=1, timeout=3600, health_interval=0)
+        engines['node'] = lambda csv_text: pool.analyze(csv_text, 'good')
+    if args.engine in ('both', 'python'):
+        engines['python'] = lambda csv_text: analyze_csv(csv_text, 'good')
+
+    rows_per_race = args.runners * args.form_rows
+    timings = {engine: [] for engine in engines}
+    try:
+        print(f"{'rows':>8} {'races':>6}" + ''.join(f" {engine + ' s':>10} {'us/row':>7}" for engine in engines))
+        for size in args.sizes:
+            races = max(1, round(size / rows_per_race))
+            csv_text = generate(races, args.runners, form_rows=args.form_rows, seed=1)
+            rows = races * rows_per_race
+            line = f"{rows:>8} {races:>6}"
+            for engine, analyze in engines.items():
+                analyze(csv_text)  # warm-up (JIT, caches)
+                start = time.perf_counter()
+                analyze(csv_text)
+                seconds = time.perf_counter() - start
+                timings[engine].append((rows, seconds))
+                line += f" {seconds:>10.3f} {seconds / rows * 1e6:>7.1f}"
+            print(line, flush=True)
+    finally:
+        if pool is not None:
+            pool.close()
+
+    print()
+    for engine, points in timings.items():
+        if len(points) > 1:
+            print(f"{engine}: time grows as rows^{fitted_exponent(points):.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark race-sharded scoring of one large CSV against the number of workers.
+
+Generates one synthetic CSV of --races races (race numbers are what shards
+are cut on) and scores it split into as many shards as workers, reporting
+seconds and the speedup over the serial path. Every sharded result is
+checked to be byte-identical (as JSON) to the serial one. The python engine
+goes through run_analyzer() with ANALYSIS_BATCH_WORKERS set; node gets an
+analyzer.js pool of its own per worker count, as the app's pool keeps one
+worker out of sharding. Each worker count gets one untimed warm-up run.
+
+    python benchmarks/shard_benchmark.py
+    python benchmarks/shard_benchmark.py --races 48 --runners 16 --workers 1 2 4 8 --engine node
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_meeting import generate  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--races', type=int, default=40)
+    parser.add_argument('--runners', type=int, default=14, help='Runners per race')
+    parser.add_argument('--form-rows', type=int, default=8, help='Form rows per runner')
+    parser.add_argument('--workers', type=int, nargs='+', default=None,
+                        help='Worker counts to try (default: 1, 2, 4, ... up to the CPU count)')
+    parser.add_argument('--engine', choices=['python', 'node'], default='python')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'shard_benchmark.db')
+    os.environ['ANALYZER_ENGINE'] = args.engine
+    os.environ['ANALYSIS_CACHE_SIZE'] = '0'
+
+    import app as app_module
+    import race_shards
+    from analyzer_pool import AnalyzerPool
+
+    cpus = os.cpu_count() or 1
+    worker_counts = args.workers
+    if not worker_counts:
+        worker_counts = [1]
+        while worker_counts[-1] * 2 <= cpus:
+            worker_counts.append(worker_counts[-1] * 2)
+        if worker_counts[-1] != cpus:
+            worker_counts.append(cpus)
+
+    csv_text = generate(args.races, args.runners, form_rows=args.form_rows, seed=1)
+    config = app_module.app.config
+    config['ANALYSIS_SHARD_MIN_BYTES'] = 1
+
+    pools = {}
+
+    def analyze(workers):
+        if args.engine == 'python':
+            config['ANALYSIS_BATCH_WORKERS'] = workers
+            start = time.perf_counter()
+            results = app_module.run_analyzer(csv_text, 'good', use_cache=False)
+            return time.perf_counter() - start, json.dumps(results)
+
+        if workers not in pools:
+            pools[workers] = AnalyzerPool(size=workers, timeout=600, health_interval=0)
+        pool = pools[workers]
+        start = time.perf_counter()
+        shards = race_shards.split(csv_text.split('\n'), workers)
+        if shards:
+            results = race_shards.analyze_node(shards, 'good', False, pool)
+        else:
+            results = pool.analyze(csv_text, 'good', False)
+        return time.perf_counter() - start, json.dumps(results)
+
+    print(f"{len(csv_text) / 1e6:.1f} MB, {args.races} races, {args.engine} engine, {cpus} CPU(s)\n")
+    if cpus < 2 and args.engine == 'python':
+        print("A single CPU: run_analyzer() never shards here, every row is the serial path\n")
+    print(f"{'workers':>7} {'seconds':>8} {'speedup':>8}")
+    analyze(1)
+    baseline, serial = analyze(1)
+    print(f"{1:>7} {baseline:>8.2f} {1:>7.2f}x  (serial)")
+    for workers in worker_counts:
+        if workers < 2:
+            continue
+        analyze(workers)  # warm-up: starts this worker count's pool
+        elapsed, output = analyze(workers)
+        if output != serial:
+            raise SystemExit(f"{workers} workers: output differs from the serial path")
+        print(f"{workers:>7} {elapsed:>8.2f} {baseline / elapsed:>7.2f}x")
+
+    for pool in pools.values():
+        pool.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark CSV storage: legacy text columns vs compressed csv_blobs.
+
+Builds a SQLite database of analyzed meetings in the legacy layout (full CSV
+in meetings.csv_data, a JSON copy of each runner's row in horses.csv_data),
+measures table sizes and the time to back the database up, then runs the
+`migrate-csv-storage` migration and measures again. Some meetings are
+uploaded twice to show deduplication.
+
+    python benchmarks/storage_benchmark.py
+    python benchmarks/storage_benchmark.py --meetings 40 --size-mb 2
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from upload_memory import write_csv  # noqa: E402
+
+
+def backup_seconds(path, repeat=3):
+    """Best time to copy the database with SQLite's online backup API"""
+    best = None
+    for _ in range(repeat):
+        target = path + '.bak'
+        start = time.perf_counter()
+        with sqlite3.connect(path) as source, sqlite3.connect(target) as copy:
+            source.backup(copy)
+        elapsed = time.perf_counter() - start
+        os.remove(target)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def report(label, path, sizes):
+    print(f"{label}: file {os.path.getsize(path) / 1024 / 1024:.1f} MB, backup {backup_seconds(path) * 1000:.0f} ms")
+    for table, size in sizes.items():
+        print(f"  {table:<10} {size / 1024 / 1024:>8.2f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--meetings', type=int, default=20, help='Distinct meeting CSVs')
+    parser.add_argument('--duplicates', type=int, default=5, help='Meetings uploaded a second time')
+    parser.add_argument('--size-mb', type=float, default=1, help='Size of each CSV')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, 'storage_benchmark.db')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + db_path
+    os.environ['ANALYSIS_CACHE_SIZE'] = '0'
+
+    import app as app_module
+    from models import db, Meeting, CSVBlob
+    from scoring import analyze_csv
+    from csv_blobs import runner_rows, table_sizes, migrate_legacy_storage
+
+    with app_module.app.app_context():
+        admin_id = app_module.User.query.filter_by(username='admin').one().id
+
+        csv_texts = []
+        for seed in range(args.meetings):
+            path = os.path.join(workdir, f'meeting{seed}.csv')
+            write_csv(path, args.size_mb, seed=seed)
+            with open(path, encoding='utf-8') as f:
+                csv_texts.append(f.read())
+        csv_texts += csv_texts[:args.duplicates]
+
+        for number, csv_text in enumerate(csv_texts):
+            results = analyze_csv(csv_text, 'good')
+            app_module.store_analysis_results(results, csv_text, f'meeting{number}.csv', 'good', admin_id)
+
+        # Rewrite everything into the layout used before csv_blobs
+        for meeting in Meeting.query:
+            rows = runner_rows(meeting.csv_text)
+            for race in meeting.races:
+                for horse in race.horses:
+                    horse.csv_data = rows.get((race.race_number, horse.horse_name))
+            meeting.csv_data = meeting.csv_text
+            meeting.csv_blob_id = None
+        db.session.flush()
+        CSVBlob.query.delete()
+        db.session.commit()
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.execute(db.text('VACUUM'))
+
+        print(f"{len(csv_texts)} meetings ({args.duplicates} duplicate uploads), {args.size_mb} MB CSV each\n")
+        report('legacy', db_path, table_sizes())
+        print()
+        migrate_legacy_storage(echo=lambda message: None)
+        report('csv_blobs', db_path, table_sizes())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""
+Generate synthetic meeting CSVs in the column layout analyzeCSV expects.
+
+Every runner gets one row per past start ("form row"), repeating the runner's
+race-day columns, as the real exports do. Races, runners per race, form rows
+per runner and the sectional and prize money formats are configurable; the
+same seed always gives the same file.
+
+    python benchmarks/synthetic_meeting.py -o meeting.csv
+    python benchmarks/synthetic_meeting.py --races 10 --runners 16 --form-rows 8 \\
+        --sectional-format 600m --prizemoney-format commas -o big.csv
+"""
+import io
+import os
+import csv
+import sys
+import random
+import argparse
+from datetime import date, timedelta
+
+COLUMNS = [
+    'meeting date', 'race number', 'race name', 'distance', 'class restrictions', 'race prizemoney',
+    'horse name', 'barrier', 'horse weight', 'horse claim', 'horse jockey', 'horse trainer', 'horse last10',
+    'horse record track', 'horse record track distance', 'horse record distance', 'horse record firm',
+    'horse record good', 'horse record soft', 'horse record heavy', 'horse record synthetic',
+    'horse record first up', 'horse record second up', 'form meeting date', 'form distance', 'form class',
+    'prizemoney', 'form position', 'form margin', 'form price', 'form weight', 'sectional',
+]
+
+# 'mixed' is what the exports contain: mostly 600m times, some 400m, and
+# starts with no usable time
+SECTIONAL_FORMATS = ('mixed', '600m', '400m', 'none')
+# 'full' is "1st $42000, 2nd $5000"; 'commas' groups the thousands
+PRIZEMONEY_FORMATS = ('full', 'commas', 'first', 'none')
+
+JOCKEYS = ['J B Mc Donald', 'Blake Shinn', 'Kerrin McEvoy', 'W Pike', 'Tim Clark', 'D Lane',
+           'Rachel King', 'Sam Clipperton', 'A Bullock', 'Jason Collett']
+TRAINERS = ['C Maher', 'C J Waller', 'Bjorn Baker', 'G M Begg', 'P Stokes', 'J Smith',
+            'Annabel Neasham', 'M M Laurie']
+CLASSES = ['Maiden', 'Class 1', 'Class 3', 'BM64', 'Benchmark 78', 'Rest. 62', 'Highway',
+           'Open', 'Listed', 'Group 2']
+DISTANCES = [1000, 1100, 1200, 1400, 1600, 2000, 2400]
+NAME_PARTS = (['Golden', 'Silent', 'Royal', 'Midnight', 'Lucky', 'Wild', 'Storm', 'Star', 'Iron', 'Blue'],
+              ['Arrow', 'Dancer', 'Legend', 'Comet', 'Echo', 'Harbour', 'Spirit', 'Knight', 'Rose', 'Flyer'])
+
+
+def _record(rng):
+    """A 'runs:wins-seconds-thirds' record"""
+    runs = rng.randint(0, 14)
+    wins = rng.randint(0, runs // 2)
+    seconds = rng.randint(0, runs - wins)
+    thirds = rng.randint(0, runs - wins - seconds)
+    return f"{runs}:{wins}-{seconds}-{thirds}"
+
+
+def _prizemoney(rng, prizemoney_format, low=10, high=300):
+    first = rng.randint(low, high) * 1000
+    second = first // 5
+    if prizemoney_format == 'full':
+        return f"1st ${first}, 2nd ${second}"
+    if prizemoney_format == 'commas':
+        return f"1st ${first:,}, 2nd ${second:,}"
+    if prizemoney_format == 'first':
+        return f"1st ${first}"
+    return ''
+
+
+def _sectional(rng, sectional_format):
+    if sectional_format == 'none':
+        return ''
+    if sectional_format == 'mixed':
+        roll = rng.random()
+        if roll < 0.08:
+            return ''
+        if roll < 0.12:
+            return '0sec 600m'
+        sectional_format = '400m' if roll < 0.3 else '600m'
+    if sectional_format == '400m':
+        return f"{rng.uniform(22.5, 25.5):.2f}sec 400m"
+    return f"{rng.uniform(33.0, 37.0):.2f}sec 600m"
+
+
+def generate_rows(races=8, runners=12, form_rows=5, sectional_format='mixed', prizemoney_format='full',
+                  seed=1, meeting_date=date(2025, 11, 1)):
+    """Yield the CSV's data rows as lists, in COLUMNS order"""
+    if sectional_format not in SECTIONAL_FORMATS:
+        raise ValueError(f"sectional_format must be one of {', '.join(SECTIONAL_FORMATS)}")
+    if prizemoney_format not in PRIZEMONEY_FORMATS:
+        raise ValueError(f"prizemoney_format must be one of {', '.join(PRIZEMONEY_FORMATS)}")
+
+    rng = random.Random(seed)
+    day = meeting_date.strftime('%d/%m/%Y')
+    names = set()
+
+    for race in range(1, races + 1):
+        distance = rng.choice(DISTANCES)
+        race_class = rng.choice(CLASSES)
+        race_prizemoney = _prizemoney(rng, prizemoney_format)
+
+        for number in range(runners):
+            name = f"{rng.choice(NAME_PARTS[0])} {rng.choice(NAME_PARTS[1])}"
+            while name in names:
+                name += f" {rng.choice('ABCDEFGHJK')}"
+            names.add(name)
+
+            runner = [
+                day, race, f"Race {race}", distance, race_class, race_prizemoney,
+                name, number + 1, rng.choice([53.5, 54, 55, 56, 56.5, 57, 58, 59, 60, 61]),
+                rng.choice([0, 0, 0, 1.5, 2, 3]), rng.choice(JOCKEYS), rng.choice(TRAINERS),
+                ''.join(rng.choice('1234567890x') for _ in range(rng.randint(0, 10))),
+                *(_record(rng) for _ in range(10)),
+            ]
+
+            # Past starts, most recent first, 7 to 90 days apart
+            last_start = meeting_date
+            for _ in range(form_rows):
+                last_start -= timedelta(days=rng.randint(7, 90))
+                yield runner + [
+                    last_start.strftime('%d/%m/%Y'),
+                    rng.choice(DISTANCES),
+                    rng.choice(CLASSES),
+                    _prizemoney(rng, prizemoney_format, 5, 400),
+                    rng.randint(1, 16),
+                    f"{rng.uniform(0, 12):.1f}",
+                    f"{rng.uniform(1.4, 81):.2f}",
+                    rng.choice([54, 55, 56, 57, 58, 59, 60]),
+                    _sectional(rng, sectional_format),
+                ]
+
+
+def generate(races=8, runners=12, form_rows=5, sectional_format='mixed', prizemoney_format='full',
+             seed=1, meeting_date=date(2025, 11, 1)):
+    """A synthetic meeting as CSV text"""
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator='\n')
+    writer.writerow(COLUMNS)
+    writer.writerows(generate_rows(races, runners, form_rows, sectional_format, prizemoney_format,
+                                   seed, meeting_date))
+    return out.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--races', type=int, default=8)
+    parser.add_argument('--runners', type=int, default=12, help='Runners per race')
+    parser.add_argument('--form-rows', type=int, default=5, help='Past starts per runner')
+    parser.add_argument('--sectional-format', choices=SECTIONAL_FORMATS, default='mixed')
+    parser.add_argument('--prizemoney-format', choices=PRIZEMONEY_FORMATS, default='full')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('-o', '--output', help='File to write (default: stdout)')
+    args = parser.parse_args()
+
+    text = generate(args.races, args.runners, args.form_rows, args.sectional_format,
+                    args.prizemoney_format, args.seed)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+        print(f"Wrote {args.races * args.runners} runners to {os.path.abspath(args.output)}", file=sys.stderr)
+    else:
+        sys.stdout.write(text)
+
+
+if __name__ == '__main__':
+    main()
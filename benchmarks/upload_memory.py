@@ -0,0 +1,181 @@
+"""
+Benchmark peak memory of an /analyze upload: buffered vs streamed.
+
+Generates a synthetic meeting CSV (50 MB by default) and pushes it through
+the upload path in a fresh process per mode, reporting peak RSS:
+
+  buffered  the previous path - read() + decode() the whole upload, send it to
+            the analyzer as one JSON document, store it in meetings.csv_data
+  streamed  read_upload() validates and hashes in 1 MB chunks, then the
+            analyzer and the csv_blobs compressor read the spool chunk by chunk
+
+    python benchmarks/upload_memory.py
+    python benchmarks/upload_memory.py --size-mb 20 --engine python
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import resource
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+HEADER = ('meeting date,race number,race name,distance,class restrictions,race prizemoney,'
+          'horse name,barrier,horse weight,horse claim,horse jockey,horse trainer,horse last10,'
+          'horse record track,horse record track distance,horse record distance,horse record firm,'
+          'horse record good,horse record soft,horse record heavy,horse record synthetic,'
+          'horse record first up,horse record second up,form meeting date,form distance,form class,'
+          'prizemoney,form position,form margin,form price,form weight,sectional')
+RACES = 60
+RUNNERS_PER_RACE = 14
+
+
+def write_csv(path, size_mb, seed=1):
+    """
+    Write a meeting of RACES x RUNNERS_PER_RACE runners, adding form rows per
+    runner until the file reaches size_mb
+    """
+    rng = random.Random(seed)
+    jockeys = ['J B Mc Donald', 'Blake Shinn', 'Kerrin McEvoy', 'W Pike', 'Tim Clark']
+    trainers = ['C Maher', 'C J Waller', 'Bjorn Baker', 'J Smith']
+    classes = ['Benchmark 78', 'BM64', 'Class 3', 'Maiden', 'Group 2', 'Open']
+
+    def record():
+        runs = rng.randint(0, 12)
+        wins = rng.randint(0, runs)
+        return f"{runs}:{wins}-{rng.randint(0, runs - wins)}-0"
+
+    runners = []
+    for race in range(1, RACES + 1):
+        distance = rng.choice([1000, 1200, 1400, 1600, 2000])
+        race_class = rng.choice(classes)
+        for number in range(RUNNERS_PER_RACE):
+            records = ','.join(record() for _ in range(10))
+            runners.append(
+                f"01/11/2025,{race},Race {race},{distance},{race_class},\"1st $50000, 2nd $5000\","
+                f"Horse {race}-{number},{number + 1},{rng.choice([54, 56, 58, 60])},0,"
+                f"{rng.choice(jockeys)},{rng.choice(trainers)},1x2345,{records}"
+            )
+
+    target = size_mb * 1024 * 1024
+    written = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        written += f.write(HEADER + '\n')
+        while written < target:
+            for runner in runners:
+                form = (f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2025,"
+                        f"{rng.choice([1000, 1200, 1400, 1600])},{rng.choice(classes)},1st $30000,"
+                        f"{rng.randint(1, 14)},{rng.uniform(0, 12):.1f},{rng.uniform(1.2, 60):.2f},"
+                        f"{rng.choice([54, 56, 58])},{rng.uniform(33, 37):.2f}sec 600m")
+                written += f.write(f"{runner},{form}\n")
+
+
+def reset_peak_rss():
+    """Reset the kernel's high-water mark so imports don't hide the upload (Linux only)"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux (bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def buffered_upload(app_module, stream, engine):
+    """The previous /analyze path"""
+    from scoring import analyze_csv
+
+    csv_data = stream.read().decode('utf-8')
+    if engine == 'python':
+        results = analyze_csv(csv_data, 'good')
+    else:
+        pool = app_module.get_pool(size=1, timeout=600, health_interval=0)
+        results = pool._call({'csv_data': csv_data, 'track_condition': 'good', 'is_advanced': False})['result']
+    meeting = app_module.store_analysis_results(results, '', 'benchmark.csv', 'good', 1)
+    meeting.csv_data = csv_data
+    app_module.db.session.commit()
+    return meeting
+
+
+def streamed_upload(app_module, stream, engine):
+    """The current /analyze path"""
+    from csv_stream import read_upload
+
+    app_module.app.config['ANALYZER_ENGINE'] = engine
+    upload = read_upload(stream)
+    return app_module.process_and_store_results(upload, 'benchmark.csv', 'good', 1)
+
+
+def run_child(mode, csv_path, engine):
+    """Run one upload in this (fresh) process and print its measurements"""
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'upload_memory.db')
+    os.environ['ANALYSIS_CACHE_SIZE'] = '0'
+    os.environ['ANALYZER_TIMEOUT'] = '600'
+
+    import app as app_module
+    from models import db, User
+
+    with app_module.app.app_context():
+        db.create_all()
+        if not db.session.get(User, 1):
+            db.session.add(User(id=1, username='bench', email='bench@example.com', password_hash='x'))
+            db.session.commit()
+
+        reset_peak_rss()
+        baseline = peak_rss_mb()
+        upload = buffered_upload if mode == 'buffered' else streamed_upload
+        with open(csv_path, 'rb') as stream:
+            meeting = upload(app_module, stream, engine)
+        print(json.dumps({
+            'mode': mode,
+            'baseline_mb': round(baseline, 1),
+            'peak_mb': round(peak_rss_mb(), 1),
+            'runners': sum(len(race.horses) for race in meeting.races),
+        }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size-mb', type=int, default=50, help='Size of the generated CSV')
+    parser.add_argument('--engine', choices=['node', 'python'], default='node')
+    parser.add_argument('--child', nargs=2, metavar=('MODE', 'CSV'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child[0], args.child[1], args.engine)
+        return
+
+    csv_path = os.path.join(tempfile.mkdtemp(), 'upload_memory.csv')
+    write_csv(csv_path, args.size_mb)
+    size_mb = os.path.getsize(csv_path) / (1024 * 1024)
+    print(f"CSV: {size_mb:.1f} MB, engine: {args.engine}")
+    print(f"{'mode':<10} {'baseline RSS':>14} {'peak RSS':>10} {'upload cost':>12}")
+
+    for mode in ('buffered', 'streamed'):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--engine', args.engine, '--child', mode, csv_path],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:<10} {result['baseline_mb']:>11.1f} MB {result['peak_mb']:>7.1f} MB "
+              f"{result['peak_mb'] - result['baseline_mb']:>9.1f} MB")
+
+    os.remove(csv_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+Compressed, content-addressed storage for raw meeting CSVs.
+
+Each distinct CSV is stored once in csv_blobs, zlib-compressed and keyed by
+the SHA-256 of its bytes; meetings point at their blob, so uploading the
+same file twice costs one row. The compressed column is deferred, so nothing
+is read or decompressed until a caller actually needs the raw text
+(Meeting.csv_text, horse_csv_row).
+"""
+import zlib
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Meeting, Race, Horse, CSVBlob
+from csv_stream import iter_chunks, csv_sha256
+from scoring import parse_meeting, get_unique_horses_only, _parse_int
+
+COMPRESSION_LEVEL = 6
+# Tables whose size the migration reports
+STORAGE_TABLES = ('meetings', 'horses', 'csv_blobs')
+
+
+def store_csv(csv_data):
+    """
+    Return the blob holding csv_data (text or a CSVUpload), compressing and
+    inserting it only if no identical CSV is stored yet
+    """
+    digest = csv_sha256(csv_data)
+    blob = CSVBlob.query.filter_by(sha256=digest).first()
+    if blob is not None:
+        return blob
+
+    compressor = zlib.compressobj(COMPRESSION_LEVEL)
+    pieces = []
+    size_bytes = 0
+    for chunk in iter_chunks(csv_data):
+        raw = chunk.encode('utf-8')
+        size_bytes += len(raw)
+        pieces.append(compressor.compress(raw))
+    pieces.append(compressor.flush())
+    data = b''.join(pieces)
+
+    blob = CSVBlob(sha256=digest, size_bytes=size_bytes, compressed_bytes=len(data), data=data)
+    try:
+        with db.session.begin_nested():
+            db.session.add(blob)
+    except IntegrityError:
+        # Another request stored the same CSV first
+        blob = CSVBlob.query.filter_by(sha256=digest).one()
+    return blob
+
+
+def prune_orphan_blobs():
+    """Delete blobs no meeting refers to any more; returns how many"""
+    referenced = db.select(Meeting.csv_blob_id).where(Meeting.csv_blob_id.isnot(None))
+    return CSVBlob.query\
+        .filter(CSVBlob.id.not_in(referenced))\
+        .delete(synchronize_session=False)
+
+
+def runner_rows(csv_text):
+    """The row each runner was scored from, keyed by (race number, horse name)"""
+    rows = {}
+    for row in get_unique_horses_only(parse_meeting(csv_text)):
+        rows.setdefault((_parse_int(row.get('race number')), row.get('horse name')), row)
+    return rows
+
+
+def horse_csv_row(horse):
+    """
+    The CSV row a runner was scored from, re-read from the meeting's blob
+    (rows stored before the migration still carry their own copy)
+    """
+    if horse.csv_data:
+        return horse.csv_data
+
+    csv_text = horse.race.meeting.csv_text
+    if not csv_text:
+        return None
+    return runner_rows(csv_text).get((horse.race.race_number, horse.horse_name))
+
+
+# ----- Migration -----
+
+def table_sizes():
+    """
+    On-disk bytes per table (indexes and TOAST included on Postgres)
+    Returns {} where the backend can't report it
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        query = text("SELECT pg_total_relation_size(CAST(:table AS regclass))")
+        return {table: db.session.execute(query, {'table': table}).scalar() for table in STORAGE_TABLES}
+    if dialect == 'sqlite':
+        try:
+            rows = db.session.execute(text("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name")).all()
+        except Exception:
+            db.session.rollback()
+            return {}
+        sizes = dict(rows)
+        return {table: sizes.get(table, 0) for table in STORAGE_TABLES}
+    return {}
+
+
+def _vacuum():
+    """Hand the freed space back so the files (and backups) actually shrink"""
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        statement = "VACUUM"
+    elif dialect == 'postgresql':
+        statement = "VACUUM FULL ANALYZE meetings, horses"
+    else:
+        return False
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        connection.execute(text(statement))
+    return True
+
+
+def migrate_legacy_storage(batch_size=50, vacuum=True, echo=print):
+    """
+    Move meetings.csv_data into csv_blobs and drop the
+    per-horse row copies that the blobs make redundant
+    """
+    before = table_sizes()
+    pending = Meeting.query.filter(Meeting.csv_blob_id.is_(None), Meeting.csv_data.isnot(None))
+    meeting_ids = [meeting_id for (meeting_id,) in pending.with_entities(Meeting.id).order_by(Meeting.id)]
+
+    moved = 0
+    for start in range(0, len(meeting_ids), batch_size):
+        for meeting in Meeting.query.filter(Meeting.id.in_(meeting_ids[start:start + batch_size])):
+            meeting.csv_blob_id = store_csv(meeting.csv_data).id
+            meeting.csv_data = None
+            moved += 1
+        db.session.commit()
+        db.session.expunge_all()
+    echo(f"Moved {moved} meeting CSV(s) into csv_blobs")
+
+    # Every horse of a meeting with a blob can have its row re-read from it
+    with_blob = db.select(Race.id).join(Meeting).where(Meeting.csv_blob_id.isnot(None))
+    cleared = Horse.query\
+        .filter(Horse.csv_data.isnot(None), Horse.race_id.in_(with_blob))\
+        .update({'csv_data': db.null()}, synchronize_session=False)
+    echo(f"Cleared {cleared} duplicated horse row(s)")
+
+    pruned = prune_orphan_blobs()
+    db.session.commit()
+    if pruned:
+        echo(f"Removed {pruned} unreferenced blob(s)")
+
+    if vacuum and _vacuum():
+        echo("Vacuumed")
+
+    after = table_sizes()
+    for table in STORAGE_TABLES:
+        if table in before and table in after:
+            echo(f"{table:<10} {before[table] / 1024:>10.1f} KB -> {after[table] / 1024:>10.1f} KB")
+    return moved
@@ -0,0 +1,124 @@
+"""
+Chunked reading of uploaded meeting CSVs.
+
+read_upload() makes one pass over the request stream in fixed-size chunks,
+validating the UTF-8 and the header and hashing the bytes as it goes, and
+spools the bytes to a temporary file. The analyzer and the csv_blobs
+compressor then each re-read the spool chunk by chunk, so the upload itself
+is never held in memory as a whole.
+"""
+import codecs
+import hashlib
+import tempfile
+
+from scoring import parse_csv_line
+
+CHUNK_SIZE = 1024 * 1024
+REQUIRED_COLUMNS = ('race number', 'horse name')
+
+
+class CSVUpload:
+    """A validated upload, decoded chunk by chunk on every iteration"""
+
+    def __init__(self, stream, sha256, size_bytes, chunk_size=CHUNK_SIZE):
+        self.stream = stream
+        self.sha256 = sha256
+        self.size_bytes = size_bytes
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        self.stream.seek(0)
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        while True:
+            raw = self.stream.read(self.chunk_size)
+            if not raw:
+                break
+            text = decoder.decode(raw)
+            if text:
+                yield text
+        tail = decoder.decode(b'', final=True)
+        if tail:
+            yield tail
+
+    def text(self):
+        """The whole CSV as one string, for callers that really need it"""
+        return ''.join(self)
+
+    def iter_lines(self):
+        """Lines split on '\\n' exactly like text().split('\\n'), without joining"""
+        pending = ''
+        for chunk in self:
+            pieces = (pending + chunk).split('\n')
+            pending = pieces.pop()
+            yield from pieces
+        yield pending
+
+
+def _check_header(line):
+    headers = {header.strip().lower() for header in parse_csv_line(line)}
+    missing = [column for column in REQUIRED_COLUMNS if column not in headers]
+    if missing:
+        raise Exception(f"CSV is missing required column(s): {', '.join(missing)}")
+
+
+def read_upload(stream, chunk_size=CHUNK_SIZE):
+    """
+    Validate and hash a binary upload stream in one chunked pass
+    Streams that can't seek are spooled to a temporary file on the way
+    Raises Exception for invalid UTF-8, an empty file or a missing header column
+    """
+    spool = None if stream.seekable() else tempfile.TemporaryFile()
+
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    digest = hashlib.sha256()
+    size_bytes = 0
+    header = ''  # text seen before the first non-blank line is complete
+
+    while True:
+        raw = stream.read(chunk_size)
+        if not raw:
+            break
+
+        size_bytes += len(raw)
+        digest.update(raw)
+        if spool is not None:
+            spool.write(raw)
+
+        try:
+            text = decoder.decode(raw)
+        except UnicodeDecodeError as e:
+            raise Exception(f"CSV is not valid UTF-8 (byte {size_bytes - len(raw) + e.start})")
+
+        if header is not None and text:
+            header += text.lstrip() if not header else text
+            if '\n' in header:
+                _check_header(header.split('\n', 1)[0])
+                header = None
+
+    try:
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        raise Exception("CSV is not valid UTF-8 (truncated character at end of file)")
+
+    if header is not None:
+        if not header.strip():
+            raise Exception("CSV file is empty")
+        _check_header(header)
+
+    return CSVUpload(spool or stream, digest.hexdigest(), size_bytes, chunk_size)
+
+
+def iter_chunks(csv_data, chunk_size=CHUNK_SIZE):
+    """Chunks of a CSVUpload, or of a plain string sliced to chunk_size"""
+    if isinstance(csv_data, str):
+        for start in range(0, len(csv_data), chunk_size):
+            yield csv_data[start:start + chunk_size]
+    else:
+        yield from csv_data
+
+
+def csv_sha256(csv_data):
+    """SHA-256 of the CSV's UTF-8 bytes, however it is held"""
+    if isinstance(csv_data, CSVUpload):
+        return csv_data.sha256
+    return hashlib.sha256(csv_data.encode('utf-8')).hexdigest()
@@ -0,0 +1,134 @@
+"""
+Race-by-race differences between two versions of a meeting CSV.
+
+A revised form guide (late scratchings, jockey changes) usually touches
+one or two races. Every scoring stage works within a race except the
+analyzer's final de-duplication on horse name, which spans the meeting, so
+a race can be re-scored on its own as long as the races sharing a horse
+name with it are re-scored alongside it.
+"""
+from scoring import parse_csv_line, parse_runner_rows, _trimmed_lines, _js_trim
+
+
+def _race_key(row):
+    race_num = row.get('race number', '')
+    return int(race_num) if race_num.isdigit() else None
+
+
+def rows_by_race(csv_text):
+    """A CSV's scored rows grouped by race number, in file order"""
+    races = {}
+    for row in parse_runner_rows(csv_text):
+        races.setdefault(_race_key(row), []).append(row)
+    races.pop(None, None)  # never stored
+    return races
+
+
+def _runners(rows):
+    runners = {}
+    for row in rows:
+        runners.setdefault(row.get('horse name'), []).append(row)
+    return runners
+
+
+class MeetingDiff:
+    """
+    What changed between two versions of a meeting CSV
+
+    changed   race numbers to re-score (present in the new CSV)
+    removed   race numbers no longer in the new CSV
+    shared    unchanged races re-scored because they share a horse name (in either
+              version) with a changed or removed one
+    runners   {race number: {'added': [...], 'scratched': [...], 'changed': [...]}}
+    """
+
+    def __init__(self, old_races, new_races):
+        self.runners = {}
+        self.changed = set()
+        for race_num, rows in new_races.items():
+            old_rows = old_races.get(race_num)
+            if old_rows == rows:
+                continue
+            self.changed.add(race_num)
+            old, new = _runners(old_rows or []), _runners(rows)
+            self.runners[race_num] = {
+                'added': [name for name in new if name not in old],
+                'scratched': [name for name in old if name not in new],
+                'changed': [name for name in new if name in old and old[name] != new[name]],
+            }
+        self.removed = set(old_races) - set(new_races)
+        self.shared = set()
+        self.meeting_date = new_races[min(new_races)][0].get('meeting date') if new_races else None
+
+        # Races sharing a horse name go through the meeting-wide de-dup together.
+        # Names shared in the old CSV count too: the stored runner may sit in
+        # a changed or removed race and have to move to one that isn't
+        races_by_name = {}
+        for races_version in (old_races, new_races):
+            for race_num, rows in races_version.items():
+                for row in rows:
+                    if row.get('meeting date') and row.get('horse name'):
+                        races_by_name.setdefault(row['horse name'], set()).add(race_num)
+        touched = self.changed | self.removed
+        linked = True
+        while linked:
+            linked = False
+            for races in races_by_name.values():
+                if len(races) > 1 and races & touched and not races <= touched:
+                    # Anything not yet touched is in both versions, unchanged
+                    self.shared |= races - touched
+                    self.changed |= races - touched
+                    touched |= races
+                    linked = True
+
+    def __bool__(self):
+        return bool(self.changed or self.removed)
+
+    def summary(self):
+        """One line per touched race, e.g. 'Race 4: scratched Foo; changed Bar'"""
+        lines = []
+        for race_num in sorted(self.changed | self.removed):
+            if race_num in self.removed:
+                lines.append(f"Race {race_num}: removed")
+                continue
+            runners = self.runners.get(race_num, {})
+            parts = []
+            if runners.get('scratched'):
+                parts.append('scratched ' + ', '.join(runners['scratched']))
+            if runners.get('added'):
+                parts.append('added ' + ', '.join(runners['added']))
+            if runners.get('changed'):
+                parts.append('changed ' + ', '.join(runners['changed']))
+            if race_num in self.shared:
+                parts.append('re-scored with a race sharing a horse name')
+            lines.append(f"Race {race_num}: " + ('; '.join(parts) or 'rows changed'))
+        return lines
+
+
+def diff(old_csv_text, new_csv_text):
+    """MeetingDiff from one CSV text to another (old may be None: every race changed)"""
+    old_races = rows_by_race(old_csv_text) if old_csv_text else {}
+    return MeetingDiff(old_races, rows_by_race(new_csv_text))
+
+
+def races_csv(csv_text, race_numbers):
+    """
+    The CSV cut down to the given races: its header line and the data lines
+    of those races, verbatim, so the analyzer reads them exactly as it
+    would in the whole file
+    """
+    lines = _trimmed_lines(csv_text.split('\n'))
+    header = next(lines)
+    width = len(parse_csv_line(header))
+    headers = [_js_trim(name).lower() for name in parse_csv_line(header)]
+    race_column = headers.index('race number') if 'race number' in headers else None
+
+    kept = [header]
+    for line in lines:
+        values = parse_csv_line(line)
+        if len(values) != width or race_column is None:
+            continue
+        race_num = _js_trim(values[race_column])
+        if race_num.isdigit() and int(race_num) in race_numbers:
+            kept.append(line)
+    return '\n'.join(kept)
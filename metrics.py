@@ -0,0 +1,239 @@
+"""
+In-process timing and query metrics, exported in the Prometheus text format.
+
+span('stage') times a block of work into the formanalyst_stage_seconds
+histogram; spans wrap the analyzer (worker spawn, checkout, send, wait,
+decode), python scoring, storing a meeting, loading its results and every
+template render. Each request also records its duration and how many SQL
+statements it ran. With METRICS_JSON_LOG on, every request (and worker.py
+job) is logged as one JSON line holding its per-stage times.
+
+Metrics live in this process: each gunicorn worker and worker.py keep their
+own, and /metrics shows the process that answered it.
+"""
+import sys
+import json
+import time
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import request, g, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+
+# name: (type, help)
+METRICS = {
+    'formanalyst_stage_seconds': ('histogram', 'Time spent in each stage of analyzing, storing and showing meetings'),
+    'formanalyst_request_seconds': ('histogram', 'Request duration by endpoint'),
+    'formanalyst_request_sql_queries': ('histogram', 'SQL statements run per request, by endpoint'),
+    'formanalyst_responses_total': ('counter', 'Responses by endpoint and status code'),
+    'formanalyst_sql_queries_total': ('counter', 'SQL statements run by this process'),
+}
+
+_lock = threading.Lock()
+_histograms = {}  # (name, labels) -> [bounds, per-bucket counts, sum, count]
+_counters = {}    # (name, labels) -> value
+_local = threading.local()
+_installed = False
+
+log = logging.getLogger('formanalyst.metrics')
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def observe(name, value, buckets=SECONDS_BUCKETS, **labels):
+    """Add one observation to a histogram"""
+    key = (name, _labels(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [buckets, [0] * len(buckets), 0.0, 0]
+        index = bisect_left(buckets, value)
+        if index < len(buckets):
+            histogram[1][index] += 1
+        histogram[2] += value
+        histogram[3] += 1
+
+
+def increment(name, amount=1, **labels):
+    """Add to a counter"""
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+@contextmanager
+def collect():
+    """
+    Gather the spans and SQL statements of the block into a dict:
+    {'spans': {stage: seconds}, 'sql_queries': n}
+    Requests are collected automatically; worker.py uses this per job
+    """
+    collected = {'spans': {}, 'sql_queries': 0}
+    previous = getattr(_local, 'collected', None)
+    _local.collected = collected
+    try:
+        yield collected
+    finally:
+        _local.collected = previous
+
+
+@contextmanager
+def span(stage):
+    """Time the block as one observation of stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record_span(stage, time.perf_counter() - start)
+
+
+def _record_span(stage, seconds):
+    observe('formanalyst_stage_seconds', seconds, stage=stage)
+    collected = getattr(_local, 'collected', None)
+    if collected is not None:
+        collected['spans'][stage] = collected['spans'].get(stage, 0) + seconds
+
+
+def _count_query(*_):
+    increment('formanalyst_sql_queries_total')
+    collected = getattr(_local, 'collected', None)
+    if collected is not None:
+        collected['sql_queries'] += 1
+
+
+def log_json(record):
+    """Write one structured log line (when METRICS_JSON_LOG is on)"""
+    log.info(json.dumps(record, default=str))
+
+
+def round_spans(spans):
+    """{stage: seconds} as {stage: milliseconds} for logging"""
+    return {stage: round(seconds * 1000, 2) for stage, seconds in spans.items()}
+
+
+def init_app(app):
+    """Time every request of app, count its SQL statements and time template renders"""
+    global _installed
+    if not _installed:
+        event.listen(Engine, 'before_cursor_execute', _count_query)
+        _installed = True
+
+    if app.config.get('METRICS_JSON_LOG') and not log.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        log.addHandler(handler)
+        log.setLevel(logging.INFO)
+        log.propagate = False
+
+    @app.before_request
+    def _start_request():
+        g.metrics_started = time.perf_counter()
+        g.metrics = _local.collected = {'spans': {}, 'sql_queries': 0}
+
+    @app.teardown_request
+    def _end_request(error=None):
+        _local.collected = None
+
+    @app.after_request
+    def _finish_request(response):
+        started = g.pop('metrics_started', None)
+        collected = g.pop('metrics', None)
+        if started is None or collected is None:
+            return response
+
+        seconds = time.perf_counter() - started
+        endpoint = request.endpoint or 'unmatched'
+        observe('formanalyst_request_seconds', seconds, endpoint=endpoint)
+        observe('formanalyst_request_sql_queries', collected['sql_queries'], QUERY_BUCKETS, endpoint=endpoint)
+        increment('formanalyst_responses_total', endpoint=endpoint, status=str(response.status_code))
+
+        if app.config.get('METRICS_JSON_LOG'):
+            log_json({
+                'method': request.method,
+                'path': request.path,
+                'endpoint': endpoint,
+                'status': response.status_code,
+                'duration_ms': round(seconds * 1000, 2),
+                'sql_queries': collected['sql_queries'],
+                'spans_ms': round_spans(collected['spans']),
+            })
+        return response
+
+    def _render_started(sender, template, context, **extra):
+        g.setdefault('metrics_renders', []).append(time.perf_counter())
+
+    def _render_finished(sender, template, context, **extra):
+        starts = g.get('metrics_renders')
+        if starts:
+            _record_span(f"render:{template.name}", time.perf_counter() - starts.pop())
+
+    before_render_template.connect(_render_started, app, weak=False)
+    template_rendered.connect(_render_finished, app, weak=False)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(gauges=(), counters=()):
+    """
+    Every metric in the Prometheus text format
+    gauges and counters are (name, help, labels dict, value) read at scrape
+    time; counters are totals kept elsewhere, such as a pool's restarts
+    """
+    with _lock:
+        histograms = {key: (value[0], list(value[1]), value[2], value[3]) for key, value in _histograms.items()}
+        totals = dict(_counters)
+
+    lines = []
+    for name, (metric_type, help_text) in METRICS.items():
+        series = sorted(
+            (key, value) for key, value in (histograms if metric_type == 'histogram' else totals).items()
+            if key[0] == name
+        )
+        if not series:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for (_, labels), value in series:
+            if metric_type == 'counter':
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                continue
+            buckets, counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', _format_value(float(bound))),))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+    # A family's samples must be contiguous, whatever order they came in
+    families = {}
+    for metric_type, samples in (('gauge', gauges), ('counter', counters)):
+        for name, help_text, labels, value in samples:
+            families.setdefault(name, (metric_type, help_text, []))[2].append((labels, value))
+    for name, (metric_type, help_text, samples) in families.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for labels, value in samples:
+            lines.append(f"{name}{_format_labels(_labels(labels))} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,263 @@
+"""
+Schema migrations for databases that already exist.
+
+db.create_all() creates missing tables but never alters existing ones, so
+every schema change after a table first shipped is a numbered step here.
+Applied steps are recorded in schema_migrations and upgrade() runs the rest
+in order, each in its own transaction. Steps are written to be no-ops on a
+database that create_all() has just built from the current models.
+
+upgrade() runs at startup; `flask --app app db-upgrade` runs it by hand.
+"""
+from datetime import datetime
+
+from sqlalchemy import exc, inspect, insert, select, text
+
+from models import db, AnalysisJob, SchemaMigration
+from scoring import parse_formatted_number
+
+# Serializes upgrades from processes starting at the same time (Postgres)
+_LOCK_KEY = 0x466f726d
+_migrations = []
+
+
+def migration(version, description):
+    """Register a step; function(connection) runs inside the step's transaction"""
+    def register(function):
+        _migrations.append((version, description, function))
+        return function
+    return register
+
+
+def _create_indexes(connection, statements):
+    """Run index DDL (IF [NOT] EXISTS keeps each statement idempotent)"""
+    for statement in statements:
+        connection.execute(text(statement))
+
+
+@migration(1, "Add meetings.csv_blob_id")
+def _add_csv_blob_id(connection):
+    columns = {column['name'] for column in inspect(connection).get_columns('meetings')}
+    if 'csv_blob_id' not in columns:
+        connection.execute(text("ALTER TABLE meetings ADD COLUMN csv_blob_id INTEGER REFERENCES csv_blobs(id)"))
+
+
+@migration(2, "Index foreign keys and sort columns")
+def _add_indexes(connection):
+    _create_indexes(connection, [
+        "CREATE INDEX IF NOT EXISTS ix_meetings_uploaded_at ON meetings (uploaded_at)",
+        "CREATE INDEX IF NOT EXISTS ix_meetings_user_id_uploaded_at ON meetings (user_id, uploaded_at)",
+        "CREATE INDEX IF NOT EXISTS ix_meetings_csv_blob_id ON meetings (csv_blob_id)",
+        "CREATE INDEX IF NOT EXISTS ix_races_meeting_id_race_number ON races (meeting_id, race_number)",
+        "CREATE INDEX IF NOT EXISTS ix_horses_race_id ON horses (race_id)",
+        "CREATE INDEX IF NOT EXISTS ix_analysis_jobs_user_id ON analysis_jobs (user_id)",
+    ])
+
+
+@migration(3, "One prediction per horse")
+def _unique_prediction_per_horse(connection):
+    # Keep the first prediction stored for any horse that somehow has several
+    connection.execute(text(
+        "DELETE FROM predictions WHERE id NOT IN "
+        "(SELECT MIN(id) FROM predictions GROUP BY horse_id)"
+    ))
+    _create_indexes(connection, [
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_predictions_horse_id ON predictions (horse_id)",
+    ])
+
+
+@migration(4, "Meeting summary columns and (uploaded_at, id) keyset index")
+def _meeting_summaries(connection):
+    columns = {column['name'] for column in inspect(connection).get_columns('meetings')}
+    for name, column_type in (('race_count', 'INTEGER'), ('runner_count', 'INTEGER'),
+                              ('track_condition', 'VARCHAR(50)')):
+        if name not in columns:
+            connection.execute(text(f"ALTER TABLE meetings ADD COLUMN {name} {column_type}"))
+
+    connection.execute(text(
+        "UPDATE meetings SET "
+        "race_count = (SELECT COUNT(*) FROM races WHERE races.meeting_id = meetings.id), "
+        "runner_count = (SELECT COUNT(*) FROM horses JOIN races ON horses.race_id = races.id "
+        "WHERE races.meeting_id = meetings.id), "
+        "track_condition = (SELECT MIN(races.track_condition) FROM races WHERE races.meeting_id = meetings.id) "
+        "WHERE race_count IS NULL"
+    ))
+    _create_indexes(connection, [
+        "CREATE INDEX IF NOT EXISTS ix_meetings_uploaded_at_id ON meetings (uploaded_at, id)",
+        "DROP INDEX IF EXISTS ix_meetings_uploaded_at",
+    ])
+
+
+@migration(5, "Numeric prediction columns backfilled from the formatted strings")
+def _numeric_predictions(connection):
+    columns = {column['name'] for column in inspect(connection).get_columns('predictions')}
+    for name in ('true_odds', 'win_percent', 'performance_percent', 'base_percent'):
+        if name not in columns:
+            connection.execute(text(f"ALTER TABLE predictions ADD COLUMN {name} FLOAT"))
+
+    last_id = 0
+    while True:
+        rows = connection.execute(text(
+            "SELECT id, predicted_odds, win_probability, performance_component, base_probability "
+            "FROM predictions WHERE id > :last_id AND true_odds IS NULL ORDER BY id LIMIT 5000"
+        ), {'last_id': last_id}).all()
+        if not rows:
+            break
+        connection.execute(text(
+            "UPDATE predictions SET true_odds = :true_odds, win_percent = :win_percent, "
+            "performance_percent = :performance_percent, base_percent = :base_percent WHERE id = :id"
+        ), [{
+            'id': row.id,
+            'true_odds': parse_formatted_number(row.predicted_odds),
+            'win_percent': parse_formatted_number(row.win_probability),
+            'performance_percent': parse_formatted_number(row.performance_component),
+            'base_percent': parse_formatted_number(row.base_probability),
+        } for row in rows])
+        last_id = rows[-1].id
+
+    _create_indexes(connection, [
+        "CREATE INDEX IF NOT EXISTS ix_predictions_true_odds ON predictions (true_odds)",
+    ])
+
+
+@migration(6, "Per-runner track condition records for re-scoring")
+def _horse_track_records(connection):
+    # Existing meetings get theirs from the stored CSV on their first re-score
+    columns = {column['name'] for column in inspect(connection).get_columns('horses')}
+    if 'track_records' not in columns:
+        connection.execute(text("ALTER TABLE horses ADD COLUMN track_records JSON"))
+
+
+@migration(7, "Per-condition scores on predictions")
+def _prediction_condition_scores(connection):
+    # Filled for existing meetings by `flask sweep-conditions`
+    columns = {column['name'] for column in inspect(connection).get_columns('predictions')}
+    if 'condition_scores' not in columns:
+        connection.execute(text("ALTER TABLE predictions ADD COLUMN condition_scores JSON"))
+
+
+@migration(8, "Structured score components and prediction tags")
+def _prediction_components(connection):
+    # prediction_tags itself is created by create_all(); existing meetings
+    # get both from `flask backfill-components`
+    columns = {column['name'] for column in inspect(connection).get_columns('predictions')}
+    if 'components' not in columns:
+        connection.execute(text("ALTER TABLE predictions ADD COLUMN components JSON"))
+
+
+@migration(9, "Meeting results version for API ETags")
+def _meeting_results_version(connection):
+    columns = {column['name'] for column in inspect(connection).get_columns('meetings')}
+    if 'results_version' not in columns:
+        connection.execute(text("ALTER TABLE meetings ADD COLUMN results_version INTEGER NOT NULL DEFAULT 1"))
+
+
+@migration(10, "Cross-meeting horse, jockey and trainer index")
+def _entity_index(connection):
+    # entities and entity_aliases are created by create_all(); existing
+    # runners are linked by `flask index-runners`
+    columns = {column['name'] for column in inspect(connection).get_columns('horses')}
+    for name in ('horse_entity_id', 'jockey_entity_id', 'trainer_entity_id'):
+        if name not in columns:
+            connection.execute(text(f"ALTER TABLE horses ADD COLUMN {name} INTEGER REFERENCES entities (id)"))
+    _create_indexes(connection, [
+        f"CREATE INDEX IF NOT EXISTS ix_horses_{name}_id ON horses ({name}, id)"
+        for name in ('horse_entity_id', 'jockey_entity_id', 'trainer_entity_id')
+    ])
+
+    # Full-text search where the database offers it; search_index.py falls
+    # back to LIKE on entities.search_text without
+    nested = connection.begin_nested()
+    try:
+        if connection.dialect.name == 'sqlite':
+            connection.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS entity_search "
+                "USING fts5(kind UNINDEXED, search_text, prefix='2 3')"
+            ))
+            connection.execute(text(
+                "INSERT INTO entity_search (rowid, kind, search_text) "
+                "SELECT id, kind, search_text FROM entities WHERE id NOT IN (SELECT rowid FROM entity_search)"
+            ))
+        elif connection.dialect.name == 'postgresql':
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            connection.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_entities_search_text_trgm "
+                "ON entities USING gin (search_text gin_trgm_ops)"
+            ))
+        nested.commit()
+    except exc.DBAPIError:
+        # No FTS5 in this SQLite build, or no permission to add pg_trgm
+        nested.rollback()
+
+
+@migration(11, "Index meetings.date for matching imported results")
+def _meeting_date_index(connection):
+    # runner_results is created by create_all(); dates of existing meetings
+    # are filled from their CSVs by `flask import-results`
+    _create_indexes(connection, [
+        "CREATE INDEX IF NOT EXISTS ix_meetings_date ON meetings (date)",
+    ])
+
+
+@migration(12, "Clear the CSVs of finished analysis jobs")
+def _nullable_job_csv(connection):
+    # worker.py drops a job's CSV once it's stored with the meeting (or the
+    # job failed); that needs analysis_jobs.csv_data to allow NULL
+    columns = {column['name']: column for column in inspect(connection).get_columns('analysis_jobs')}
+    if not columns['csv_data']['nullable']:
+        if connection.dialect.name == 'sqlite':
+            # SQLite can't drop a NOT NULL, so the table is rebuilt from the
+            # model. pysqlite runs DDL outside a transaction unless one is
+            # open: open one so a failed rebuild rolls back with the step
+            if not connection.connection.dbapi_connection.in_transaction:
+                connection.exec_driver_sql("BEGIN")
+            connection.execute(text("ALTER TABLE analysis_jobs RENAME TO analysis_jobs_old"))
+            for name in connection.execute(text(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'analysis_jobs_old' "
+                "AND sql IS NOT NULL"
+            )).scalars().all():
+                connection.execute(text(f'DROP INDEX "{name}"'))
+            AnalysisJob.__table__.create(connection)
+            names = ', '.join(name for name in AnalysisJob.__table__.columns.keys() if name in columns)
+            connection.execute(text(f"INSERT INTO analysis_jobs ({names}) SELECT {names} FROM analysis_jobs_old"))
+            connection.execute(text("DROP TABLE analysis_jobs_old"))
+        else:
+            connection.execute(text("ALTER TABLE analysis_jobs ALTER COLUMN csv_data DROP NOT NULL"))
+    connection.execute(text("UPDATE analysis_jobs SET csv_data = NULL WHERE status IN ('finished', 'failed')"))
+
+
+def _applied_versions(connection):
+    return set(connection.execute(select(SchemaMigration.version)).scalars())
+
+
+def pending():
+    """(version, description) of every step not yet applied"""
+    with db.engine.connect() as connection:
+        applied = _applied_versions(connection)
+    return [(version, description) for version, description, _ in sorted(_migrations) if version not in applied]
+
+
+def upgrade(echo=None):
+    """
+    Apply pending steps in order and return their versions
+    Raises if a step fails; that step's changes are rolled back
+    """
+    applied = []
+    for version, description in pending():
+        function = next(step[2] for step in _migrations if step[0] == version)
+        with db.engine.begin() as connection:
+            if connection.dialect.name == 'postgresql':
+                connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': _LOCK_KEY})
+            # Another process may have applied it while we waited
+            if version in _applied_versions(connection):
+                continue
+            function(connection)
+            connection.execute(insert(SchemaMigration.__table__).values(
+                version=version,
+                description=description,
+                applied_at=datetime.utcnow()
+            ))
+        applied.append(version)
+        if echo:
+            echo(f"Applied migration {version}: {description}")
+    return applied
@@ -2,6 +2,7 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+import zlib
 
 db = SQLAlchemy()
 
@@ -42,16 +43,60 @@ class Meeting(db.Model):
     meeting_name = db.Column(db.String(200), nullable=False)
     track = db.Column(db.String(100))
     date = db.Column(db.Date)
-    csv_data = db.Column(db.Text)  # Store original CSV
+    csv_data = db.deferred(db.Column(db.Text))  # Legacy: moved into csv_blobs by `flask migrate-csv-storage`
+    csv_blob_id = db.Column(db.Integer, db.ForeignKey('csv_blobs.id'), index=True)
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Summary kept on the meeting so listings never touch races or horses
+    race_count = db.Column(db.Integer, default=0)
+    runner_count = db.Column(db.Integer, default=0)
+    track_condition = db.Column(db.String(50))
+    # Bumped whenever the meeting's predictions are rewritten; part of the API's ETags
+    results_version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    
     # Relationships
     races = db.relationship('Race', backref='meeting', lazy=True, cascade='all, delete-orphan')
+    csv_blob = db.relationship('CSVBlob', lazy=True)
+    
+    __table_args__ = (
+        db.Index('ix_meetings_uploaded_at_id', 'uploaded_at', 'id'),  # history keyset
+        db.Index('ix_meetings_user_id_uploaded_at', 'user_id', 'uploaded_at'),
+        db.Index('ix_meetings_date', 'date'),  # matching imported results
+    )
+    
+    @property
+    def csv_text(self):
+        """The original CSV, decompressed on first access"""
+        if self.csv_blob is not None:
+            return self.csv_blob.text()
+        return self.csv_data
     
     def __repr__(self):
         return f'<Meeting {self.meeting_name}>'
 
 
+class CSVBlob(db.Model):
+    """
+    A raw uploaded CSV, zlib-compressed and addressed by the SHA-256 of its
+    bytes, so identical uploads share one row (see csv_blobs.py)
+    """
+    __tablename__ = 'csv_blobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    size_bytes = db.Column(db.Integer, nullable=False)
+    compressed_bytes = db.Column(db.Integer, nullable=False)
+    data = db.deferred(db.Column(db.LargeBinary, nullable=False))  # only loaded by text()
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def text(self):
+        """Decompress and decode the CSV"""
+        return zlib.decompress(self.data).decode('utf-8')
+    
+    def __repr__(self):
+        return f'<CSVBlob {self.sha256[:12]}>'
+
+
 class Race(db.Model):
     """Individual races within a meeting"""
     __tablename__ = 'races'
@@ -66,6 +111,8 @@ class Race(db.Model):
     # Relationships
     horses = db.relationship('Horse', backref='race', lazy=True, cascade='all, delete-orphan')
     
+    __table_args__ = (db.Index('ix_races_meeting_id_race_number', 'meeting_id', 'race_number'),)
+    
     def __repr__(self):
         return f'<Race {self.meeting_id}-{self.race_number}>'
 
@@ -75,19 +122,36 @@ class Horse(db.Model):
     __tablename__ = 'horses'
     
     id = db.Column(db.Integer, primary_key=True)
-    race_id = db.Column(db.Integer, db.ForeignKey('races.id'), nullable=False)
+    race_id = db.Column(db.Integer, db.ForeignKey('races.id'), nullable=False, index=True)
     horse_name = db.Column(db.String(100), nullable=False)
     barrier = db.Column(db.Integer)
     weight = db.Column(db.Float)
     jockey = db.Column(db.String(100))
     trainer = db.Column(db.String(100))
     form = db.Column(db.String(50))
+    # The runner's 'horse record <condition>' values, so the meeting can be
+    # re-scored for another track condition without re-reading the CSV
+    track_records = db.Column(db.JSON)
     
-    # Store all CSV data as JSON for flexibility
+    # Legacy copy of the runner's CSV row; now read from the meeting's
+    # blob on demand (csv_blobs.horse_csv_row)
     csv_data = db.Column(db.JSON)
     
+    # The runner's horse, jockey and trainer in the cross-meeting index (search_index.py)
+    horse_entity_id = db.Column(db.Integer, db.ForeignKey('entities.id'))
+    jockey_entity_id = db.Column(db.Integer, db.ForeignKey('entities.id'))
+    trainer_entity_id = db.Column(db.Integer, db.ForeignKey('entities.id'))
+    
     # Relationships
     prediction = db.relationship('Prediction', backref='horse', uselist=False, cascade='all, delete-orphan')
+    result = db.relationship('RunnerResult', uselist=False, cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        # An entity's runs, newest first
+        db.Index('ix_horses_horse_entity_id_id', 'horse_entity_id', 'id'),
+        db.Index('ix_horses_jockey_entity_id_id', 'jockey_entity_id', 'id'),
+        db.Index('ix_horses_trainer_entity_id_id', 'trainer_entity_id', 'id'),
+    )
     
     def __repr__(self):
         return f'<Horse {self.horse_name}>'
@@ -100,12 +164,152 @@ class Prediction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     horse_id = db.Column(db.Integer, db.ForeignKey('horses.id'), nullable=False)
     score = db.Column(db.Float, nullable=False)
+    true_odds = db.Column(db.Float, index=True)  # dollars, e.g. 4.5
+    win_percent = db.Column(db.Float)            # e.g. 23.1
+    performance_percent = db.Column(db.Float)
+    base_percent = db.Column(db.Float)
+    # Legacy formatted strings ('$4.50', '23.1%'); rows stored before the
+    # numeric columns above were backfilled from these by migration 5
     predicted_odds = db.Column(db.String(20))
     win_probability = db.Column(db.String(20))
     performance_component = db.Column(db.String(20))
     base_probability = db.Column(db.String(20))
-    notes = db.Column(db.Text)
+    notes = db.Column(db.Text)  # Legacy: now generated on demand (see /meeting/<id>/notes)
+    # [[component id, points, [tags]], ...] in the order the score adds them
+    components = db.Column(db.JSON(none_as_null=True))
+    # {condition: {'score', 'true_odds', 'win_percent'}} for every track
+    # condition, so the page can switch between them without re-analysing
+    condition_scores = db.Column(db.JSON)
     calculated_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Relationships
+    tags = db.relationship('PredictionTag', lazy=True, cascade='all, delete-orphan')
+    
+    __table_args__ = (db.Index('uq_predictions_horse_id', 'horse_id', unique=True),)
+    
     def __repr__(self):
         return f'<Prediction {self.horse_id}: {self.score}>'
+
+
+class PredictionTag(db.Model):
+    """Tags earned by a prediction's score components, for indexed filtering"""
+    __tablename__ = 'prediction_tags'
+    
+    prediction_id = db.Column(db.Integer, db.ForeignKey('predictions.id', ondelete='CASCADE'), primary_key=True)
+    tag = db.Column(db.String(40), primary_key=True)
+    
+    __table_args__ = (db.Index('ix_prediction_tags_tag_prediction_id', 'tag', 'prediction_id'),)
+    
+    def __repr__(self):
+        return f'<PredictionTag {self.prediction_id} {self.tag}>'
+
+
+class RunnerResult(db.Model):
+    """A runner's official finishing position, imported for backtesting (backtest.py)"""
+    __tablename__ = 'runner_results'
+    
+    horse_id = db.Column(db.Integer, db.ForeignKey('horses.id', ondelete='CASCADE'), primary_key=True)
+    position = db.Column(db.Integer)  # None: scratched or didn't finish
+    starting_price = db.Column(db.Float)
+    imported_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<RunnerResult {self.horse_id} {self.position}>'
+
+
+class Entity(db.Model):
+    """A horse, jockey or trainer across every meeting, under its canonical name"""
+    __tablename__ = 'entities'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(10), nullable=False)  # 'horse', 'jockey' or 'trainer'
+    name = db.Column(db.String(100), nullable=False)
+    # search_index.name_key() of the canonical name; spellings with the same key are one entity
+    search_key = db.Column(db.String(100), nullable=False)
+    # Every key it's known by (canonical name and aliases), for full-text search
+    search_text = db.Column(db.Text, nullable=False, default='')
+    
+    aliases = db.relationship('EntityAlias', backref='entity', lazy=True, cascade='all, delete-orphan')
+    
+    __table_args__ = (db.UniqueConstraint('kind', 'search_key', name='uq_entities_kind_search_key'),)
+    
+    def __repr__(self):
+        return f'<Entity {self.kind} {self.name}>'
+
+
+class EntityAlias(db.Model):
+    """A spelling of an entity's name as it appeared in an upload"""
+    __tablename__ = 'entity_aliases'
+    
+    kind = db.Column(db.String(10), primary_key=True)
+    alias = db.Column(db.String(100), primary_key=True)
+    entity_id = db.Column(db.Integer, db.ForeignKey('entities.id', ondelete='CASCADE'), nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<EntityAlias {self.kind} {self.alias}>'
+
+
+class AnalysisCache(db.Model):
+    """Analyzer output memoized by a hash of its inputs (see analysis_cache.py)"""
+    __tablename__ = 'analysis_cache'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    cache_key = db.Column(db.String(64), unique=True, nullable=False)
+    analyzer_version = db.Column(db.String(80), nullable=False)
+    result = db.Column(db.JSON, nullable=False)
+    size_bytes = db.Column(db.Integer, default=0)
+    hits = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<AnalysisCache {self.cache_key[:12]}>'
+
+
+class AnalysisJob(db.Model):
+    """Queued /analyze uploads, processed by worker.py"""
+    __tablename__ = 'analysis_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    filename = db.Column(db.String(255), nullable=False)
+    csv_data = db.Column(db.Text)  # cleared once the job has finished or failed
+    track_condition = db.Column(db.String(50), nullable=False)
+    is_advanced = db.Column(db.Boolean, default=False)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, running, finished, failed
+    error = db.Column(db.Text)
+    meeting_id = db.Column(db.Integer, db.ForeignKey('meetings.id', ondelete='SET NULL'))
+    queued_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    user = db.relationship('User', backref=db.backref('analysis_jobs', lazy=True, cascade='all, delete-orphan'))
+    
+    @property
+    def queue_seconds(self):
+        """Time spent waiting for a worker"""
+        if self.started_at and self.queued_at:
+            return (self.started_at - self.queued_at).total_seconds()
+        return None
+    
+    @property
+    def run_seconds(self):
+        """Time spent analyzing and storing"""
+        if self.finished_at and self.started_at:
+            return (self.finished_at - self.started_at).total_seconds()
+        return None
+    
+    def __repr__(self):
+        return f'<AnalysisJob {self.id} {self.status}>'
+
+
+class SchemaMigration(db.Model):
+    """Schema changes applied to this database (see migrations.py)"""
+    __tablename__ = 'schema_migrations'
+    
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    description = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SchemaMigration {self.version}>'
@@ -0,0 +1,122 @@
+"""
+Race-level sharding of one large analysis across processes or workers.
+
+Every multi-row stage of the analyzer (sectionals, weights, form prices,
+true odds) groups rows by race number, and look-ups match races on
+parseInt(race number). The one stage that spans races is the final
+de-duplication on horse name. So a CSV can be cut into shards of whole
+races, with races that share a horse name kept in one shard, and each shard
+scored on its own. Merging the shards' results with the analyzer's own
+stable sort (race number, then score descending) gives exactly the serial
+output.
+
+Shards are cut from the CSV's lines verbatim, so each worker parses its own
+share as well as scoring it.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import batch
+from metrics import span
+from scoring import analyze_csv, parse_csv_line, _trimmed_lines, _js_trim, _parse_int, _is_nan
+
+
+def split(lines, shards):
+    """
+    Cut CSV lines (the text's lines, or a CSVUpload's iter_lines()) into at
+    most shards CSV texts of whole races, balanced on row count
+    Returns [] when there is nothing to split (fewer than two races)
+    """
+    lines = _trimmed_lines(lines)
+    header = next(lines)
+    headers = [_js_trim(name).lower() for name in parse_csv_line(header)]
+    if 'race number' not in headers or 'horse name' not in headers:
+        return []
+    # parse_csv builds each row dict in column order, so a repeated header reads its last column
+    race_column = len(headers) - 1 - headers[::-1].index('race number')
+    name_column = len(headers) - 1 - headers[::-1].index('horse name')
+
+    rows = []    # (parseInt(race number), line), in file order
+    sizes = {}   # race -> rows
+    parent = {}  # union-find over races sharing a horse name
+    race_of_name = {}
+
+    def find(race):
+        while parent[race] != race:
+            parent[race] = parent[parent[race]]
+            race = parent[race]
+        return race
+
+    for line in lines:
+        values = parse_csv_line(line)
+        if len(values) != len(headers):
+            continue
+        race = _parse_int(_js_trim(values[race_column]))
+        if _is_nan(race):
+            continue  # never scored
+        if race not in sizes:
+            sizes[race] = 0
+            parent[race] = race
+        sizes[race] += 1
+        rows.append((race, line))
+        other = race_of_name.setdefault(_js_trim(values[name_column]), race)
+        if other != race:
+            parent[find(race)] = find(other)
+
+    groups = {}
+    for race, size in sizes.items():
+        root = find(race)
+        groups[root] = groups.get(root, 0) + size
+    if len(groups) < 2 or shards < 2:
+        return []
+
+    # Largest groups first, each onto the least loaded shard
+    loads = [0] * min(shards, len(groups))
+    shard_of_group = {}
+    for root in sorted(groups, key=lambda root: -groups[root]):
+        shard = loads.index(min(loads))
+        loads[shard] += groups[root]
+        shard_of_group[root] = shard
+
+    # Lines keep their file order within a shard: the de-duplication's
+    # "last wins" depends on it when a name runs in two races
+    shard_lines = [[header] for _ in loads]
+    for race, line in rows:
+        shard_lines[shard_of_group[find(race)]].append(line)
+    return ['\n'.join(lines) for lines in shard_lines]
+
+
+def merge(shard_results):
+    """One result list from the shards' results, in the analyzer's order"""
+    results = [result for shard in shard_results for result in shard]
+    # Stable, as Array.prototype.sort is: a race's runners all come from one shard
+    results.sort(key=lambda r: (_parse_int(r['horse']['race number']), -r['score']))
+    return results
+
+
+def _analyze_shard(csv_text, track_condition, is_advanced):
+    # Runs in a pool process
+    return analyze_csv(csv_text, track_condition, is_advanced)
+
+
+def analyze_python(shards, track_condition, is_advanced, workers):
+    """Score the shard texts in the batch pool's processes and merge them"""
+    executor = batch.process_executor(workers)
+    futures = [executor.submit(_analyze_shard, text, track_condition, is_advanced) for text in shards]
+    try:
+        with span('shard_score'):
+            shard_results = [future.result() for future in futures]
+    except BrokenProcessPool as e:
+        batch.discard_executor(executor)
+        raise Exception(f"analysis process crashed ({e})")
+    with span('shard_merge'):
+        return merge(shard_results)
+
+
+def analyze_node(shards, track_condition, is_advanced, pool):
+    """Score the shard texts on an analyzer.js pool's workers at once and merge them"""
+    with ThreadPoolExecutor(max_workers=min(pool.size, len(shards))) as executor:
+        with span('shard_score'):
+            shard_results = list(executor.map(lambda text: pool.analyze(text, track_condition, is_advanced), shards))
+    with span('shard_merge'):
+        return merge(shard_results)
@@ -0,0 +1,362 @@
+"""
+Versioned JSON API for meeting results (/api/v1).
+
+A meeting's results only change when its predictions are rewritten
+(re-score, condition sweep, component backfill), and each of those bumps
+meetings.results_version. Every response's strong ETag is built from that
+version, the resource and the selected fields, so a client polling with
+If-None-Match costs one primary-key lookup and a 304. When the version has
+moved, the meeting's document is built once and kept, with its serialized
+and compressed bodies, in a small per-process LRU.
+
+Bodies over 1 KB are compressed with br (when the Brotli package is
+installed) or gzip, following Accept-Encoding; each encoding is its own
+representation with its own ETag.
+"""
+import gzip
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import Response, request
+
+from models import db, Meeting, Race, Horse, Prediction
+from scoring import component_tags
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+API_VERSION = 1
+# Bump when a document's shape changes, so every cached copy's ETag changes
+DOCUMENT_FORMAT = 1
+COMPRESS_MIN_BYTES = 1024
+
+RUNNER_FIELDS = (
+    'horse_id', 'position', 'horse_name', 'barrier', 'weight', 'jockey', 'trainer', 'form',
+    'score', 'true_odds', 'win_percent', 'performance_percent', 'base_percent',
+    'tags', 'components', 'condition_scores',
+)
+MEETING_LIST_FIELDS = (
+    'id', 'meeting_name', 'track', 'date', 'uploaded_at', 'track_condition',
+    'race_count', 'runner_count', 'results_version',
+)
+
+
+class APIError(Exception):
+    """An error answered as {'error': message} with the given status"""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+class _LRU:
+    """Thread-safe least-recently-used map"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_documents = _LRU(32)  # (meeting_id, (results_version, uploaded_at)) -> meeting document
+_bodies = _LRU(128)    # (tag, encoding) -> (response bytes, encoding used)
+
+
+def configure(max_meetings):
+    """Size the caches (API_CACHE_SIZE meetings, four bodies per meeting)"""
+    global _documents, _bodies
+    _documents = _LRU(max_meetings)
+    _bodies = _LRU(max_meetings * 4)
+
+
+def parse_fields(value, allowed=RUNNER_FIELDS):
+    """?fields=a,b,c as a tuple of allowed field names (None = all)"""
+    if not value:
+        return None
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise APIError(f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(allowed)}", 400)
+    return fields
+
+
+def build_meeting_document(meeting_id):
+    """A meeting with its races and runners, runners ranked by score as on the page"""
+    meeting = db.session.get(Meeting, meeting_id)
+    if meeting is None:
+        raise APIError("Meeting not found", 404)
+
+    score = db.func.coalesce(Prediction.score, 0)
+    rows = db.session.execute(
+        db.select(
+            Race.id.label('race_id'),
+            Race.race_number,
+            Race.distance,
+            Race.race_class,
+            Race.track_condition,
+            Horse.id.label('horse_id'),
+            Horse.horse_name,
+            Horse.barrier,
+            Horse.weight,
+            Horse.jockey,
+            Horse.trainer,
+            Horse.form,
+            score.label('score'),
+            Prediction.true_odds,
+            Prediction.win_percent,
+            Prediction.performance_percent,
+            Prediction.base_percent,
+            Prediction.components,
+            Prediction.condition_scores
+        )
+        .select_from(Race)
+        .outerjoin(Horse, Horse.race_id == Race.id)
+        .outerjoin(Prediction, Prediction.horse_id == Horse.id)
+        .where(Race.meeting_id == meeting_id)
+        .order_by(Race.race_number, Race.id, score.desc(), Horse.id)
+    )
+
+    races = []
+    current_race_id = None
+    for row in rows:
+        if row.race_id != current_race_id:
+            current_race_id = row.race_id
+            races.append({
+                'race_number': row.race_number,
+                'distance': row.distance,
+                'race_class': row.race_class,
+                'track_condition': row.track_condition,
+                'runners': []
+            })
+        if row.horse_id is None:
+            continue
+        runners = races[-1]['runners']
+        runners.append({
+            'horse_id': row.horse_id,
+            'position': len(runners) + 1,
+            'horse_name': row.horse_name,
+            'barrier': row.barrier,
+            'weight': row.weight,
+            'jockey': row.jockey,
+            'trainer': row.trainer,
+            'form': row.form,
+            'score': row.score,
+            'true_odds': row.true_odds,
+            'win_percent': row.win_percent,
+            'performance_percent': row.performance_percent,
+            'base_percent': row.base_percent,
+            'tags': component_tags(row.components),
+            'components': row.components,
+            'condition_scores': row.condition_scores
+        })
+
+    return {
+        'id': meeting.id,
+        'meeting_name': meeting.meeting_name,
+        'track': meeting.track,
+        'date': meeting.date.isoformat() if meeting.date else None,
+        'uploaded_at': meeting.uploaded_at.isoformat() if meeting.uploaded_at else None,
+        'track_condition': meeting.track_condition,
+        'race_count': meeting.race_count,
+        'runner_count': meeting.runner_count,
+        'results_version': meeting.results_version,
+        'races': races
+    }
+
+
+def _meeting_document(meeting_id, generation):
+    key = (meeting_id, generation)
+    document = _documents.get(key)
+    if document is None:
+        document = build_meeting_document(meeting_id)
+        # Not cached if a re-score committed between reading the version and building
+        if document['results_version'] == generation[0]:
+            _documents.put(key, document)
+    return document
+
+
+def _runner(runner, fields):
+    if fields is None:
+        return runner
+    return {field: runner[field] for field in fields}
+
+
+def _race(race, fields):
+    return dict(race, runners=[_runner(runner, fields) for runner in race['runners']])
+
+
+def _select(document, resource, fields):
+    """The part of a meeting document a resource asks for"""
+    kind, _, key = resource.partition(':')
+    if kind == 'meeting':
+        return dict(document, races=[_race(race, fields) for race in document['races']])
+    if kind == 'race':
+        for race in document['races']:
+            if race['race_number'] == int(key):
+                return dict(_race(race, fields), meeting_id=document['id'])
+        raise APIError("Race not found", 404)
+    for race in document['races']:
+        for runner in race['runners']:
+            if runner['horse_id'] == int(key):
+                return dict(_runner(runner, fields), meeting_id=document['id'], race_number=race['race_number'])
+    raise APIError("Runner not found", 404)
+
+
+def negotiate_encoding():
+    """The best content coding the client accepts: 'br', 'gzip' or None"""
+    accepted = {}
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            accepted[coding.strip().lower()] = quality
+    for coding in (('br', 'gzip') if brotli is not None else ('gzip',)):
+        if accepted.get(coding, accepted.get('*', 0)) > 0:
+            return coding
+    return None
+
+
+def _compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    # mtime=0 keeps the bytes, and so the strong ETag, stable
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+def _etag(tag, encoding):
+    return f'"v{API_VERSION}-{tag}' + (f'-{encoding}' if encoding else '') + '"'
+
+
+def _not_modified(tag):
+    """The client's matching ETag if If-None-Match names any representation of tag"""
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return None
+    variants = {_etag(tag, encoding) for encoding in (None, 'gzip', 'br')}
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]  # If-None-Match compares weakly
+        if candidate == '*' or candidate in variants:
+            return candidate if candidate != '*' else _etag(tag, None)
+    return None
+
+
+def _response(tag, build_body):
+    """304 or the (possibly compressed, cached) body for a representation tag"""
+    headers = {'Vary': 'Accept-Encoding', 'Cache-Control': 'private, no-cache'}
+    matched = _not_modified(tag)
+    if matched:
+        return Response(status=304, headers=dict(headers, ETag=matched))
+
+    encoding = negotiate_encoding()
+    cached = _bodies.get((tag, encoding))
+    if cached is None:
+        body = build_body()
+        if encoding and len(body) >= COMPRESS_MIN_BYTES:
+            cached = (_compress(body, encoding), encoding)
+        else:
+            cached = (body, None)
+        _bodies.put((tag, encoding), cached)
+
+    body, used = cached
+    headers['ETag'] = _etag(tag, used)
+    if used:
+        headers['Content-Encoding'] = used
+    return Response(body, mimetype='application/json', headers=headers)
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+
+def error_response(error):
+    return Response(_dumps({'error': str(error)}), status=error.status, mimetype='application/json')
+
+
+def meeting_resource_response(meeting_id, resource):
+    """
+    A meeting ('meeting'), one of its races ('race:<number>') or runners
+    ('runner:<horse id>'), honouring ?fields= for runner fields
+    """
+    try:
+        fields = parse_fields(request.args.get('fields'))
+        current = db.session.execute(
+            db.select(Meeting.results_version, Meeting.uploaded_at).where(Meeting.id == meeting_id)
+        ).one_or_none()
+        if current is None:
+            raise APIError("Meeting not found", 404)
+
+        # uploaded_at tells apart a new meeting given a deleted one's id (SQLite reuses them)
+        generation = (current.results_version, current.uploaded_at)
+        digest = hashlib.sha256(
+            f"{DOCUMENT_FORMAT}|{current.uploaded_at}|{resource}|{','.join(fields or ())}".encode()
+        ).hexdigest()[:12]
+        tag = f"{meeting_id}.{current.results_version}.{digest}"
+        return _response(tag, lambda: _dumps(
+            _select(_meeting_document(meeting_id, generation), resource, fields)
+        ))
+    except APIError as e:
+        return error_response(e)
+
+
+def meeting_list_response(limit, before=None):
+    """
+    Meetings newest first, limit at a time; 'next' is the ?before= cursor
+    for the following page. The ETag is a hash of the page itself
+    """
+    try:
+        fields = parse_fields(request.args.get('fields'), MEETING_LIST_FIELDS)
+        query = Meeting.query
+        if before is not None:
+            query = query.filter(Meeting.id < before)
+        meetings = query.order_by(Meeting.id.desc()).limit(limit + 1).all()
+
+        items = []
+        for meeting in meetings[:limit]:
+            item = {
+                'id': meeting.id,
+                'meeting_name': meeting.meeting_name,
+                'track': meeting.track,
+                'date': meeting.date.isoformat() if meeting.date else None,
+                'uploaded_at': meeting.uploaded_at.isoformat() if meeting.uploaded_at else None,
+                'track_condition': meeting.track_condition,
+                'race_count': meeting.race_count,
+                'runner_count': meeting.runner_count,
+                'results_version': meeting.results_version,
+            }
+            items.append({field: item[field] for field in fields} if fields else item)
+        body = _dumps({
+            'meetings': items,
+            'next': meetings[limit - 1].id if len(meetings) > limit else None
+        })
+        tag = 'list.' + hashlib.sha256(body).hexdigest()[:16]
+        return _response(tag, lambda: body)
+    except APIError as e:
+        return error_response(e)
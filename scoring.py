@@ -0,0 +1,1696 @@
+"""
+In-process Python scoring engine.
+
+A port of analyzeCSV and its helpers from analyzer.js that produces the same
+scores, odds and notes without spawning Node. Select it with
+ANALYZER_ENGINE=python; `flask check-analyzer-parity` compares both engines
+over real CSVs.
+
+Parity notes:
+- Number formatting, rounding and parsing follow JavaScript semantics
+  (toFixed, Math.round, parseInt/parseFloat/Number) via the _js_* helpers.
+- Sums are accumulated left to right like Array.reduce, never pairwise, so
+  floating point results match to the last bit.
+- Object.keys() iteration order (integer-like keys first) is reproduced
+  wherever it can change an outcome.
+- Dates are computed in UTC, which matches Node running with TZ=UTC.
+"""
+import re
+import math
+from functools import lru_cache
+from decimal import Decimal, ROUND_HALF_UP
+from functools import cmp_to_key
+
+import numpy as np
+
+# Mapping of equivalent jockey names
+JOCKEY_MAPPING = {
+    "J B Mc Donald": "James McDonald",
+    "A Bullock": "Aaron Bullock",
+    "W Pike": "William Pike",
+    "N Rawiller": "Nash Rawiller",
+    "J Part": "Josh Parr",
+    "J R Collett": "Jason Collett",
+    "M Zahra": "Mark Zahra",
+    "B Shinn": "Blake Shinn",
+    "C Williams": "Craig Williams",
+    "E Brown": "Ethan Brown",
+    "D Lane": "Damian Lane",
+    "B Melham": "Ben Melham",
+}
+
+# Mapping of equivalent trainer names
+TRAINER_MAPPING = {
+    'C Maher': 'Ciaron Maher',
+    'C J Waller': 'Chris Waller',
+    'Ben Will & Jd Hayes': 'Ben, Will & J.D. Hayes',
+    'G Waterhouse & A Bott': 'Gai Waterhouse & Adrian Bott',
+    'G M Begg': 'Grahame Begg',
+    'P Stokes': 'Phillip Stokes',
+    'M M Laurie': 'Matthew Laurie'
+}
+
+TEN_POINT_JOCKEYS = [
+    'Blake Shinn', 'James McDonald', 'Jason Collett', 'Mark Zahra',
+    'Craig Williams', 'Nash Rawiller', 'Tim Clark'
+]
+FIVE_POINT_JOCKEYS = [
+    'Aaron Bullock', 'Damian Lane', 'Ethan Brown', 'Ben Melham', 'Jamie Melham',
+    'Josh Parr', 'William Pike', 'Zac Lloyd', 'J Kah'
+]
+NEGATIVE_JOCKEYS = ['Kerrin McEvoy']
+
+FIVE_POINT_TRAINERS = [
+    'Ciaron Maher', 'Chris Waller', 'Ben, Will & J.D. Hayes', 'Annabel & Rob Archibald',
+    'Bjorn Baker', 'Gai Waterhouse & Adrian Bott', 'Grahame Begg', 'Matthew Laurie',
+    'Phillip Stokes'
+]
+
+NAN = float('nan')
+
+
+# ----- JavaScript semantics -----
+_JS_WHITESPACE = (
+    '\t\n\x0b\x0c\r \xa0        '
+    '        　﻿'
+)
+_NUMBER_RE = re.compile(r'[+-]?(?:\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)\Z', re.ASCII)
+_FLOAT_PREFIX_RE = re.compile(r'[+-]?(?:Infinity|\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)', re.ASCII)
+_INT_PREFIX_RE = re.compile(r'([+-]?)(?:0[xX]([0-9a-fA-F]+)|(\d+))', re.ASCII)
+
+
+def _js_trim(value):
+    return value.strip(_JS_WHITESPACE)
+
+
+def _js_str(value):
+    """String(value) for the values that appear in notes"""
+    if value is None:
+        return 'undefined'
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return 'Infinity' if value > 0 else '-Infinity'
+    if value == int(value) and abs(value) < 1e21:
+        return str(int(value))
+    text = repr(float(value))
+    if 'e' in text:
+        mantissa, exponent = text.split('e')
+        text = f"{mantissa.rstrip('0').rstrip('.')}e{'+' if int(exponent) > 0 else '-'}{abs(int(exponent))}"
+    return text
+
+
+def _js_typeof(value):
+    if value is None:
+        return 'undefined'
+    if isinstance(value, str):
+        return 'string'
+    if isinstance(value, bool):
+        return 'boolean'
+    if isinstance(value, (int, float)):
+        return 'number'
+    return 'object'
+
+
+def _to_fixed(value, digits):
+    """Number.prototype.toFixed - rounds exact binary values half away from zero"""
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value) or abs(value) >= 1e21:
+        return _js_str(value)
+    if value == 0:
+        value = 0.0  # (-0).toFixed() has no sign
+    quantum = Decimal(1).scaleb(-digits)
+    return str(Decimal(value).quantize(quantum, rounding=ROUND_HALF_UP))
+
+
+def _js_round(value):
+    """Math.round - ties go towards +Infinity"""
+    if math.isnan(value) or math.isinf(value):
+        return value
+    floor = math.floor(value)
+    return floor + 1 if value - floor >= 0.5 else floor
+
+
+def _parse_float(value):
+    """parseFloat"""
+    match = _FLOAT_PREFIX_RE.match(_js_trim(_js_str(value)))
+    if not match:
+        return NAN
+    text = match.group(0)
+    if text.endswith('Infinity'):
+        return -math.inf if text.startswith('-') else math.inf
+    return float(text)
+
+
+def _parse_int(value):
+    """parseInt without a radix"""
+    match = _INT_PREFIX_RE.match(_js_trim(_js_str(value)))
+    if not match:
+        return NAN
+    sign, hex_digits, digits = match.groups()
+    number = int(hex_digits, 16) if hex_digits is not None else int(digits)
+    return -number if sign == '-' else number
+
+
+def _js_number(value):
+    """Number(string)"""
+    text = _js_trim(value)
+    if text == '':
+        return 0
+    if _NUMBER_RE.match(text):
+        return float(text)
+    if text in ('Infinity', '+Infinity'):
+        return math.inf
+    if text == '-Infinity':
+        return -math.inf
+    prefixed = re.match(r'0([xXoObB])([0-9a-fA-F]+)\Z', text)
+    if prefixed:
+        base = {'x': 16, 'o': 8, 'b': 2}[prefixed.group(1).lower()]
+        try:
+            return int(prefixed.group(2), base)
+        except ValueError:
+            return NAN
+    return NAN
+
+
+def _is_nan(value):
+    return isinstance(value, float) and math.isnan(value)
+
+
+def _js_keys(keys):
+    """Object.keys() order: array-index keys ascending, then insertion order"""
+    index_keys, other_keys = [], []
+    for key in keys:
+        if key.isascii() and key.isdigit() and (key == '0' or key[0] != '0') and int(key) < 4294967295:
+            index_keys.append(key)
+        else:
+            other_keys.append(key)
+    index_keys.sort(key=int)
+    return index_keys + other_keys
+
+
+def _js_sort(items, compare):
+    """
+    Array.prototype.sort as V8 runs it on short arrays (TimSort's binary
+    insertion phase), so inconsistent comparators order items identically
+    """
+    n = len(items)
+    if n < 2:
+        return items
+    if n >= 64:
+        items.sort(key=cmp_to_key(compare))
+        return items
+
+    def order(a, b):
+        result = compare(a, b)
+        return 0 if _is_nan(result) else result
+
+    run = 2
+    if order(items[1], items[0]) < 0:
+        while run < n and order(items[run], items[run - 1]) < 0:
+            run += 1
+        items[:run] = items[:run][::-1]
+    else:
+        while run < n and not order(items[run], items[run - 1]) < 0:
+            run += 1
+
+    for start in range(run, n):
+        pivot = items[start]
+        left, right = 0, start
+        while left < right:
+            mid = (left + right) >> 1
+            if order(pivot, items[mid]) < 0:
+                right = mid
+            else:
+                left = mid + 1
+        items[left + 1:start + 1] = items[left:start]
+        items[left] = pivot
+    return items
+
+
+_MS_PER_DAY = 86400000
+
+
+def _days_from_civil(year, month, day):
+    """Days since 1970-01-01 for a proleptic Gregorian date (month 1-12)"""
+    year -= month <= 2
+    era = (year if year >= 0 else year - 399) // 400
+    yoe = year - era * 400
+    doy = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def _make_date(year, month, day):
+    """new Date(year, month, day) as a millisecond value (month is 0-based)"""
+    if any(_is_nan(part) for part in (year, month, day)):
+        return NAN
+    if 0 <= year <= 99:
+        year += 1900
+    year += month // 12
+    month = month % 12
+    time = (_days_from_civil(year, month + 1, 1) + day - 1) * _MS_PER_DAY
+    return time if abs(time) <= 8.64e15 else NAN
+
+
+def _sum(values):
+    """Array.reduce((a, b) => a + b, 0)"""
+    total = 0
+    for value in values:
+        total += value
+    return total
+
+
+# ----- CSV parsing -----
+def parse_csv_line(line):
+    """Split one CSV line, toggling on double quotes like parseCSVLine"""
+    if '"' not in line:
+        return line.split(',')
+    # Between quotes is every other piece of a split on '"': its commas are kept
+    result = ['']
+    for i, piece in enumerate(line.split('"')):
+        if i % 2:
+            result[-1] += piece
+        else:
+            fields = piece.split(',')
+            result[-1] += fields[0]
+            result.extend(fields[1:])
+    return result
+
+
+def _trimmed_lines(lines):
+    """
+    Yield lines as if the text they came from had been trimmed first,
+    without joining it: blank lines at either end are dropped and the
+    first and last remaining lines are stripped on their outer side
+    """
+    lines = iter(lines)
+    for line in lines:
+        if _js_trim(line):
+            previous = line.lstrip(_JS_WHITESPACE)
+            break
+    else:
+        yield ''
+        return
+
+    blank_run = []
+    for line in lines:
+        if not _js_trim(line):
+            blank_run.append(line)
+            continue
+        yield previous
+        yield from blank_run
+        blank_run = []
+        previous = line
+    yield previous.rstrip(_JS_WHITESPACE)
+
+
+def parse_csv(csv_data):
+    """
+    Parse CSV text, or an iterable of its lines, into row dicts keyed by
+    lower-cased header
+    """
+    if isinstance(csv_data, str):
+        lines = iter(_js_trim(csv_data).split('\n'))
+    else:
+        lines = _trimmed_lines(csv_data)
+    headers = [_js_trim(header).lower() for header in parse_csv_line(next(lines))]
+    data = []
+    for line in lines:
+        values = parse_csv_line(line)
+        if len(values) == len(headers):
+            row = {}
+            for header, value in zip(headers, values):
+                row[header] = _js_trim(value)
+            data.append(row)
+    return data
+
+
+def parse_date(date_str):
+    """Parse DD/MM/YYYY (or DD/MM/YY) strings like parseDate in analyzer.js"""
+    if not date_str:
+        return 0
+    parts = date_str.split(' ')[0].split('/')
+    if len(parts) != 3:
+        return 0
+    day = _parse_int(parts[0])
+    month = _parse_int(parts[1])
+    year = _parse_int(parts[2])
+    if not _is_nan(month):
+        month -= 1
+    if not _is_nan(year) and year < 100:
+        year += 2000 if year <= 50 else 1900
+    return _make_date(year, month, day)
+
+
+# ----- Per-horse scoring -----
+def check_weight(weight, claim):
+    """Weight scoring is handled by calculate_weight_scores against the race average"""
+    return 0, ''
+
+
+def check_last10_runs(last10):
+    last10 = _js_trim(str(last10 or ''))
+
+    if len(last10) > 99:
+        raise Exception("String must be 99 characters or less.")
+
+    add_score = 0
+    count = 0
+    note2 = ''
+    note = ''
+    has_win = '1' in last10
+
+    for char in reversed(last10):
+        if char != 'X' and char != 'x' and count < 5:
+            count += 1
+            if char == '1':
+                add_score += 10
+                note2 += ' 1st'
+            if char == '2':
+                add_score += 5
+                note2 += ' 2nd'
+            if char == '3':
+                add_score += 2
+                note2 += ' 3rd'
+
+    # Format the note before applying the no-wins penalty
+    if add_score > 0:
+        note = '+' + _js_str(add_score) + '.0 : Ran places:' + note2 + '\n'
+
+    if not has_win and len(last10) > 0:
+        add_score -= 15
+        note += '-15.0 : No wins in last 10 starts - non-winner\n'
+
+    return add_score, note
+
+
+def _normalize_name(name, mapping):
+    if not name or not isinstance(name, str):
+        return name or ''
+    name = _js_trim(name)
+    for key, value in mapping.items():
+        if name.startswith(key):
+            return name.replace(key, value, 1)
+    return name
+
+
+def normalize_jockey_name(jockey_name):
+    return _normalize_name(jockey_name, JOCKEY_MAPPING)
+
+
+def normalize_trainer_name(trainer_name):
+    return _normalize_name(trainer_name, TRAINER_MAPPING)
+
+
+def check_jockeys(jockey_name):
+    add_score = 0
+    note = ''
+    jockey_name = normalize_jockey_name(jockey_name)
+
+    if jockey_name in TEN_POINT_JOCKEYS:
+        add_score += 10
+        note += '+10.0 : Love the Jockey\n'
+    if jockey_name in FIVE_POINT_JOCKEYS:
+        add_score += 5
+        note += '+ 5.0 : Like the Jockey\n'
+    if jockey_name in NEGATIVE_JOCKEYS:
+        add_score -= 5
+        note += '- 5.0 : Kerrin Useless McEvoy\n'
+    return add_score, note
+
+
+def check_trainers(trainer_name):
+    add_score = 0
+    note = ''
+    trainer_name = normalize_trainer_name(trainer_name)
+
+    if trainer_name in FIVE_POINT_TRAINERS:
+        add_score += 5
+        note += '+ 5.0 : Like the Trainer\n'
+    return add_score, note
+
+
+# Tables for the four "runs:wins-seconds-thirds" record checks. Each tier is
+# (threshold, points, label); confidence tiers are (min runs, multiplier,
+# label, run/runs wording).
+_RECORD_FORM_SPECS = {
+    'track': {
+        'label': 'Track form',
+        'total': 'track',
+        'win': [(0.51, 6, 'Exceptional'), (0.36, 5, 'Strong'), (0.26, 4, 'Good'), (0.16, 2, 'Moderate'), (0.01, 1, 'Low')],
+        'podium': [(0.85, 6, 'Elite'), (0.70, 5, 'Excellent'), (0.55, 4, 'Strong'), (0.40, 3, 'Good'), (0.25, 1, 'Moderate')],
+        'undefeated': [10, 9, 7, 5],
+        'confidence': [(7, 1.0, 'High', 'runs'), (4, 0.85, 'Good', 'runs'), (2, 0.7, 'Medium', 'run'), (None, 0.6, 'Low', 'run')],
+        'penalty': 5,
+    },
+    'track_distance': {
+        'label': 'Track+Distance form',
+        'total': 'track+distance',
+        'win': [(0.51, 8, 'Exceptional'), (0.36, 7, 'Strong'), (0.26, 5, 'Good'), (0.16, 3, 'Moderate'), (0.01, 1, 'Low')],
+        'podium': [(0.85, 8, 'Elite'), (0.70, 7, 'Excellent'), (0.55, 6, 'Strong'), (0.40, 4, 'Good'), (0.25, 2, 'Moderate')],
+        'undefeated': [12, 11, 9, 6],
+        'confidence': [(5, 1.0, 'High', 'runs'), (3, 0.8, 'Good', 'runs'), (2, 0.6, 'Medium', 'runs'), (None, 0.5, 'Low', 'run')],
+        'penalty': 6,
+    },
+    'distance': {
+        'label': 'Distance form',
+        'total': 'distance',
+        'win': [(0.51, 8, 'Exceptional'), (0.36, 7, 'Strong'), (0.26, 5, 'Good'), (0.16, 3, 'Moderate'), (0.01, 1, 'Low')],
+        'podium': [(0.85, 8, 'Elite'), (0.70, 7, 'Excellent'), (0.55, 6, 'Strong'), (0.40, 4, 'Good'), (0.25, 2, 'Moderate')],
+        'undefeated': [12, 11, 9, 6],
+        'confidence': [(10, 1.0, 'High', 'runs'), (6, 0.9, 'Good', 'runs'), (3, 0.75, 'Medium', 'runs'), (None, 0.6, 'Low', 'runs')],
+        'penalty': 6,
+    },
+    'track_condition': {
+        'label': 'Track condition form',
+        'total': 'track condition',
+        'win': [(0.51, 12, 'Exceptional'), (0.36, 10, 'Strong'), (0.26, 8, 'Good'), (0.16, 5, 'Moderate'), (0.01, 2, 'Low')],
+        'podium': [(0.85, 12, 'Elite'), (0.70, 10, 'Excellent'), (0.55, 9, 'Strong'), (0.40, 6, 'Good'), (0.25, 3, 'Moderate')],
+        'undefeated': [15, 14, 12, 8],
+        'penalty': 8,
+    },
+}
+
+TRACK_CONDITIONS = ('firm', 'good', 'soft', 'heavy', 'synthetic')
+
+# Confidence tiers for the track condition check depend on the condition
+_CONDITION_CONFIDENCE = {
+    'good': [(16, 1.0, 'High', 'runs'), (11, 0.95, 'Good', 'runs'), (6, 0.85, 'Medium', 'runs'), (None, 0.7, 'Low', 'runs')],
+    'soft': [(11, 1.0, 'High', 'runs'), (7, 0.95, 'Good', 'runs'), (4, 0.85, 'Medium', 'runs'), (None, 0.7, 'Low', 'runs')],
+    'heavy': [(7, 1.0, 'High', 'runs'), (5, 0.9, 'Good', 'runs'), (3, 0.8, 'Medium', 'runs'), (None, 0.6, 'Low', 'runs')],
+    'firm': [(5, 1.0, 'High', 'runs'), (3, 0.85, 'Medium', 'runs'), (2, 0.7, 'Low', 'runs'), (None, 0.5, 'Very low', 'run')],
+    'synthetic': [(7, 1.0, 'High', 'runs'), (4, 0.85, 'Medium', 'runs'), (2, 0.7, 'Low', 'runs'), (None, 0.5, 'Very low', 'run')],
+}
+
+
+@lru_cache(maxsize=65536)
+def parse_record(racing_form):
+    """
+    A record string such as '12:3-2-1' as (runs, wins, seconds, thirds), or
+    None when it doesn't have four parts
+    Records repeat across runners and across the condition sweeps, so each
+    distinct string is split once
+    """
+    numbers = tuple(_js_number(part) for part in re.split(r'[:\-]', racing_form))
+    return numbers if len(numbers) == 4 else None
+
+
+def _check_record_form(racing_form, spec, where, no_runs, confidence):
+    """Shared body of the track / distance / track+distance / condition checks"""
+    add_score = 0
+    note = ''
+
+    if not isinstance(racing_form, str):
+        note += spec['label'] + ' not string. Received type: ' + _js_typeof(racing_form) + '\n'
+        return add_score, note
+
+    numbers = parse_record(racing_form)
+
+    if numbers is None:
+        note += spec['label'] + ' incorrect format. Received: ' + racing_form + '\n'
+        return add_score, note
+
+    runs, wins, seconds, thirds = numbers
+    podiums = wins + seconds + thirds
+
+    if podiums > runs:
+        note += 'More podiums than runs?? Received: ' + racing_form + '\n'
+        return add_score, note
+
+    if runs == 0:
+        note += '+ 0.0 : No runs ' + no_runs + '\n'
+        return add_score, note
+
+    win_rate = wins / runs if not _is_nan(runs) else NAN
+    podium_rate = podiums / runs if not _is_nan(runs) else NAN
+
+    win_score = 0
+    for threshold, points, label in spec['win']:
+        if win_rate >= threshold:
+            win_score = points
+            note += '+ ' + _js_str(points) + '.0 : ' + label + ' win rate (' + _to_fixed(win_rate * 100, 0) + '%) ' + where + '\n'
+            break
+    else:
+        note += '+ 0.0 : No wins ' + where + '\n'
+
+    podium_score = 0
+    for threshold, points, label in spec['podium']:
+        if podium_rate >= threshold:
+            podium_score = points
+            note += '+ ' + _js_str(points) + '.0 : ' + label + ' podium rate (' + _to_fixed(podium_rate * 100, 0) + '%) ' + where + '\n'
+            break
+    else:
+        note += '+ 0.0 : Poor podium rate (' + _to_fixed(podium_rate * 100, 0) + '%) ' + where + '\n'
+
+    undefeated_bonus = 0
+    if wins == runs and runs >= 2:
+        five, four, three, two = spec['undefeated']
+        if runs >= 5:
+            undefeated_bonus, tag = five, '5+ runs'
+        elif runs >= 4:
+            undefeated_bonus, tag = four, '4 runs'
+        elif runs >= 3:
+            undefeated_bonus, tag = three, '3 runs'
+        else:
+            undefeated_bonus, tag = two, '2 runs'
+        note += '+ ' + _js_str(undefeated_bonus) + '.0 : UNDEFEATED in ' + _js_str(runs) + ' runs ' + where + '! (' + tag + ')\n'
+
+    subtotal = win_score + podium_score + undefeated_bonus
+
+    confidence_multiplier = 1.0
+    confidence_note = ''
+    for min_runs, multiplier, label, run_word in confidence or []:
+        if min_runs is None or runs >= min_runs:
+            confidence_multiplier = multiplier
+            confidence_note = ' [' + label + ' confidence: ' + _js_str(runs) + ' ' + run_word + ']'
+            break
+
+    add_score = subtotal * confidence_multiplier
+
+    if runs >= 5 and wins == 0 and podium_rate < 0.20:
+        add_score -= spec['penalty']
+        note += '- ' + _js_str(spec['penalty']) + '.0 : Poor performance ' + where + ' (' + _js_str(runs) + ' runs, 0 wins, <20% podium)\n'
+
+    note += '= ' + _to_fixed(add_score, 1) + ' : Total ' + spec['total'] + ' score' + confidence_note + '\n'
+
+    return add_score, note
+
+
+def check_track_condition_form(racing_form, track_condition):
+    spec = _RECORD_FORM_SPECS['track_condition']
+    return _check_record_form(
+        racing_form, spec,
+        where='on ' + _js_str(track_condition),
+        no_runs='on ' + _js_str(track_condition) + ' track',
+        confidence=_CONDITION_CONFIDENCE.get(track_condition)
+    )
+
+
+def check_distance_form(racing_form):
+    spec = _RECORD_FORM_SPECS['distance']
+    return _check_record_form(racing_form, spec, 'at this distance', 'at this distance', spec['confidence'])
+
+
+def check_track_form(racing_form):
+    spec = _RECORD_FORM_SPECS['track']
+    return _check_record_form(racing_form, spec, 'at this track', 'at this track', spec['confidence'])
+
+
+def check_track_distance_form(racing_form):
+    spec = _RECORD_FORM_SPECS['track_distance']
+    return _check_record_form(racing_form, spec, 'at this track+distance', 'at this track+distance', spec['confidence'])
+
+
+def check_last_distance(horse_row):
+    dist = _parse_float(horse_row.get('distance'))
+    prev_dist = _parse_float(horse_row.get('form distance'))
+    add_score = 0
+    note = ''
+    if not _is_nan(prev_dist) and prev_dist > 0:
+        if dist > prev_dist:
+            add_score += 1
+            note += '+ 1.0 : Longer dist than previous\n'
+        if dist < prev_dist:
+            add_score -= 1
+            note += '- 1.0 : Shorter dist than previous\n'
+    return add_score, note
+
+
+def check_days_since_last_run(meeting_date, form_meeting_date):
+    if not meeting_date or not form_meeting_date:
+        return 0, ''
+
+    def parse(date_str):
+        parts = date_str.split(' ')[0].split('/')
+        if len(parts) != 3:
+            return None
+        day = _parse_int(parts[0])
+        month = _parse_int(parts[1])
+        year = _parse_int(parts[2])
+        if not _is_nan(month):
+            month -= 1
+        if not _is_nan(year) and year < 100:
+            year += 2000 if year <= 50 else 1900
+        return _make_date(year, month, day)
+
+    today_date = parse(meeting_date)
+    last_run_date = parse(form_meeting_date)
+
+    if today_date is None or last_run_date is None:
+        return 0, ''
+    if _is_nan(today_date) or _is_nan(last_run_date):
+        return 0, ''
+
+    days = (today_date - last_run_date) // _MS_PER_DAY
+
+    if days >= 365:
+        return -30, f"-30.0 : Too fresh - {days} days since last run (over 1 year!)\n"
+    if days >= 250:
+        return -25, f"-25.0 : Too fresh - {days} days since last run\n"
+    if days >= 200:
+        return -20, f"-20.0 : Too fresh - {days} days since last run\n"
+    if days >= 150:
+        return -15, f"-15.0 : Too fresh - {days} days since last run\n"
+    if days <= 7:
+        return 15, f"+15.0 : Quick backup - only {days} days since last run (market underrates!)\n"
+    # 8-149 days is the sweet spot - no penalty or bonus
+    return 0, ''
+
+
+def check_margin(form_position, form_margin):
+    if not form_position or not form_margin:
+        return 0, ''
+
+    position = _parse_int(form_position)
+    margin = _parse_float(form_margin)
+
+    if _is_nan(position) or _is_nan(margin):
+        return 0, ''
+
+    m = _to_fixed(margin, 1)
+
+    # Winners
+    if position == 1:
+        if margin >= 5.0:
+            return 10, f"+10.0 : Dominant last start win by {m}L\n"
+        if margin >= 2.0:
+            return 7, f"+ 7.0 : Comfortable last start win by {m}L\n"
+        if margin >= 0.5:
+            return 5, f"+ 5.0 : Narrow last start win by {m}L\n"
+        return 3, f"+ 3.0 : Photo finish last start win by {m}L\n"
+
+    # Place getters
+    if position == 2 or position == 3:
+        place = f"{position}{'nd' if position == 2 else 'rd'}"
+        if margin <= 1.0:
+            return 5, f"+ 5.0 : Narrow loss ({place}) by {m}L - very competitive\n"
+        if margin <= 2.0:
+            return 3, f"+ 3.0 : Close loss ({place}) by {m}L\n"
+        if margin <= 3.5:
+            return 0, ''
+        return -5, f"- 5.0 : Beaten badly ({place}) by {m}L\n"
+
+    # Midfield or back
+    if position >= 4:
+        if margin <= 3.0:
+            return 0, ''
+        if margin <= 6.0:
+            return -3, f"- 3.0 : Beaten clearly ({position}th) by {m}L\n"
+        if margin <= 10.0:
+            return -7, f"- 7.0 : Well beaten ({position}th) by {m}L\n"
+        return -15, f"-15.0 : Demolished ({position}th) by {m}L - not competitive\n"
+
+    return 0, ''
+
+
+# ----- Class scoring (0-130 scale) -----
+def parse_class_type(class_string):
+    if not class_string:
+        return None
+
+    s = _js_trim(class_string)
+
+    if re.search(r'Group\s*[123]', s, re.I):
+        level = int(re.search(r'[123]', s).group(0))
+        return {'type': 'Group', 'level': level}
+    if re.search(r'Listed', s, re.I):
+        return {'type': 'Listed', 'level': None}
+
+    for class_type, pattern in (
+        ('Benchmark', r'(?:Benchmark|Bench\.?|BM)\s*([0-9]+)'),
+        ('Class', r'(?:Class|Cls)\s*([0-9]+)'),
+        ('Restricted', r'Rest\.?\s*([0-9]+)'),
+        ('Rating', r'(?:RS|Rating)\s*(?:0-)?([0-9]+)'),
+    ):
+        match = re.search(pattern, s, re.I)
+        if match:
+            return {'type': class_type, 'level': int(match.group(1))}
+
+    for class_type, pattern in (
+        ('Maiden', r'Maiden|Mdn'),
+        ('Open', r'Open'),
+        ('Highway', r'Highway'),
+        ('Special', r'Special|Spec|Nov'),
+    ):
+        if re.search(pattern, s, re.I):
+            return {'type': class_type, 'level': None}
+
+    return {'type': 'Unknown', 'level': None}
+
+
+def extract_first_prize(prize_string):
+    if not prize_string:
+        return None
+    match = re.search(r'1st\s+\$([0-9,]+)', prize_string, re.I)
+    if match:
+        return _parse_int(match.group(1).replace(',', ''))
+    return None
+
+
+_CLASS_FALLBACKS = {1: 40, 2: 55, 3: 65, 4: 75, 5: 85, 6: 92}
+
+# (lower bound, base score, band width, band points) for prize money bands
+_PRIZE_BANDS = [
+    (1000000, 125, 1000000, 5),
+    (600000, 120, 400000, 5),
+    (400000, 115, 200000, 5),
+    (250000, 110, 150000, 5),
+    (150000, 105, 100000, 5),
+    (100000, 100, 50000, 5),
+    (80000, 95, 20000, 5),
+    (60000, 88, 20000, 7),
+    (45000, 80, 15000, 8),
+    (35000, 72, 10000, 8),
+    (25000, 64, 10000, 8),
+    (18000, 56, 7000, 8),
+    (12000, 48, 6000, 8),
+    (8000, 40, 4000, 8),
+    (5000, 32, 3000, 8),
+]
+
+
+def calculate_class_score(class_string, prize_string):
+    parsed = parse_class_type(class_string)
+    if not parsed:
+        return 0
+
+    class_type, level = parsed['type'], parsed['level']
+
+    if class_type == 'Benchmark' and level is not None:
+        return min(100, max(1, level))
+    if class_type == 'Group':
+        return {1: 130, 2: 122, 3: 115}[level]
+    if class_type == 'Listed':
+        return 108
+
+    prize = extract_first_prize(prize_string)
+    if not prize or _is_nan(prize):
+        # Fallback estimates if no prize money available
+        if class_type == 'Class' and level in _CLASS_FALLBACKS:
+            return _CLASS_FALLBACKS[level]
+        if class_type == 'Maiden':
+            return 50
+        if class_type == 'Open':
+            return 95
+        if class_type == 'Restricted':
+            return level - 10 if level else 50
+        if class_type == 'Rating':
+            return min(100, level - 5) if level else 80
+        if class_type == 'Highway':
+            return 70
+        if class_type == 'Special':
+            return 45
+        return 50
+
+    if prize >= 2000000:
+        return 130
+    for lower, base, width, points in _PRIZE_BANDS:
+        if prize >= lower:
+            return base + ((prize - lower) / width) * points
+    return 25 + (prize / 5000) * 7
+
+
+def compare_classes(new_class, form_class, new_prizemoney, form_prizemoney):
+    today_score = calculate_class_score(new_class, new_prizemoney)
+    last_score = calculate_class_score(form_class, form_prizemoney)
+    score_diff = today_score - last_score
+
+    add_score = 0
+    note = ''
+
+    if score_diff > 0:
+        # Stepping UP in class (harder race)
+        add_score = score_diff * -1.0
+        note += (_to_fixed(add_score, 1) + ': Stepping UP ' + _to_fixed(score_diff, 1) + ' class points; "'
+                 + _js_str(form_class) + '" (' + _to_fixed(last_score, 1) + ') to "' + _js_str(new_class)
+                 + '" (' + _to_fixed(today_score, 1) + ')\n')
+    elif score_diff < 0:
+        # Stepping DOWN in class (easier race)
+        add_score = abs(score_diff) * 1.0
+        note += ('+ ' + _to_fixed(add_score, 1) + ': Stepping DOWN ' + _to_fixed(abs(score_diff), 1) + ' class points; "'
+                 + _js_str(form_class) + '" (' + _to_fixed(last_score, 1) + ') to "' + _js_str(new_class)
+                 + '" (' + _to_fixed(today_score, 1) + ')\n')
+    else:
+        note += ('0.0: Same class level; "' + _js_str(form_class) + '" to "' + _js_str(new_class)
+                 + '" (both ' + _to_fixed(today_score, 1) + ')\n')
+
+    return add_score, note
+
+
+# ----- Form price scoring (+50 to -50 points) -----
+FORM_PRICE_SCORES = {
+    1.01: 50, 1.02: 50, 1.03: 50, 1.04: 49, 1.05: 49, 1.06: 49, 1.07: 49, 1.08: 48, 1.09: 48, 1.1: 48,
+    1.11: 48, 1.12: 47, 1.13: 47, 1.14: 47, 1.15: 47, 1.16: 46, 1.17: 46, 1.18: 46, 1.19: 46, 1.2: 45,
+    1.21: 45, 1.22: 45, 1.23: 45, 1.24: 44, 1.25: 44, 1.26: 44, 1.27: 44, 1.28: 43, 1.29: 43, 1.3: 43,
+    1.31: 43, 1.32: 42, 1.33: 42, 1.34: 42, 1.35: 42, 1.36: 41, 1.37: 41, 1.38: 41, 1.39: 41, 1.4: 40,
+    1.41: 40, 1.42: 40, 1.43: 40, 1.44: 39, 1.45: 39, 1.46: 39, 1.47: 39, 1.48: 38, 1.49: 38, 1.5: 38,
+    1.51: 38, 1.52: 37, 1.53: 37, 1.54: 37, 1.55: 37, 1.56: 36, 1.57: 36, 1.58: 36, 1.59: 36, 1.6: 35,
+    1.61: 35, 1.62: 35, 1.63: 35, 1.64: 34, 1.65: 34, 1.66: 34, 1.67: 34, 1.68: 33, 1.69: 33, 1.7: 33,
+    1.71: 33, 1.72: 32, 1.73: 32, 1.74: 32, 1.75: 32, 1.76: 31, 1.77: 31, 1.78: 31, 1.79: 31, 1.8: 30,
+    1.81: 30, 1.82: 30, 1.83: 30, 1.84: 29, 1.85: 29, 1.86: 29, 1.87: 29, 1.88: 28, 1.89: 28, 1.9: 28,
+    1.91: 28, 1.92: 27, 1.93: 27, 1.94: 27, 1.95: 27, 1.96: 26, 1.97: 26, 1.98: 26, 1.99: 26, 2: 25,
+    2.02: 25, 2.04: 24, 2.06: 24, 2.08: 24, 2.1: 23, 2.12: 23, 2.14: 23, 2.16: 22, 2.18: 22, 2.2: 22,
+    2.22: 21, 2.24: 21, 2.26: 21, 2.28: 20, 2.3: 20, 2.32: 20, 2.34: 19, 2.36: 19, 2.38: 19, 2.4: 18,
+    2.42: 18, 2.44: 18, 2.46: 17, 2.48: 17, 2.5: 17, 2.52: 16, 2.54: 16, 2.56: 16, 2.58: 15, 2.6: 15,
+    2.62: 15, 2.64: 14, 2.66: 14, 2.68: 14, 2.7: 13, 2.72: 13, 2.74: 13, 2.76: 12, 2.78: 12, 2.8: 12,
+    2.82: 11, 2.84: 11, 2.86: 11, 2.88: 10, 2.9: 10, 2.92: 10, 2.94: 9, 2.96: 9, 2.98: 9, 3: 8,
+    3.05: 8, 3.1: 8, 3.15: 8, 3.2: 7, 3.25: 7, 3.3: 7, 3.35: 7, 3.4: 6, 3.45: 6, 3.5: 6,
+    3.55: 6, 3.6: 5, 3.65: 5, 3.7: 5, 3.75: 5, 3.8: 4, 3.85: 4, 3.9: 4, 3.95: 4, 4: 3,
+    4.1: 3, 4.2: 3, 4.3: 3, 4.4: 3, 4.5: 3, 4.6: 3, 4.7: 3, 4.8: 3, 4.9: 3, 5: 3,
+    5.1: 2, 5.2: 2, 5.3: 2, 5.4: 2, 5.5: 2, 5.6: 2, 5.7: 2, 5.8: 2, 5.9: 2, 6: 2,
+    6.2: 2, 6.4: 2, 6.6: 2, 6.8: 2, 7: 2, 7.2: 2, 7.4: 2, 7.6: 2, 7.8: 2, 8: 2,
+    8.2: 2, 8.4: 2, 8.6: 2, 8.8: 2, 9: 2, 9.2: 2, 9.4: 2, 9.6: 2, 9.8: 2, 10: 2,
+    10.5: 2, 11: 2, 11.5: 2, 12: 1, 12.5: 1, 13: 1, 13.5: 1, 14: 0, 14.5: 0, 15: 0,
+    15.5: -1, 16: -2, 16.5: -2, 17: -3, 17.5: -4, 18: -5, 18.5: -5, 19: -6, 19.5: -7, 20: -9,
+    21: -11, 22: -12, 23: -13, 24: -14, 25: -16, 26: -17, 27: -18, 28: -20, 29: -21, 30: -22,
+    32: -25, 34: -26, 36: -28, 38: -29, 40: -31, 42: -32, 44: -34, 46: -35, 48: -37, 50: -38,
+    55: -40, 60: -41, 65: -42, 70: -43, 75: -44, 80: -44, 85: -45, 90: -45, 95: -46, 100: -46,
+    110: -47, 120: -47, 130: -48, 140: -48, 150: -49, 160: -49, 170: -50, 180: -50, 190: -50, 200: -50,
+    250: -50, 300: -50, 350: -50, 400: -50, 450: -50, 500: -50
+}
+_SORTED_FORM_PRICES = np.array(sorted(FORM_PRICE_SCORES), dtype=float)
+
+
+def check_form_price(form_price):
+    if form_price is None:
+        return 0, 'Error: No form price available\n'
+
+    numeric_price = _parse_float(form_price) if isinstance(form_price, str) else form_price
+
+    if _is_nan(numeric_price):
+        return 0, f'Error: Form price "{_js_str(form_price)}" is not a valid number\n'
+
+    if numeric_price < 1.01 or numeric_price > 500.00:
+        return 0, f"Error: Form price ${_js_str(numeric_price)} outside valid range (1.01-500.00)\n"
+
+    rounded_price = _js_round(numeric_price * 100) / 100
+    price = _to_fixed(rounded_price, 2)
+
+    if rounded_price in FORM_PRICE_SCORES:
+        add_score = FORM_PRICE_SCORES[rounded_price]
+        if add_score > 0:
+            return add_score, f"+{add_score}.0 : Form price ${price} (well-backed)\n"
+        if add_score == 0:
+            return add_score, f"+0.0 : Form price ${price} (neutral)\n"
+        return add_score, f"{add_score}.0 : Form price ${price} (outsider penalty)\n"
+
+    # Interpolate between the neighbouring table prices
+    position = int(np.searchsorted(_SORTED_FORM_PRICES, rounded_price))
+    if position == 0 or position >= len(_SORTED_FORM_PRICES):
+        return 0, f"Error: Form price ${price} could not be scored\n"
+    closest_lower = float(_SORTED_FORM_PRICES[position - 1])
+    closest_higher = float(_SORTED_FORM_PRICES[position])
+    lower_score = FORM_PRICE_SCORES[closest_lower]
+    higher_score = FORM_PRICE_SCORES[closest_higher]
+    ratio = (rounded_price - closest_lower) / (closest_higher - closest_lower)
+    add_score = int(_js_round(lower_score + (higher_score - lower_score) * ratio))
+
+    if add_score > 0:
+        return add_score, f"+{add_score}.0 : Form price ${price} (interpolated)\n"
+    if add_score == 0:
+        return 0, f"+0.0 : Form price ${price} (interpolated)\n"
+    return add_score, f"{add_score}.0 : Form price ${price} (interpolated)\n"
+
+
+def _is_undefeated(record):
+    if not isinstance(record, str):
+        return False
+    numbers = parse_record(record)
+    if numbers is None:
+        return False
+    runs, wins, seconds, thirds = numbers
+    return runs > 0 and wins == runs and seconds == 0 and thirds == 0
+
+
+def check_first_up_second_up(horse_row):
+    add_score = 0
+    note = ''
+
+    last10 = _js_str(horse_row.get('horse last10') or '')
+    first_up_record = horse_row.get('horse record first up')
+    second_up_record = horse_row.get('horse record second up')
+
+    is_first_up = False
+    is_second_up = False
+
+    if last10.lower().endswith('x'):
+        is_first_up = True
+    elif len(last10) >= 2:
+        # Second up: the run before last was a spell ('x'), the last a placing
+        if last10[-2].lower() == 'x' and last10[-1] in '0123456789':
+            is_second_up = True
+
+    if is_first_up and _is_undefeated(first_up_record):
+        add_score += 15
+        note += f"+15.0 : First up specialist ({first_up_record})\n"
+
+    if is_second_up and _is_undefeated(second_up_record):
+        add_score += 15
+        note += f"+15.0 : Second up specialist ({second_up_record})\n"
+
+    return add_score, note
+
+
+# ----- Score components -----
+# Tags a component can earn, matched against that component's own note
+# (None = earned whenever it adds points). analyzer.js keeps the same table
+# as COMPONENT_TAGS.
+_WIN_RATE_TAGS = [
+    ('exceptional_win_rate', ('Exceptional win rate',)),
+    ('strong_win_rate', ('Strong win rate',)),
+    ('good_win_rate', ('Good win rate',)),
+]
+COMPONENT_TAGS = {
+    'last10': [('ran_places', ('Ran places:',))],
+    'jockey': [('elite_jockey', ('Love the Jockey',)), ('top_jockey', ('Like the Jockey',))],
+    'trainer': [('top_trainer', ('Like the Trainer',))],
+    'track': [('undefeated_track', ('UNDEFEATED',))] + _WIN_RATE_TAGS,
+    'track_distance': [('undefeated_track_distance', ('UNDEFEATED',))] + _WIN_RATE_TAGS,
+    'distance': [('undefeated_distance', ('UNDEFEATED',))] + _WIN_RATE_TAGS,
+    'track_condition': [('undefeated_condition', ('UNDEFEATED',))] + _WIN_RATE_TAGS,
+    'class': [('class_drop', ('Stepping DOWN',)), ('class_rise', ('Stepping UP',))],
+    'days_since_run': [('quick_backup', ('Quick backup',)), ('too_fresh', ('Too fresh',))],
+    'margin': [('won_last_start', (' last start win ',)), ('narrow_loss', ('Narrow loss',)), ('close_loss', ('Close loss',))],
+    'form_price': [('positive_form_price', None)],
+    'first_up_second_up': [('first_up_specialist', ('First up specialist',)), ('second_up_specialist', ('Second up specialist',))],
+    'sectional': [
+        ('fastest_avg_sectional', (': fastest avg sectional',)),
+        ('second_fastest_avg_sectional', ('2nd fastest avg sectional',)),
+        ('third_fastest_avg_sectional', ('3rd fastest avg sectional',)),
+        ('fastest_last_start_sectional', (': fastest last start sectional',)),
+        ('second_fastest_last_start_sectional', ('2nd fastest last start sectional',)),
+        ('third_fastest_last_start_sectional', ('3rd fastest last start sectional',)),
+    ],
+    'combo_bonus': [('combo_bonus', None)],
+}
+# Order components are added to a score in
+COMPONENT_IDS = (
+    'weight', 'last10', 'jockey', 'trainer', 'track', 'track_distance', 'distance', 'last_distance',
+    'track_condition', 'class', 'days_since_run', 'margin', 'form_price', 'first_up_second_up',
+    'sectional', 'combo_bonus', 'weight_vs_field',
+)
+
+
+def score_component(component_id, points, note):
+    """
+    [id, points, tags] for one scoring check, or None when it neither
+    scored nor earned a tag
+    """
+    tags = [
+        tag for tag, phrases in COMPONENT_TAGS.get(component_id, ())
+        if (points > 0 if phrases is None else any(phrase in note for phrase in phrases))
+    ]
+    if points == 0 and not tags:
+        return None
+    return [component_id, points, tags]
+
+
+def _add_component(components, component_id, points, note):
+    component = score_component(component_id, points, note)
+    if component is not None:
+        components.append(component)
+
+
+def component_tags(components):
+    """Tags of a runner's components, in component order without repeats"""
+    tags = []
+    for _, _, component_tags in components or ():
+        for tag in component_tags:
+            if tag not in tags:
+                tags.append(tag)
+    return tags
+
+
+def _replace_component(components, component_id, points, note):
+    """components with component_id's entry swapped for a new one, in order"""
+    kept = [component for component in components if component[0] != component_id]
+    component = score_component(component_id, points, note)
+    if component is not None:
+        position = COMPONENT_IDS.index(component_id)
+        index = next((i for i, c in enumerate(kept) if COMPONENT_IDS.index(c[0]) > position), len(kept))
+        kept.insert(index, component)
+    return kept
+
+
+def calculate_score(horse_row, track_condition, average_form_price):
+    """Score one horse from its own row; returns (score, notes, components)"""
+    score = 0
+    notes = ''
+    components = []
+
+    for component_id, (add, note) in (
+        ('weight', check_weight(horse_row.get('horse weight'), horse_row.get('horse claim'))),
+        ('last10', check_last10_runs(horse_row.get('horse last10'))),
+        ('jockey', check_jockeys(horse_row.get('horse jockey'))),
+        ('trainer', check_trainers(horse_row.get('horse trainer'))),
+        ('track', check_track_form(horse_row.get('horse record track'))),
+        ('track_distance', check_track_distance_form(horse_row.get('horse record track distance'))),
+        ('distance', check_distance_form(horse_row.get('horse record distance'))),
+        ('last_distance', check_last_distance(horse_row)),
+        ('track_condition', check_track_condition_form(horse_row.get('horse record ' + track_condition), track_condition)),
+        ('class', compare_classes(
+            horse_row.get('class restrictions'),
+            horse_row.get('form class'),
+            horse_row.get('race prizemoney'),
+            horse_row.get('prizemoney')
+        )),
+        ('days_since_run', check_days_since_last_run(horse_row.get('meeting date'), horse_row.get('form meeting date'))),
+        ('margin', check_margin(horse_row.get('form position'), horse_row.get('form margin'))),
+        ('form_price', check_form_price(average_form_price)),
+        ('first_up_second_up', check_first_up_second_up(horse_row)),
+    ):
+        score += add
+        notes += note
+        _add_component(components, component_id, add, note)
+
+    return score, notes, components
+
+
+# ----- Meeting frame -----
+class MeetingFrame:
+    """
+    A meeting's scored rows, parsed once and shared by every stage
+
+    Each line is kept as split; a column is trimmed the first time a stage
+    asks for it, and a typed column parses each distinct value once (form
+    rows repeat a runner's race-day values, and dates, prices and weights
+    repeat across runners). Row dicts are only built for the rows that end
+    up in results. The race and runner groupings are worked out once.
+
+    analyzer.js doesn't use it: with the node engine the frame only serves
+    the Python-side reads of stored CSVs (runner_rows, meeting_diff, backtest)
+    """
+
+    def __init__(self, headers, lines, rows=None):
+        self.headers = headers
+        self._lines = lines
+        self._dict_rows = rows
+        # A repeated header reads its last column, as in a row dict
+        self._index = {name: i for i, name in enumerate(headers)}
+        self._columns = {}
+        self._built_rows = {}
+        self._cache = {}
+
+    @classmethod
+    def from_csv(cls, csv_data):
+        """The frame of CSV text, or an iterable of its lines"""
+        if isinstance(csv_data, str):
+            lines = iter(_js_trim(csv_data).split('\n'))
+        else:
+            lines = _trimmed_lines(csv_data)
+        headers = [_js_trim(header).lower() for header in parse_csv_line(next(lines))]
+        index = {name: i for i, name in enumerate(headers)}
+        name_at, race_at = index.get('horse name'), index.get('race number')
+        if name_at is None or race_at is None:
+            return cls(headers, [])
+
+        width = len(headers)
+        kept = []
+        for line in lines:
+            values = parse_csv_line(line)
+            if len(values) == width and _is_valid(values[name_at], values[race_at]):
+                kept.append(values)
+        return cls(headers, kept)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """The frame of rows already parsed into dicts"""
+        rows = list(rows)
+        return cls([], [None] * len(rows), rows)
+
+    def __len__(self):
+        return len(self._lines)
+
+    def copy(self):
+        """The same rows with nothing parsed past the split yet"""
+        return MeetingFrame(self.headers, self._lines, self._dict_rows)
+
+    def column(self, name):
+        """A column's trimmed values (None throughout when the CSV lacks it)"""
+        values = self._columns.get(name)
+        if values is None:
+            if self._dict_rows is not None:
+                values = [row.get(name) for row in self._dict_rows]
+            else:
+                at = self._index.get(name)
+                values = [None] * len(self._lines) if at is None else [_js_trim(line[at]) for line in self._lines]
+            self._columns[name] = values
+        return values
+
+    def parsed(self, name, parse):
+        """parse() of each value of a column, each distinct value parsed once"""
+        key = (name, parse)
+        values = self._columns.get(key)
+        if values is None:
+            seen = {}
+            values = []
+            for value in self.column(name):
+                try:
+                    values.append(seen[value])
+                except KeyError:
+                    seen[value] = parsed = parse(value)
+                    values.append(parsed)
+            self._columns[key] = values
+        return values
+
+    def row(self, index):
+        """Row index as the dict parse_csv() gives"""
+        if self._dict_rows is not None:
+            return self._dict_rows[index]
+        row = self._built_rows.get(index)
+        if row is None:
+            row = self._built_rows[index] = {
+                header: _js_trim(value) for header, value in zip(self.headers, self._lines[index])
+            }
+        return row
+
+    def rows(self):
+        return [self.row(index) for index in range(len(self))]
+
+    def runner_keys(self):
+        """Each row's 'horse name-race number' key, as the stages key runners"""
+        keys = self._cache.get('runner_keys')
+        if keys is None:
+            keys = self._cache['runner_keys'] = [
+                f"{_js_str(name)}-{_js_str(race)}"
+                for name, race in zip(self.column('horse name'), self.column('race number'))
+            ]
+        return keys
+
+    def by_race(self, indices=None):
+        """[(race number, row indices)] in Object.keys() order, for all rows or the given ones"""
+        if indices is None:
+            cached = self._cache.get('by_race')
+            if cached is None:
+                cached = self._cache['by_race'] = self.by_race(range(len(self)))
+            return cached
+        races = self.column('race number')
+        groups = {}
+        for index in indices:
+            groups.setdefault(races[index], []).append(index)
+        return [(race, groups[race]) for race in _js_keys(groups)]
+
+    def latest_rows(self):
+        """Index of the latest form row for each horse-race combination, first seen first"""
+        latest = self._cache.get('latest_rows')
+        if latest is None:
+            latest = {}
+            latest_dates = {}
+            for index, (key, current_date) in enumerate(zip(
+                self.runner_keys(), self.parsed('form meeting date', parse_date)
+            )):
+                if key not in latest or current_date > latest_dates[key]:
+                    latest[key] = index
+                    latest_dates[key] = current_date
+            latest = self._cache['latest_rows'] = list(latest.values())
+        return latest
+
+
+def _as_frame(data):
+    return data if isinstance(data, MeetingFrame) else MeetingFrame.from_rows(data)
+
+
+def parse_meeting(csv_data):
+    """The MeetingFrame of a meeting CSV (text, or an iterable of its lines)"""
+    return MeetingFrame.from_csv(csv_data)
+
+
+# ----- Multi-row stages -----
+def calculate_average_form_prices(data):
+    """Average valid form price per horse-race, rounded to 2 decimal places"""
+    frame = _as_frame(data)
+    groups = {}
+    for key, price in zip(frame.runner_keys(), frame.parsed('form price', _parse_float)):
+        prices = groups.setdefault(key, [])
+        if not _is_nan(price) and 1.01 <= price <= 500.00:
+            prices.append(price)
+
+    averages = {}
+    for key, prices in groups.items():
+        if prices:
+            averages[key] = _js_round(_sum(prices) / len(prices) * 100) / 100
+        else:
+            averages[key] = None
+    return averages
+
+
+_SECTIONAL_RE = re.compile(r'(\d+\.?\d*)sec (\d+)m\Z', re.ASCII)
+
+
+def _parse_sectional(sectional):
+    """'35.2sec 600m' as (35.2, 600), or None"""
+    match = _SECTIONAL_RE.match(sectional) if sectional else None
+    return (float(match.group(1)), int(match.group(2))) if match else None
+
+
+def get_lowest_sectionals_by_race(data):
+    """Rank each race's horses on average (last 3) and last-start sectionals"""
+    frame = _as_frame(data)
+    races = frame.column('race number')
+    names = frame.column('horse name')
+    race_numbers = frame.parsed('race number', _parse_int)
+    sectionals = frame.parsed('sectional', _parse_sectional)
+    dates = frame.column('form meeting date')
+    date_values = frame.parsed('form meeting date', parse_date)
+
+    valid = []
+    for index, (race, name, race_num, sectional) in enumerate(zip(races, names, race_numbers, sectionals)):
+        if not race or not name or sectional is None:
+            continue
+        if _js_trim(name).lower() in ('horse name', '', 'nan', 'null', 'undefined'):
+            continue
+        if _is_nan(race_num) or race_num <= 0:
+            continue
+        valid.append(index)
+
+    results = []
+
+    for race_num, race_rows in frame.by_race(valid):
+        parsed_data = []
+        distances = {}
+        for index in race_rows:
+            time, distance = sectionals[index]
+            if time > 0:
+                distances[distance] = None
+            parsed_data.append((names[index], time, distance, dates[index], date_values[index]))
+
+        # If multiple distances, use the one with the most horses (ties go to the longer)
+        target_distance = None
+        if len(distances) > 1:
+            counts = {dist: set() for dist in distances}
+            for name, time, distance, _, _ in parsed_data:
+                if time > 0 and distance in counts:
+                    counts[distance].add(name)
+            counts = {dist: len(horses) for dist, horses in counts.items()}
+            ordered = sorted(counts)
+            target_distance = ordered[0]
+            for dist in ordered[1:]:
+                target_distance = target_distance if counts[target_distance] > counts[dist] else dist
+        elif len(distances) == 1:
+            target_distance = next(iter(distances))
+
+        horse_data = {}
+        for index in race_rows:
+            horse_data.setdefault(names[index], [])
+        all_horses = list(horse_data)
+
+        for name, time, distance, date, date_value in parsed_data:
+            if time > 0 and (target_distance is None or distance == target_distance):
+                horse_data[name].append((time, date, date_value))
+
+        # Most recent first
+        for times in horse_data.values():
+            _js_sort(times, lambda a, b: b[2] - a[2])
+
+        horse_keys = _js_keys(horse_data)
+
+        # System 1: average of last 3 runs
+        average_last3 = []
+        without_average = []
+        for name in horse_keys:
+            times = horse_data[name]
+            if times:
+                last3 = [time for time, _, _ in times[:3]]
+                average_last3.append((name, _sum(last3) / len(last3), len(last3)))
+            else:
+                without_average.append(name)
+        average_last3.sort(key=lambda item: item[1])
+
+        # System 2: last start only
+        last_start = [(name, horse_data[name][0][0]) for name in horse_keys if horse_data[name]]
+        last_start.sort(key=lambda item: item[1])
+
+        scores = {name: {'score': 0, 'note': '', 'avg1': False, 'last1': False} for name in all_horses}
+
+        for index, (name, _, runs_used) in enumerate(average_last3[:3]):
+            if index == 0:
+                scores[name]['score'] += 20
+                scores[name]['note'] += f"+20.0: fastest avg sectional (last {runs_used} runs)\n"
+                scores[name]['avg1'] = True
+            elif index == 1:
+                scores[name]['score'] += 10
+                scores[name]['note'] += f"+10.0: 2nd fastest avg sectional (last {runs_used} runs)\n"
+            else:
+                scores[name]['score'] += 5
+                scores[name]['note'] += f"+ 5.0: 3rd fastest avg sectional (last {runs_used} runs)\n"
+
+        for index, (name, _) in enumerate(last_start[:3]):
+            if index == 0:
+                scores[name]['score'] += 20
+                scores[name]['note'] += "+20.0: fastest last start sectional\n"
+                scores[name]['last1'] = True
+            elif index == 1:
+                scores[name]['score'] += 10
+                scores[name]['note'] += "+10.0: 2nd fastest last start sectional\n"
+            else:
+                scores[name]['score'] += 5
+                scores[name]['note'] += "+ 5.0: 3rd fastest last start sectional\n"
+
+        for name in without_average:
+            if not scores[name]['note']:
+                scores[name]['note'] = '??: No valid sectional\n'
+
+        for name in all_horses:
+            results.append({
+                'race': race_num,
+                'name': name,
+                'sectionalScore': scores[name]['score'],
+                'sectionalNote': scores[name]['note'],
+                'hasAverage1st': scores[name]['avg1'],
+                'hasLastStart1st': scores[name]['last1'],
+            })
+
+    return results
+
+
+def calculate_weight_scores(data):
+    """Score each horse's weight against its race average and its last start"""
+    frame = _as_frame(data)
+    names = frame.column('horse name')
+    horse_weights = frame.parsed('horse weight', _parse_float)
+    form_weights = frame.parsed('form weight', _parse_float)
+    results = []
+
+    for race_num, race_rows in frame.by_race():
+        unique_horses = {}
+        for index in race_rows:
+            unique_horses.setdefault(names[index], index)
+
+        weights = np.array([horse_weights[index] for index in unique_horses.values()], dtype=float)
+        last_weights = np.array([form_weights[index] for index in unique_horses.values()], dtype=float)
+        in_range = (weights >= 49) & (weights <= 65)
+
+        valid = weights[in_range]
+        # Left-to-right running sum, as the JS loop adds them
+        avg_weight = float(np.cumsum(valid)[-1]) / len(valid) if len(valid) else 55
+        avg = _to_fixed(avg_weight, 1)
+
+        for (name, horse), current, last, ok in zip(unique_horses.items(), weights.tolist(), last_weights.tolist(), in_range.tolist()):
+            score = 0
+            note = ''
+            cw = _js_str(current)
+
+            # Part A: relative to race average
+            if ok:
+                diff = avg_weight - current  # Positive = lighter than average
+                d = _to_fixed(diff, 1)
+                a = _to_fixed(abs(diff), 1)
+                if diff >= 3:
+                    score += 15
+                    note += f"+15.0 : Weight {cw}kg is {d}kg BELOW race avg ({avg}kg)\n"
+                elif diff >= 2:
+                    score += 10
+                    note += f"+10.0 : Weight {cw}kg is {d}kg below race avg ({avg}kg)\n"
+                elif diff >= 1:
+                    score += 6
+                    note += f"+ 6.0 : Weight {cw}kg is {d}kg below race avg ({avg}kg)\n"
+                elif diff >= 0.5:
+                    score += 3
+                    note += f"+ 3.0 : Weight {cw}kg is {d}kg below race avg ({avg}kg)\n"
+                elif diff > -0.5:
+                    note += f"  0.0 : Weight {cw}kg is near race avg ({avg}kg)\n"
+                elif diff > -1:
+                    score -= 3
+                    note += f"- 3.0 : Weight {cw}kg is {a}kg above race avg ({avg}kg)\n"
+                elif diff > -2:
+                    score -= 6
+                    note += f"- 6.0 : Weight {cw}kg is {a}kg above race avg ({avg}kg)\n"
+                elif diff > -3:
+                    score -= 10
+                    note += f"-10.0 : Weight {cw}kg is {a}kg above race avg ({avg}kg)\n"
+                else:
+                    score -= 15
+                    note += f"-15.0 : Weight {cw}kg is {a}kg ABOVE race avg ({avg}kg)\n"
+            else:
+                note += "  0.0 : Weight invalid or out of range\n"
+
+            # Part B: change from last start
+            if not math.isnan(current) and not math.isnan(last) and 49 <= last <= 65:
+                change = last - current  # Positive = dropped weight
+                c = _to_fixed(change, 1)
+                a = _to_fixed(abs(change), 1)
+                lw = _js_str(last)
+                if change >= 3:
+                    score += 15
+                    note += f"+15.0 : Dropped {c}kg from last start ({lw}kg → {cw}kg)\n"
+                elif change >= 2:
+                    score += 10
+                    note += f"+10.0 : Dropped {c}kg from last start ({lw}kg → {cw}kg)\n"
+                elif change >= 1:
+                    score += 5
+                    note += f"+ 5.0 : Dropped {c}kg from last start ({lw}kg → {cw}kg)\n"
+                elif change > -1:
+                    pass  # Within 1kg - no change
+                elif change > -2:
+                    score -= 5
+                    note += f"- 5.0 : Up {a}kg from last start ({lw}kg → {cw}kg)\n"
+                elif change > -3:
+                    score -= 10
+                    note += f"-10.0 : Up {a}kg from last start ({lw}kg → {cw}kg)\n"
+                else:
+                    score -= 15
+                    note += f"-15.0 : Up {a}kg from last start ({lw}kg → {cw}kg)\n"
+
+            results.append({'race': race_num, 'name': name, 'weightScore': score, 'weightNote': note})
+
+    return results
+
+
+def parse_formatted_number(value):
+    """
+    Numeric value of a trueOdds / percentage string ('$4.50' -> 4.5,
+    '23.1%' -> 23.1), or None when blank or unparseable
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).strip().lstrip('$').rstrip('%').replace(',', ''))
+    except ValueError:
+        return None
+
+
+def calculate_true_odds(results, prior_strength=0.05, max_ratio=300.0):
+    """Dirichlet win probabilities and true odds per race (110% market)"""
+    race_groups = {}
+    for result in results:
+        race_groups.setdefault(result['horse'].get('race number'), []).append(result)
+
+    for race_num in _js_keys(race_groups):
+        race_horses = race_groups[race_num]
+        scores = np.array([h['score'] for h in race_horses], dtype=float)
+
+        min_score = float(scores.min())
+        max_score = float(scores.max())
+        score_range = max_score - min_score
+
+        # Shift scores so the max:min ratio stays under max_ratio
+        min_shift_for_ratio = score_range / (max_ratio - 1) if score_range > 0 else 1.0
+        basic_shift = abs(min_score) + 0.01 if min_score < 0 else 0
+        shift = max(basic_shift, min_shift_for_ratio * 0.5)
+
+        adjusted = scores + shift
+        posterior = adjusted + prior_strength
+        total = float(np.cumsum(posterior)[-1])
+
+        base_probability = prior_strength / total
+        win_probability = posterior / total
+        performance_probability = adjusted / total
+        true_odds = 1 / (win_probability * 1.10)
+        raw_win_probability = win_probability * 1.10
+
+        base_percent = _to_fixed(base_probability * 100, 1) + '%'
+        for index, horse in enumerate(race_horses):
+            horse['winProbability'] = _to_fixed(float(win_probability[index]) * 110, 1) + '%'
+            horse['baseProbability'] = base_percent
+            horse['trueOdds'] = '$' + _to_fixed(float(true_odds[index]), 2)
+            horse['rawWinProbability'] = float(raw_win_probability[index])
+            horse['performanceComponent'] = _to_fixed(float(performance_probability[index]) * 100, 1) + '%'
+            horse['adjustedScore'] = float(adjusted[index])
+
+        total_prob = float(np.cumsum(raw_win_probability)[-1])
+        if total_prob < 1.09 or total_prob > 1.11:
+            raise Exception(f"Race {_js_str(race_num)} probabilities adding to {_to_fixed(total_prob * 100, 2)}%")
+
+    return results
+
+
+def rescore_track_condition(results, old_condition, new_condition):
+    """
+    Move analyze_csv results from one track condition to another: swap each
+    runner's track condition component (score, note and components entry),
+    then recompute the true odds. Every other component is independent of
+    the condition.
+    results are {'horse': row, 'score', 'notes', 'components'}; the rows only
+    need the race number and the 'horse record <condition>' columns, and
+    notes or components may be None when they weren't kept
+    """
+    for result in results:
+        row = result['horse']
+        old_score, old_note = check_track_condition_form(row.get('horse record ' + old_condition), old_condition)
+        new_score, new_note = check_track_condition_form(row.get('horse record ' + new_condition), new_condition)
+        result['score'] = result['score'] - old_score + new_score
+        if result.get('notes') is not None:
+            result['notes'] = _replace_condition_note(result['notes'], old_note, new_note)
+        if result.get('components') is not None:
+            result['components'] = _replace_component(result['components'], 'track_condition', new_score, new_note)
+    return calculate_true_odds(results, 1)
+
+
+def _replace_condition_note(notes, old_note, new_note):
+    """
+    notes with the track condition check's note swapped for new_note
+    The four record-form checks can write the same note ('More podiums than
+    runs?? ...'); the condition check is the last of them and no later check
+    writes one, so its note is the last occurrence
+    """
+    index = notes.rfind(old_note)
+    if index < 0:
+        return notes
+    return notes[:index] + new_note + notes[index + len(old_note):]
+
+
+def sweep_track_conditions(results, track_condition, conditions=TRACK_CONDITIONS):
+    """
+    Scores and true odds of analyze_csv results under every track condition,
+    from the one analysis: the condition-independent part of each score is
+    worked out once and only the condition form component and the true odds
+    are recomputed per condition
+    results need their true odds for track_condition already calculated
+    Returns {condition: {'score', 'trueOdds', 'winProbability'}} per result
+    """
+    bases = [
+        result['score'] - check_track_condition_form(
+            result['horse'].get('horse record ' + track_condition), track_condition
+        )[0]
+        for result in results
+    ]
+
+    sweeps = [{} for _ in results]
+    for condition in conditions:
+        if condition == track_condition:
+            swept = results
+        else:
+            swept = calculate_true_odds([{
+                'horse': result['horse'],
+                'score': base + check_track_condition_form(result['horse'].get('horse record ' + condition), condition)[0]
+            } for result, base in zip(results, bases)], 1)
+        for sweep, result in zip(sweeps, swept):
+            sweep[condition] = {
+                'score': result['score'],
+                'trueOdds': result['trueOdds'],
+                'winProbability': result['winProbability']
+            }
+    return sweeps
+
+
+def get_unique_horses_only(data):
+    """Latest form row for each horse-race combination"""
+    frame = _as_frame(data)
+    return [frame.row(index) for index in frame.latest_rows()]
+
+
+def _is_valid(horse_name, race_num):
+    horse_name = _js_trim(horse_name or '').lower()
+    if not horse_name or horse_name == 'horse name':
+        return False
+    race_num = _js_trim(race_num or '')
+    if not race_num or _is_nan(_parse_int(race_num)) or race_num.lower() == 'race number':
+        return False
+    return True
+
+
+def _is_valid_row(row):
+    return _is_valid(row.get('horse name'), row.get('race number'))
+
+
+def parse_runner_rows(csv_data):
+    """Rows of a meeting CSV that analyze_csv scores (repeated headers and blanks dropped)"""
+    return parse_meeting(csv_data).rows()
+
+
+def _name_key(race, name):
+    return _parse_int(race), _js_trim(name).lower()
+
+
+def analyze_csv(csv_data, track_condition, is_advanced=False):
+    """
+    Score every horse in a meeting CSV; same output as analyzeCSV
+    csv_data is the CSV text or an iterable of its lines
+    """
+    return score_runner_rows(parse_meeting(csv_data), track_condition, is_advanced)
+
+
+def score_runner_rows(data, track_condition, is_advanced=False):
+    """
+    analyze_csv() on a meeting already parsed by parse_meeting() (or its
+    rows, from parse_runner_rows())
+    """
+    frame = _as_frame(data)
+    if not len(frame):
+        return []
+
+    analysis_results = []
+
+    # Multi-row analysis data, keyed for lookup (first match wins, as find() does)
+    sectionals = {}
+    for h in get_lowest_sectionals_by_race(frame):
+        sectionals.setdefault(_name_key(h['race'], h['name']), h)
+    average_form_prices = calculate_average_form_prices(frame)
+    weight_scores = {}
+    for w in calculate_weight_scores(frame):
+        weight_scores.setdefault(_name_key(w['race'], w['name']), w)
+
+    for horse in get_unique_horses_only(frame):
+        if not horse.get('meeting date') or not horse.get('horse name'):
+            continue
+
+        composite_key = f"{horse['horse name']}-{horse['race number']}"
+        score, notes, components = calculate_score(horse, track_condition, average_form_prices.get(composite_key))
+
+        key = _name_key(horse['race number'], horse['horse name'])
+
+        matching_horse = sectionals.get(key)
+        if matching_horse:
+            score += matching_horse['sectionalScore']
+            notes += matching_horse['sectionalNote']
+            _add_component(components, 'sectional', matching_horse['sectionalScore'], matching_horse['sectionalNote'])
+
+            # Combo bonus: fastest on both sectional systems and dropping in class
+            if matching_horse['hasAverage1st'] and matching_horse['hasLastStart1st']:
+                class_score, _ = compare_classes(
+                    horse.get('class restrictions'),
+                    horse.get('form class'),
+                    horse.get('race prizemoney'),
+                    horse.get('prizemoney')
+                )
+                if class_score > 0:
+                    score += 15
+                    notes += '+15.0 : COMBO BONUS - Fastest sectional + dropping in class\n'
+                    _add_component(components, 'combo_bonus', 15, '')
+
+        matching_weight = weight_scores.get(key)
+        if matching_weight:
+            score += matching_weight['weightScore']
+            notes += matching_weight['weightNote']
+            _add_component(components, 'weight_vs_field', matching_weight['weightScore'], matching_weight['weightNote'])
+
+        analysis_results.append({'horse': horse, 'score': score, 'notes': notes, 'components': components})
+
+    # Remove duplicate horse names (last wins, first position kept) and calculate odds
+    unique_results = {}
+    for item in analysis_results:
+        unique_results[item['horse']['horse name']] = item
+    unique_results = calculate_true_odds(list(unique_results.values()), 1)
+
+    # Sort by race number, then by score descending
+    unique_results.sort(key=lambda r: (_parse_int(r['horse']['race number']), -r['score']))
+
+    return unique_results
@@ -0,0 +1,347 @@
+"""
+Cross-meeting index of horses, jockeys and trainers.
+
+Uploads spell the same person many ways ("J B Mc Donald", "James McDonald",
+"James Mcdonald"). Each horse, jockey and trainer is therefore an entity
+with a canonical name, and every spelling seen is an alias of it. Runners
+carry their three entity ids, so "every run by this jockey" reads an index
+range instead of comparing name strings across every horse row.
+
+Spellings belong to the same entity when name_key() agrees, after
+scoring.py's jockey and trainer mappings are applied. Search looks up
+entities, never runners: SQLite uses an FTS5 table (every word matched as a
+prefix), Postgres a pg_trgm index on entities.search_text (every word
+matched as a substring), and anything else LIKE on the same column.
+"""
+import re
+import unicodedata
+
+from sqlalchemy import exc, insert, update, delete, text
+
+from models import db, Entity, EntityAlias, Horse, Race, Meeting, Prediction
+from scoring import normalize_jockey_name, normalize_trainer_name, JOCKEY_MAPPING, TRAINER_MAPPING
+
+KINDS = ('horse', 'jockey', 'trainer')
+# Horse columns holding each kind's name as uploaded and its entity id
+RUNNER_COLUMNS = {
+    'horse': ('horse_name', 'horse_entity_id'),
+    'jockey': ('jockey', 'jockey_entity_id'),
+    'trainer': ('trainer', 'trainer_entity_id'),
+}
+_CANONICAL = {
+    'horse': lambda name: name,
+    'jockey': normalize_jockey_name,
+    'trainer': normalize_trainer_name,
+}
+
+_backends = {}  # database URL -> 'fts5', 'trigram' or 'like'
+_MAPPED_KEYS = {}  # kind -> {name_key(mapped spelling): canonical name}
+
+
+def name_key(name):
+    """
+    A name folded for matching: accents, case, punctuation, apprentice
+    claims and country suffixes in brackets, and 'Mc Donald' splits removed
+    """
+    key = unicodedata.normalize('NFKD', name or '').encode('ascii', 'ignore').decode('ascii').lower()
+    key = re.sub(r"\([^)]*\)|['`.]", '', key)
+    key = re.sub(r'[^a-z0-9&]+', ' ', key).replace('&', ' and ')
+    key = re.sub(r'\b(mc|mac) (?=[a-z]{2})', r'\1', key)
+    return ' '.join(key.split())
+
+
+def canonical_name(kind, name):
+    """The name after scoring.py's jockey/trainer mapping, also matched on its key ('W PIKE')"""
+    mapped = _mapped_keys(kind).get(name_key(name))
+    if mapped:
+        return mapped
+    return ' '.join(_CANONICAL[kind](name or '').split())
+
+
+def _mapped_keys(kind):
+    if kind not in _MAPPED_KEYS:
+        mapping = {'jockey': JOCKEY_MAPPING, 'trainer': TRAINER_MAPPING}.get(kind, {})
+        _MAPPED_KEYS[kind] = {name_key(alias): name for alias, name in mapping.items()}
+    return _MAPPED_KEYS[kind]
+
+
+def search_backend():
+    """How this database searches entities: 'fts5', 'trigram' or 'like'"""
+    url = str(db.engine.url)
+    if url not in _backends:
+        dialect = db.engine.dialect.name
+        backend = 'like'
+        if dialect == 'sqlite':
+            if db.session.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'entity_search'"
+            )).first():
+                backend = 'fts5'
+        elif dialect == 'postgresql':
+            if db.session.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first():
+                backend = 'trigram'
+        _backends[url] = backend
+    return _backends[url]
+
+
+def resolve(kind, names):
+    """{name: entity id} for names of one kind, creating entities and aliases for new spellings"""
+    names = {name for name in names if name and name.strip()}
+    if not names:
+        return {}
+    ids = _aliases(kind, names)
+    for _ in range(3):
+        missing = names - ids.keys()
+        if not missing:
+            break
+        try:
+            with db.session.begin_nested():
+                ids.update(_add_aliases(kind, missing))
+            break
+        except exc.IntegrityError:
+            # Another process added some of them first; use theirs and retry the rest
+            ids.update(_aliases(kind, missing))
+    return ids
+
+
+def _aliases(kind, names):
+    return dict(db.session.execute(
+        db.select(EntityAlias.alias, EntityAlias.entity_id)
+        .where(EntityAlias.kind == kind, EntityAlias.alias.in_(names))
+    ).all())
+
+
+def _add_aliases(kind, aliases):
+    """Alias each new spelling to the entity with its key, creating entities as needed"""
+    canonical = {alias: canonical_name(kind, alias) for alias in aliases}
+    keys = {alias: name_key(canonical[alias]) for alias in aliases}
+    keys = {alias: key for alias, key in keys.items() if key}  # e.g. '-' for no jockey
+    if not keys:
+        return {}
+
+    entities = dict(db.session.execute(
+        db.select(Entity.search_key, Entity.id)
+        .where(Entity.kind == kind, Entity.search_key.in_(set(keys.values())))
+    ).all())
+    new = {}
+    for alias in sorted(keys):
+        if keys[alias] not in entities:
+            new.setdefault(keys[alias], canonical[alias])
+    if new:
+        inserted = db.session.execute(insert(Entity).returning(Entity.id, Entity.search_key), [
+            {'kind': kind, 'name': name, 'search_key': key, 'search_text': key}
+            for key, name in new.items()
+        ])
+        entities.update({key: entity_id for entity_id, key in inserted})
+
+    ids = {alias: entities[key] for alias, key in keys.items()}
+    db.session.execute(insert(EntityAlias), [
+        {'kind': kind, 'alias': alias, 'entity_id': entity_id} for alias, entity_id in ids.items()
+    ])
+    _refresh_search_text(set(ids.values()))
+    return ids
+
+
+def _refresh_search_text(entity_ids):
+    """Rewrite search_text (and the FTS5 rows) of entities from their key and aliases' keys"""
+    keys = {entity_id: [search_key] for entity_id, search_key in db.session.execute(
+        db.select(Entity.id, Entity.search_key).where(Entity.id.in_(entity_ids))
+    )}
+    for entity_id, alias in db.session.execute(
+        db.select(EntityAlias.entity_id, EntityAlias.alias)
+        .where(EntityAlias.entity_id.in_(entity_ids))
+        .order_by(EntityAlias.alias)
+    ):
+        # Differs from the entity's key when a jockey/trainer mapping renamed it
+        key = name_key(alias)
+        if key and key not in keys[entity_id]:
+            keys[entity_id].append(key)
+
+    rows = [{'id': entity_id, 'search_text': ' '.join(entity_keys)} for entity_id, entity_keys in keys.items()]
+    db.session.execute(update(Entity), rows)
+    if search_backend() == 'fts5':
+        db.session.execute(text("DELETE FROM entity_search WHERE rowid = :id"), [{'id': row['id']} for row in rows])
+        db.session.execute(text(
+            "INSERT INTO entity_search (rowid, kind, search_text) "
+            "SELECT id, kind, search_text FROM entities WHERE id = :id"
+        ), [{'id': row['id']} for row in rows])
+
+
+def link_runners(horse_rows):
+    """Set the entity id columns on horse row dicts about to be inserted"""
+    for kind, (name_column, id_column) in RUNNER_COLUMNS.items():
+        ids = resolve(kind, {row.get(name_column) for row in horse_rows})
+        for row in horse_rows:
+            row[id_column] = ids.get(row.get(name_column))
+
+
+def index_runners(batch_size=5000, echo=None):
+    """Link stored runners that predate the index; returns how many were linked"""
+    linked = 0
+    last_id = 0
+    unlinked = db.or_(Horse.horse_entity_id.is_(None), Horse.jockey_entity_id.is_(None),
+                      Horse.trainer_entity_id.is_(None))
+    while True:
+        rows = db.session.execute(
+            db.select(Horse.id, Horse.horse_name, Horse.jockey, Horse.trainer)
+            .where(Horse.id > last_id, unlinked)
+            .order_by(Horse.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        updates = [{'id': row.id, 'horse_name': row.horse_name, 'jockey': row.jockey, 'trainer': row.trainer}
+                   for row in rows]
+        link_runners(updates)
+        db.session.execute(update(Horse), [
+            {'id': row['id'], **{id_column: row[id_column] for _, id_column in RUNNER_COLUMNS.values()}}
+            for row in updates
+        ])
+        db.session.commit()
+        linked += len(rows)
+        last_id = rows[-1].id
+        if echo:
+            echo(f"Linked {linked} runners")
+    return linked
+
+
+def _query_terms(query):
+    return name_key(query).split()
+
+
+def search(query, kind=None, limit=20):
+    """
+    Entities matching every word of query, best first, as dicts with their
+    canonical name, other spellings and number of stored runs
+    """
+    terms = _query_terms(query)
+    if not terms:
+        return []
+    if kind is not None and kind not in KINDS:
+        raise ValueError(f"kind must be one of {', '.join(KINDS)}")
+
+    backend = search_backend()
+    if backend == 'fts5':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        kind_filter = "AND kind = :kind " if kind else ""
+        entity_ids = list(db.session.execute(text(
+            f"SELECT rowid FROM entity_search WHERE entity_search MATCH :match {kind_filter}"
+            "ORDER BY rank LIMIT :limit"
+        ), {'match': match, 'kind': kind, 'limit': limit}).scalars())
+    else:
+        statement = db.select(Entity.id).where(*[Entity.search_text.like(f'%{term}%') for term in terms])
+        if kind:
+            statement = statement.where(Entity.kind == kind)
+        if backend == 'trigram':
+            statement = statement.order_by(db.func.similarity(Entity.search_text, ' '.join(terms)).desc())
+        else:
+            statement = statement.order_by(db.func.length(Entity.search_text), Entity.id)
+        entity_ids = list(db.session.execute(statement.limit(limit)).scalars())
+    if not entity_ids:
+        return []
+
+    entities = {entity.id: entity for entity in Entity.query.filter(Entity.id.in_(entity_ids))}
+    aliases = {}
+    for entity_id, alias in db.session.execute(
+        db.select(EntityAlias.entity_id, EntityAlias.alias)
+        .where(EntityAlias.entity_id.in_(entity_ids))
+        .order_by(EntityAlias.alias)
+    ):
+        if alias != entities[entity_id].name:
+            aliases.setdefault(entity_id, []).append(alias)
+    runs = run_counts(entities.values())
+
+    key = ' '.join(terms)
+    results = [{
+        'id': entity_id,
+        'kind': entities[entity_id].kind,
+        'name': entities[entity_id].name,
+        'aliases': aliases.get(entity_id, []),
+        'runs': runs.get(entity_id, 0),
+    } for entity_id in entity_ids]
+    # Exact names first; otherwise the search's own ranking
+    results.sort(key=lambda result: entities[result['id']].search_key != key)
+    return results
+
+
+def run_counts(entities):
+    """{entity id: stored runners} for a few entities (one indexed count per kind)"""
+    by_kind = {}
+    for entity in entities:
+        by_kind.setdefault(entity.kind, []).append(entity.id)
+    counts = {}
+    for kind, entity_ids in by_kind.items():
+        column = getattr(Horse, RUNNER_COLUMNS[kind][1])
+        counts.update(db.session.execute(
+            db.select(column, db.func.count()).where(column.in_(entity_ids)).group_by(column)
+        ).all())
+    return counts
+
+
+def entity_runs(entity, limit=50, before=None):
+    """
+    The entity's stored runs, newest first, limit at a time; before is the
+    horse id to continue below (the last run of the previous page)
+    """
+    column = getattr(Horse, RUNNER_COLUMNS[entity.kind][1])
+    statement = db.select(
+        Horse.id.label('horse_id'),
+        Meeting.id.label('meeting_id'),
+        Meeting.meeting_name,
+        Meeting.date.label('meeting_date'),
+        Meeting.uploaded_at,
+        Race.race_number,
+        Race.distance,
+        Race.race_class,
+        Race.track_condition,
+        Horse.horse_name,
+        Horse.barrier,
+        Horse.weight,
+        Horse.jockey,
+        Horse.trainer,
+        Prediction.score,
+        Prediction.true_odds,
+        Prediction.win_percent
+    )\
+        .select_from(Horse)\
+        .join(Race, Race.id == Horse.race_id)\
+        .join(Meeting, Meeting.id == Race.meeting_id)\
+        .outerjoin(Prediction, Prediction.horse_id == Horse.id)\
+        .where(column == entity.id)
+    if before is not None:
+        statement = statement.where(Horse.id < before)
+    rows = db.session.execute(statement.order_by(Horse.id.desc()).limit(limit + 1)).all()
+    runs = [row._asdict() for row in rows[:limit]]
+    return runs, (runs[-1]['horse_id'] if len(rows) > limit else None)
+
+
+def meeting_entity_ids(meeting_id):
+    """Entity ids of a meeting's runners, to prune once it's deleted"""
+    entity_ids = set()
+    for row in db.session.execute(
+        db.select(Horse.horse_entity_id, Horse.jockey_entity_id, Horse.trainer_entity_id)
+        .join(Race, Race.id == Horse.race_id)
+        .where(Race.meeting_id == meeting_id)
+    ):
+        entity_ids.update(entity_id for entity_id in row if entity_id is not None)
+    return entity_ids
+
+
+def prune_entities(entity_ids):
+    """Delete those of entity_ids no stored runner points at any more, with their aliases"""
+    if not entity_ids:
+        return 0
+    orphans = list(db.session.execute(
+        db.select(Entity.id).where(
+            Entity.id.in_(entity_ids),
+            ~db.exists().where(Horse.horse_entity_id == Entity.id),
+            ~db.exists().where(Horse.jockey_entity_id == Entity.id),
+            ~db.exists().where(Horse.trainer_entity_id == Entity.id)
+        )
+    ).scalars())
+    if orphans:
+        if search_backend() == 'fts5':
+            db.session.execute(text("DELETE FROM entity_search WHERE rowid = :id"),
+                               [{'id': entity_id} for entity_id in orphans])
+        db.session.execute(delete(EntityAlias).where(EntityAlias.entity_id.in_(orphans)))
+        db.session.execute(delete(Entity).where(Entity.id.in_(orphans)))
+    return len(orphans)
@@ -0,0 +1,110 @@
+"""
+Shared fixtures. The app is imported against a throwaway SQLite database
+and the python engine.
+"""
+import os
+import sys
+import shutil
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+sys.path.insert(0, ROOT)
+
+_workdir = tempfile.mkdtemp(prefix='formanalyst-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_workdir, 'test.db')
+os.environ['ANALYZER_ENGINE'] = 'python'
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_workdir, ignore_errors=True)
+
+
+def fixture_csv(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def fixture_races(name, races):
+    """A fixture CSV keeping only race numbers 1 to races"""
+    lines = fixture_csv(name).splitlines()
+    header = lines[0].split(',')
+    race = header.index('race number')
+    return '\n'.join([lines[0]] + [line for line in lines[1:] if int(line.split(',')[race]) <= races]) + '\n'
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    import app as app_module
+    return app_module
+
+
+@pytest.fixture
+def app_context(app_module):
+    """An app context; every table but the admin user and schema_migrations is emptied afterwards"""
+    from models import db, User
+
+    with app_module.app.app_context():
+        yield app_module.app
+        db.session.rollback()
+        for table in reversed(db.metadata.sorted_tables):
+            if table.name not in ('users', 'schema_migrations'):
+                db.session.execute(table.delete())
+        db.session.execute(db.delete(User).where(User.username != 'admin'))
+        # The full-text index of entities, where SQLite has FTS5
+        if db.session.execute(db.text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'entity_search'"
+        )).scalar():
+            db.session.execute(db.text("DELETE FROM entity_search"))
+        db.session.commit()
+
+
+@pytest.fixture
+def admin(app_context):
+    from models import User
+    return User.query.filter_by(username='admin').one()
+
+
+@pytest.fixture
+def admin_client(app_module, admin):
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin.id)
+        session['_fresh'] = True
+    return client
+
+
+@pytest.fixture
+def count_queries(app_context):
+    """count_queries() as a context manager: the list of statements run inside it"""
+    from contextlib import contextmanager
+    from sqlalchemy import event
+    from models import db
+
+    @contextmanager
+    def counting():
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+    return counting
+
+
+@pytest.fixture
+def make_meeting(app_module, admin):
+    """make_meeting(fixture, races=None, user=None) stores a fixture CSV (or its first races) as a meeting"""
+
+    def make(fixture='meeting_mixed.csv', races=None, user=None):
+        csv_data = fixture_races(fixture, races) if races else fixture_csv(fixture)
+        return app_module.process_and_store_results(csv_data, fixture, 'good', (user or admin).id)
+
+    return make
@@ -0,0 +1,105 @@
+"""The admin panel"""
+from sqlalchemy import insert
+
+from models import db, User, Meeting, Race, Horse
+
+SEEDED_USERS = 5000
+
+
+def _seed_users(count):
+    """count users with one meeting of one race and two runners each"""
+    first_id = db.session.execute(db.select(db.func.max(User.id))).scalar() + 1
+    user_ids = range(first_id, first_id + count)
+    db.session.execute(insert(User), [
+        {'id': user_id, 'username': f'user{user_id}', 'email': f'user{user_id}@example.com', 'password_hash': 'x'}
+        for user_id in user_ids
+    ])
+    db.session.execute(insert(Meeting), [
+        {'id': user_id, 'user_id': user_id, 'meeting_name': f'Meeting {user_id}'} for user_id in user_ids
+    ])
+    db.session.execute(insert(Race), [
+        {'id': user_id, 'meeting_id': user_id, 'race_number': 1} for user_id in user_ids
+    ])
+    db.session.execute(insert(Horse), [
+        {'race_id': user_id, 'horse_name': f'Horse {user_id} {runner}'} for user_id in user_ids for runner in (1, 2)
+    ])
+    db.session.commit()
+    return user_ids
+
+
+def _admin_statements(admin_client, count_queries):
+    db.session.expire_all()
+    with count_queries() as statements:
+        response = admin_client.get('/admin')
+    assert response.status_code == 200
+    return response, statements
+
+
+def test_admin_panel_query_budget(admin_client, count_queries):
+    _, baseline = _admin_statements(admin_client, count_queries)
+    user_ids = _seed_users(SEEDED_USERS)
+
+    response, statements = _admin_statements(admin_client, count_queries)
+
+    # The logged-in user, every user's stats in one grouped query, and the
+    # analysis cache summary, however many users there are
+    assert len(statements) == len(baseline) == 3, statements
+    page = response.get_data(as_text=True)
+    assert f'user{user_ids[-1]}@example.com' in page
+
+
+def test_admin_panel_user_stats(app_module, admin, admin_client, make_meeting, monkeypatch):
+    other = User(username='other', email='other@example.com')
+    other.set_password('secret1')
+    db.session.add(other)
+    db.session.commit()
+    make_meeting(races=2)
+    make_meeting('meeting_400m_commas.csv')
+    make_meeting(races=1, user=other)
+
+    stats = {}
+    render_template = app_module.render_template
+
+    def capture(template, **context):
+        stats.update(context['stats'])
+        return render_template(template, **context)
+
+    monkeypatch.setattr(app_module, 'render_template', capture)
+    admin_client.get('/admin')
+
+    by_name = {user['username']: user for user in stats['users']}
+    assert (by_name['admin']['meeting_count'], by_name['admin']['runner_count']) == (2, 43)
+    assert (by_name['other']['meeting_count'], by_name['other']['runner_count']) == (1, 8)
+    assert stats['total_meetings'] == 3
+
+
+def test_deleting_a_user_prunes_their_runners_from_search(admin_client, make_meeting):
+    import search_index
+    from models import Entity
+
+    other = User(username='other', email='other@example.com')
+    other.set_password('secret1')
+    db.session.add(other)
+    db.session.commit()
+    make_meeting(races=2)
+    meeting = make_meeting('meeting_400m_commas.csv', races=2, user=other)
+    entity_ids = search_index.meeting_entity_ids(meeting.id)
+    kept_ids = set(db.session.execute(db.select(Entity.id)).scalars()) - entity_ids
+
+    response = admin_client.post('/admin', data={'action': 'delete_user', 'user_id': other.id})
+
+    assert response.status_code == 302
+    db.session.expire_all()
+    assert db.session.get(User, other.id) is None
+    remaining = set(db.session.execute(db.select(Entity.id)).scalars())
+    # Their horses are gone; jockeys and trainers with runners left in the admin's meeting stay
+    assert entity_ids - remaining
+    assert remaining & entity_ids == _in_use(entity_ids)
+    assert kept_ids <= remaining
+
+
+def _in_use(entity_ids):
+    ids = set()
+    for column in (Horse.horse_entity_id, Horse.jockey_entity_id, Horse.trainer_entity_id):
+        ids.update(db.session.execute(db.select(column).where(column.in_(entity_ids))).scalars())
+    return ids
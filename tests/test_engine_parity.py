@@ -0,0 +1,34 @@
+"""scoring.py against analyzer.js, result for result, on the fixture CSVs"""
+import json
+import shutil
+
+import pytest
+
+from conftest import fixture_csv
+
+FIXTURE_FILES = ['meeting_mixed.csv', 'meeting_400m_commas.csv', 'odd_values.csv']
+
+pytestmark = pytest.mark.skipif(shutil.which('node') is None, reason="node is not installed")
+
+
+@pytest.fixture(scope='module')
+def node_pool():
+    from analyzer_pool import AnalyzerPool
+    pool = AnalyzerPool(size=1, timeout=120, health_interval=0)
+    yield pool
+    pool.close()
+
+
+@pytest.mark.parametrize('is_advanced', [False, True])
+@pytest.mark.parametrize('condition', ['firm', 'good', 'soft', 'heavy', 'synthetic'])
+@pytest.mark.parametrize('filename', FIXTURE_FILES)
+def test_engines_agree(node_pool, filename, condition, is_advanced):
+    from scoring import analyze_csv
+
+    csv_data = fixture_csv(filename)
+    node_results = node_pool.analyze(csv_data, condition, is_advanced)
+    # Through JSON, as the node results came
+    python_results = json.loads(json.dumps(analyze_csv(csv_data, condition, is_advanced)))
+    assert len(python_results) == len(node_results)
+    for node_result, python_result in zip(node_results, python_results):
+        assert python_result == node_result
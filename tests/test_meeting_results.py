@@ -0,0 +1,37 @@
+"""
+get_meeting_results loads a meeting's races, horses and predictions with
+one joined query, however many races the meeting has.
+"""
+
+
+def test_one_joined_query(app_module, make_meeting, count_queries):
+    meeting = make_meeting()
+
+    with count_queries() as statements:
+        results = app_module.get_meeting_results(meeting.id)
+
+    assert len(results['races']) == 4
+    assert [s for s in statements if 'FROM races' in s] == [statements[-1]]
+
+
+def test_query_count_independent_of_races(app_module, make_meeting, count_queries):
+    small = make_meeting(races=1)
+    large = make_meeting()
+
+    with count_queries() as small_statements:
+        app_module.get_meeting_results(small.id)
+    with count_queries() as large_statements:
+        results = app_module.get_meeting_results(large.id)
+
+    assert len(small_statements) == len(large_statements)
+    assert len(results['races']) == 4
+
+
+def test_horses_ordered_by_score(app_module, make_meeting):
+    results = app_module.get_meeting_results(make_meeting().id)
+
+    assert [race['race_number'] for race in results['races']] == [1, 2, 3, 4]
+    for race in results['races']:
+        scores = [horse['score'] for horse in race['horses']]
+        assert len(scores) == 8
+        assert scores == sorted(scores, reverse=True)
@@ -0,0 +1,55 @@
+"""/metrics is valid Prometheus text"""
+import metrics
+
+
+class _Pool:
+    def stats(self):
+        return {'size': 2, 'idle': 1, 'busy': 1, 'waiting': 0, 'restarts': 3}
+
+
+def _families(text):
+    """Metric family of each sample line, in order"""
+    families = []
+    for line in text.splitlines():
+        if line.startswith('# TYPE '):
+            families.append(line.split()[2])
+        elif line and not line.startswith('#'):
+            name = line.split('{')[0].split()[0]
+            assert name.startswith(families[-1]), f"{name} sampled under # TYPE {families[-1]}"
+    return families
+
+
+def test_render_groups_gauges_by_family():
+    gauges = [
+        ('workers', 'Workers', {'pool': 'a'}, 1),
+        ('waiting', 'Waiting', {'pool': 'a'}, 0),
+        ('workers', 'Workers', {'pool': 'b'}, 2),
+        ('waiting', 'Waiting', {'pool': 'b'}, 5),
+    ]
+    text = metrics.render(gauges)
+
+    assert _families(text)[-2:] == ['workers', 'waiting']
+    assert text.index('workers{pool="b"}') < text.index('# HELP waiting')
+
+
+def test_metrics_with_both_pools(app_module, admin_client, monkeypatch):
+    monkeypatch.setattr(app_module, 'current_pool', lambda: _Pool())
+    monkeypatch.setattr(app_module.batch_analysis, 'current_node_pool', lambda: _Pool())
+
+    response = admin_client.get('/metrics')
+
+    assert response.status_code == 200
+    families = _families(response.get_data(as_text=True))
+    # Each family is announced once and its samples follow it
+    assert len(families) == len(set(families))
+    assert 'formanalyst_analyzer_workers' in families
+
+
+def test_analyzer_restarts_are_a_counter(app_module, admin_client, monkeypatch):
+    monkeypatch.setattr(app_module, 'current_pool', lambda: _Pool())
+
+    text = admin_client.get('/metrics').get_data(as_text=True)
+
+    assert '# TYPE formanalyst_analyzer_restarts_total counter' in text
+    assert 'formanalyst_analyzer_restarts_total{pool="requests"} 3' in text
+    assert 'formanalyst_analyzer_restarts ' not in text
@@ -0,0 +1,56 @@
+"""The main pages' queries are served by indexes (EXPLAIN QUERY PLAN)"""
+import pytest
+from sqlalchemy import event
+
+from models import db, Entity, Horse
+
+# Pages whose queries must be served by indexes, and the tables to check
+PAGES = ['/dashboard', '/history', '/meeting/{meeting_id}', '/admin',
+         '/search?q={search_query}', '/entities/{entity_id}']
+INDEXED_TABLES = ['meetings', 'races', 'horses', 'predictions', 'prediction_tags', 'entities', 'entity_aliases']
+
+
+def _full_scans(plan):
+    """Tables in INDEXED_TABLES that a plan reads without an index"""
+    scans = []
+    for line in plan:
+        words = line.split()
+        for position, word in enumerate(words[:-1]):
+            if word == 'SCAN' and words[position + 1] in INDEXED_TABLES and 'USING' not in words:
+                scans.append(words[position + 1])
+    return scans
+
+
+@pytest.fixture
+def page_urls(make_meeting):
+    make_meeting(races=2)
+    meeting = make_meeting('meeting_400m_commas.csv')
+    jockey_id = db.session.execute(
+        db.select(Horse.jockey_entity_id).where(Horse.jockey_entity_id.isnot(None)).limit(1)
+    ).scalar()
+    jockey = db.session.get(Entity, jockey_id)
+    return [page.format(meeting_id=meeting.id, entity_id=jockey.id, search_query=jockey.search_key.split()[-1])
+            for page in PAGES]
+
+
+@pytest.mark.parametrize('page', range(len(PAGES)), ids=PAGES)
+def test_page_queries_use_indexes(admin_client, page_urls, page):
+    url = page_urls[page]
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            captured.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        response = admin_client.get(url)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+    assert response.status_code == 200
+    assert captured
+
+    with db.engine.connect() as connection:
+        for statement, parameters in captured:
+            plan = [row[-1] for row in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+            assert not _full_scans(plan), f"{' '.join(statement.split())}\n" + '\n'.join(plan)
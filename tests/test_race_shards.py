@@ -0,0 +1,63 @@
+"""Race-sharded scoring gives the serial result, and only when asked to"""
+import json
+
+import pytest
+
+import race_shards
+from conftest import fixture_csv
+from scoring import analyze_csv
+
+
+@pytest.mark.parametrize('shards', [2, 3, 8])
+def test_sharded_results_equal_serial(shards):
+    csv_data = fixture_csv('meeting_mixed.csv')
+    parts = race_shards.split(csv_data.split('\n'), shards)
+
+    assert 2 <= len(parts) <= shards
+    merged = race_shards.merge([analyze_csv(part, 'good') for part in parts])
+    assert json.dumps(merged) == json.dumps(analyze_csv(csv_data, 'good'))
+
+
+class _Pool:
+    def __init__(self, size):
+        self.size = size
+
+    def analyze(self, csv_data, track_condition, is_advanced):
+        return analyze_csv(csv_data, track_condition, is_advanced)
+
+
+@pytest.fixture
+def sharding(app_module, monkeypatch):
+    """Sharding on for any CSV, on a 4-CPU machine; returns the shard counts node was given"""
+    monkeypatch.setitem(app_module.app.config, 'ANALYSIS_SHARD_MIN_BYTES', 1)
+    monkeypatch.setattr(app_module.os, 'cpu_count', lambda: 4)
+    calls = []
+    analyze_node = race_shards.analyze_node
+
+    def record(shards, track_condition, is_advanced, pool):
+        calls.append(len(shards))
+        return analyze_node(shards, track_condition, is_advanced, pool)
+
+    monkeypatch.setattr(race_shards, 'analyze_node', record)
+    return calls
+
+
+def test_off_by_default(app_module):
+    assert app_module.app.config['ANALYSIS_SHARD_MIN_BYTES'] == 0
+    assert app_module._shards(fixture_csv('meeting_mixed.csv'), 4) == []
+
+
+def test_never_on_one_cpu(app_module, sharding, monkeypatch):
+    monkeypatch.setattr(app_module.os, 'cpu_count', lambda: 1)
+    assert app_module._shards(fixture_csv('meeting_mixed.csv'), 4) == []
+
+
+@pytest.mark.parametrize('pool_size, shards', [(2, None), (3, 2), (5, 4)])
+def test_node_keeps_a_worker_free(app_module, sharding, monkeypatch, pool_size, shards):
+    monkeypatch.setattr(app_module, 'get_pool', lambda **_: _Pool(pool_size))
+    csv_data = fixture_csv('meeting_mixed.csv')
+
+    results = app_module._run_engine('node', csv_data, 'good', False)
+
+    assert sharding == ([shards] if shards else [])
+    assert json.dumps(results) == json.dumps(analyze_csv(csv_data, 'good'))
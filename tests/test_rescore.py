@@ -0,0 +1,49 @@
+"""rescore_track_condition() ends where a fresh analysis at the new condition would"""
+import io
+import csv
+
+import pytest
+
+from conftest import fixture_csv
+from scoring import analyze_csv, rescore_track_condition
+
+# Malformed records all write the same 'More podiums than runs??' note
+IMPOSSIBLE_RECORD = '2:1-1-1'
+
+
+def _with_records(csv_data, records):
+    """csv_data with the first runner's record columns set from records"""
+    rows = list(csv.reader(io.StringIO(csv_data)))
+    header = rows[0]
+    name = header.index('horse name')
+    runner = rows[1][name]
+    for row in rows[1:]:
+        if row[name] == runner:
+            for column, value in records.items():
+                row[header.index(column)] = value
+    out = io.StringIO()
+    csv.writer(out, lineterminator='\n').writerows(rows)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize('records', [
+    {'horse record track': IMPOSSIBLE_RECORD, 'horse record good': IMPOSSIBLE_RECORD, 'horse record soft': '5:2-1-0'},
+    {'horse record distance': IMPOSSIBLE_RECORD, 'horse record good': IMPOSSIBLE_RECORD, 'horse record soft': '0:0-0-0'},
+    {'horse record track': IMPOSSIBLE_RECORD, 'horse record soft': IMPOSSIBLE_RECORD},
+], ids=['track-and-condition', 'distance-and-condition', 'new-condition-only'])
+def test_rescore_matches_fresh_analysis(records):
+    csv_data = _with_records(fixture_csv('meeting_mixed.csv'), records)
+    rescored = rescore_track_condition(analyze_csv(csv_data, 'good'), 'good', 'soft')
+    fresh = analyze_csv(csv_data, 'soft')
+
+    def by_name(results):
+        # A re-score keeps the old order; a fresh analysis sorts by the new scores
+        return {result['horse']['horse name']: result for result in results}
+
+    rescored, fresh = by_name(rescored), by_name(fresh)
+    assert rescored.keys() == fresh.keys()
+    for name, result in fresh.items():
+        # Sums in a different order, so scores agree to rounding
+        assert rescored[name]['score'] == pytest.approx(result['score'])
+        assert rescored[name]['notes'] == result['notes']
+        assert rescored[name]['components'] == result['components']
@@ -0,0 +1,83 @@
+"""update_meeting() re-scores only what a revised CSV changes, ending where a fresh upload would"""
+import io
+import csv
+
+import meeting_diff
+from conftest import fixture_csv
+from models import db, Race, Horse, Prediction
+
+
+def _rows(csv_data):
+    rows = list(csv.reader(io.StringIO(csv_data)))
+    return rows[0], rows[1:]
+
+
+def _csv(header, rows):
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator='\n')
+    writer.writerow(header)
+    writer.writerows(rows)
+    return out.getvalue()
+
+
+def _stored_runners(meeting_id):
+    return sorted(db.session.execute(
+        db.select(Race.race_number, Horse.horse_name, Horse.jockey, Prediction.score)
+        .join(Horse, Horse.race_id == Race.id)
+        .join(Prediction, Prediction.horse_id == Horse.id)
+        .where(Race.meeting_id == meeting_id)
+    ).all())
+
+
+def _assert_matches_fresh_upload(app_module, admin, meeting, csv_data):
+    fresh = app_module.process_and_store_results(csv_data, 'fresh.csv', 'good', admin.id)
+    assert _stored_runners(meeting.id) == _stored_runners(fresh.id)
+
+
+def test_scratching_rescores_one_race(app_module, admin):
+    old_csv = fixture_csv('meeting_mixed.csv')
+    header, rows = _rows(old_csv)
+    race, name = header.index('race number'), header.index('horse name')
+    scratched = next(row[name] for row in rows if row[race] == '4')
+    new_csv = _csv(header, [row for row in rows if row[name] != scratched])
+    meeting = app_module.process_and_store_results(old_csv, 'meeting.csv', 'good', admin.id)
+
+    changes = app_module.update_meeting(meeting, new_csv)
+
+    assert changes.changed == {4}
+    assert changes.runners[4]['scratched'] == [scratched]
+    _assert_matches_fresh_upload(app_module, admin, meeting, new_csv)
+
+
+def test_name_shared_only_in_the_old_csv(app_module, admin):
+    # A race-3 horse also listed in race 1 is stored in race 1 (the de-dup
+    # keeps the last row). Scratching it from race 1 must re-score race 3,
+    # where it now belongs, though the new CSV no longer links the races
+    new_csv = fixture_csv('meeting_mixed.csv')
+    header, rows = _rows(new_csv)
+    race, name = header.index('race number'), header.index('horse name')
+    moved = next(row[name] for row in rows if row[race] == '3')
+    copies = [[*row[:race], '1', *row[race + 1:]] for row in rows if row[race] == '3' and row[name] == moved]
+    old_csv = _csv(header, rows + copies)
+    meeting = app_module.process_and_store_results(old_csv, 'meeting.csv', 'good', admin.id)
+    assert [number for number, horse, _, _ in _stored_runners(meeting.id) if horse == moved] == [1]
+
+    changes = app_module.update_meeting(meeting, new_csv)
+
+    assert changes.changed == {1, 3}
+    assert changes.shared == {3}
+    assert [number for number, horse, _, _ in _stored_runners(meeting.id) if horse == moved] == [3]
+    _assert_matches_fresh_upload(app_module, admin, meeting, new_csv)
+
+
+def test_diff_links_races_through_either_version():
+    new_csv = fixture_csv('meeting_400m_commas.csv')
+    header, rows = _rows(new_csv)
+    race, name = header.index('race number'), header.index('horse name')
+    shared = next(row[name] for row in rows if row[race] == '2')
+    old_rows = rows + [[*row[:race], '3', *row[race + 1:]] for row in rows if row[name] == shared]
+
+    changes = meeting_diff.diff(_csv(header, old_rows), new_csv)
+
+    assert changes.changed == {2, 3}
+    assert changes.shared == {2}
@@ -0,0 +1,32 @@
+"""worker.py runs queued uploads and drops their CSVs once done"""
+from conftest import fixture_csv
+from models import db, AnalysisJob, Meeting
+
+
+def _queue(admin, csv_data):
+    db.session.add(AnalysisJob(user_id=admin.id, filename='queued.csv', csv_data=csv_data, track_condition='good'))
+    db.session.commit()
+
+
+def test_finished_job_keeps_no_csv(admin):
+    import worker
+
+    csv_data = fixture_csv('meeting_400m_commas.csv')
+    _queue(admin, csv_data)
+    job = worker.run_job(worker.claim_next_job())
+
+    assert job.status == 'finished'
+    assert db.session.get(AnalysisJob, job.id).csv_data is None
+    # The meeting's compressed copy is the one kept
+    assert db.session.get(Meeting, job.meeting_id).csv_text == csv_data
+
+
+def test_failed_job_keeps_no_csv(admin):
+    import worker
+
+    _queue(admin, 'not,a,meeting\n')
+    job = worker.run_job(worker.claim_next_job())
+
+    assert job.status == 'failed'
+    assert job.error
+    assert db.session.get(AnalysisJob, job.id).csv_data is None
@@ -0,0 +1,130 @@
+"""
+Background worker for queued /analyze uploads.
+
+Run one or more of these next to the web process (see Procfile):
+
+    python worker.py
+
+Jobs live in the analysis_jobs table. A worker claims the oldest queued job
+with a guarded UPDATE, so several workers can share the table safely, runs
+the analysis and ingest, then records the outcome.
+"""
+import os
+import sys
+import time
+import signal
+from datetime import datetime, timedelta
+
+from app import app, process_and_store_results
+from models import db, AnalysisJob
+import metrics
+
+POLL_INTERVAL = float(os.environ.get('ANALYSIS_WORKER_POLL_INTERVAL', 1.0))
+# Jobs left 'running' this long (e.g. the worker was killed) are queued again
+STALE_AFTER = int(os.environ.get('ANALYSIS_JOB_STALE_AFTER', 600))
+
+_stopping = False
+
+
+def _stop(signum, frame):
+    global _stopping
+    _stopping = True
+
+
+def requeue_stale_jobs():
+    """Put jobs abandoned by a dead worker back on the queue"""
+    cutoff = datetime.utcnow() - timedelta(seconds=STALE_AFTER)
+    requeued = AnalysisJob.query\
+        .filter(AnalysisJob.status == 'running', AnalysisJob.started_at < cutoff)\
+        .update({'status': 'queued', 'started_at': None}, synchronize_session=False)
+    db.session.commit()
+    return requeued
+
+
+def claim_next_job():
+    """
+    Mark the oldest queued job as running and return it, or None
+    The status guard on the UPDATE makes the claim safe across workers
+    """
+    while True:
+        job_id = db.session.execute(
+            db.select(AnalysisJob.id)
+            .where(AnalysisJob.status == 'queued')
+            .order_by(AnalysisJob.id)
+            .limit(1)
+        ).scalar()
+        if job_id is None:
+            db.session.commit()
+            return None
+
+        claimed = AnalysisJob.query\
+            .filter_by(id=job_id, status='queued')\
+            .update({'status': 'running', 'started_at': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            return db.session.get(AnalysisJob, job_id)
+        # Another worker got there first - try the next one
+
+
+def run_job(job):
+    """Analyze and store one job, recording success or failure on it"""
+    try:
+        meeting = process_and_store_results(
+            csv_data=job.csv_data,
+            filename=job.filename,
+            track_condition=job.track_condition,
+            user_id=job.user_id,
+            is_advanced=job.is_advanced
+        )
+        job.status = 'finished'
+        job.meeting_id = meeting.id
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(AnalysisJob, job.id)
+        job.status = 'failed'
+        job.error = str(e)
+
+    job.finished_at = datetime.utcnow()
+    # The meeting has its own compressed copy (csv_blobs); a failed upload
+    # is uploaded again rather than retried
+    job.csv_data = None
+    db.session.commit()
+    return job
+
+
+def main():
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    print(f"Analysis worker {os.getpid()} started", file=sys.stderr, flush=True)
+    with app.app_context():
+        last_stale_check = 0
+        while not _stopping:
+            if time.monotonic() - last_stale_check > 60:
+                requeue_stale_jobs()
+                last_stale_check = time.monotonic()
+
+            job = claim_next_job()
+            if job is None:
+                time.sleep(POLL_INTERVAL)
+                continue
+
+            with metrics.collect() as collected:
+                job = run_job(job)
+            print(f"Job {job.id} {job.status} (queued {job.queue_seconds:.1f}s, ran {job.run_seconds:.1f}s)",
+                  file=sys.stderr, flush=True)
+            if app.config['METRICS_JSON_LOG']:
+                metrics.log_json({
+                    'job': job.id,
+                    'status': job.status,
+                    'queue_ms': round(job.queue_seconds * 1000, 2),
+                    'duration_ms': round(job.run_seconds * 1000, 2),
+                    'sql_queries': collected['sql_queries'],
+                    'spans_ms': metrics.round_spans(collected['spans']),
+                })
+
+            db.session.remove()
+
+
+if __name__ == '__main__':
+    main()